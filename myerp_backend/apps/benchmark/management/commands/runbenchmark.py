@@ -0,0 +1,131 @@
+import json
+import logging
+import os
+import platform
+import re
+import subprocess
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.test import APIClient
+
+from apps.benchmark import scenarios
+from apps.common import seeds
+from apps.order.models import Order
+from apps.staff.authentications import generate_jwt
+from apps.staff.models import ERPUser
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块, 不报告内存
+    resource = None
+
+SERVER_TIMING_QUERIES = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+
+def rss_mb():
+    """
+    当前进程的常驻内存(MB), Linux 读取 /proc, 其他系统退回峰值内存
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError, AttributeError):
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 / 1024 if platform.system() == 'Darwin' else peak / 1024
+
+
+def percentile(values, percent):
+    """最近秩法百分位数"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, -(-len(ordered) * percent // 100) - 1))
+    return ordered[int(index)]
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=settings.BASE_DIR, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('通过 DRF 测试客户端依次请求各接口(真实的认证/视图/序列化), 统计 p50/p95 耗时、SQL条数和内存, '
+            '结果写入 JSON 文件, 便于在不同提交之间对比')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='benchmark.json', help='结果文件路径')
+        parser.add_argument('--iterations', type=int, default=20, help='每个接口的请求次数')
+        parser.add_argument('--warmup', type=int, default=2, help='正式计时前的预热请求次数')
+        parser.add_argument('--account', default=f'{seeds.PREFIX.lower()}0', help='发起请求的员工账号(默认合成数据的老板)')
+        parser.add_argument('--only', nargs='+', help='只运行名称以这些前缀开头的场景, 例如 orders client.overdue')
+
+    def handle(self, *args, **options):
+        user = ERPUser.objects.filter(account=options['account']).first()
+        if user is None:
+            raise CommandError(f"账号 {options['account']} 不存在, 请先执行 seedbenchmarkdata")
+        values = scenarios.context()
+        if values is None:
+            raise CommandError('数据库中没有订单或客户, 请先执行 seedbenchmarkdata')
+
+        # 每个请求一行的指标日志会干扰输出, 基准运行期间关闭(中间件本身仍然执行)
+        logging.getLogger('apps.metrics.requests').setLevel(logging.WARNING)
+
+        # 走真实的 JWT 认证; DEBUG 且未配置 ALLOWED_HOSTS 时只允许 localhost
+        client = APIClient(SERVER_NAME='localhost')
+        client.credentials(HTTP_AUTHORIZATION=f'JWT {generate_jwt(user)}')
+
+        selected = [
+            scenario for scenario in scenarios.SCENARIOS
+            if not options['only'] or any(scenario[0].startswith(prefix) for prefix in options['only'])
+        ]
+        results = {}
+        self.stdout.write(f"{'接口':<26} {'状态':>4} {'p50(ms)':>9} {'p95(ms)':>9} {'SQL':>5} {'RSS(MB)':>9}")
+        for scenario in selected:
+            name, path, params = scenarios.build(scenario, values)
+            for _ in range(options['warmup']):
+                client.get(path, params)
+
+            durations, queries, status_code = [], [], None
+            for _ in range(options['iterations']):
+                start = time.perf_counter()
+                response = client.get(path, params)
+                durations.append((time.perf_counter() - start) * 1000)
+                status_code = response.status_code
+                # 中间件在 Server-Timing 中报告了本次请求的 SQL 条数
+                match = SERVER_TIMING_QUERIES.search(response.get('Server-Timing', ''))
+                if match:
+                    queries.append(int(match.group(1)))
+
+            rss = rss_mb()
+            results[name] = {
+                'path': path,
+                'params': params,
+                'status': status_code,
+                'p50_ms': round(percentile(durations, 50), 2),
+                'p95_ms': round(percentile(durations, 95), 2),
+                'mean_ms': round(sum(durations) / len(durations), 2),
+                'queries': max(queries) if queries else None,
+                'rss_mb': round(rss, 1) if rss is not None else None,
+            }
+            row = results[name]
+            self.stdout.write(f"{name:<26} {status_code:>4} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} "
+                              f"{row['queries'] if row['queries'] is not None else '-':>5} "
+                              f"{row['rss_mb'] if row['rss_mb'] is not None else '-':>9}")
+
+        report = {
+            'commit': git_commit(),
+            'database': connection.vendor,
+            'iterations': options['iterations'],
+            'orders': Order.objects.count(),
+            'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'endpoints': results,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            json.dump(report, output, ensure_ascii=False, indent=2, sort_keys=True)
+        self.stdout.write(self.style.SUCCESS(f"结果已写入 {options['output']}"))
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.common import seeds
+
+
+class Command(BaseCommand):
+    help = '生成性能基准用的合成数据(员工/品牌/分类/商品/客户/订单/尾款/日志), 老板账号 seed0 / 111111'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=10000, help='订单数(客户为其1/5, 发货/入库单各为其1/20)')
+        parser.add_argument('--staff', type=int, default=10, help='员工数')
+        parser.add_argument('--brands', type=int, default=5, help='品牌数')
+        parser.add_argument('--categories', type=int, default=5, help='分类数')
+        parser.add_argument('--inventories', type=int, default=1000, help='商品(SKU)数')
+        parser.add_argument('--random-seed', type=int, default=0, help='随机种子, 相同参数生成相同的数据')
+        parser.add_argument('--flush', action='store_true', help='先删除已有的合成数据')
+
+    def handle(self, *args, **options):
+        if seeds.exists():
+            if not options['flush']:
+                raise CommandError('数据库中已有合成数据, 加 --flush 先删除后重新生成')
+            start = time.perf_counter()
+            with transaction.atomic():
+                seeds.flush()
+            self.stdout.write(f'已删除原有的合成数据 ({time.perf_counter() - start:.1f}s)')
+
+        start = time.perf_counter()
+
+        def progress(done, total):
+            self.stdout.write(f'订单 {done}/{total} ({time.perf_counter() - start:.1f}s)')
+
+        with transaction.atomic():
+            counts = seeds.seed(
+                orders=options['orders'], staff=options['staff'], brands=options['brands'],
+                categories=options['categories'], inventories=options['inventories'],
+                random_seed=options['random_seed'], progress=progress
+            )
+        for name, count in counts.items():
+            self.stdout.write(f'{name}: {count}')
+        self.stdout.write(self.style.SUCCESS(f'合成数据生成完成, 耗时 {time.perf_counter() - start:.1f}s'))
@@ -0,0 +1,136 @@
+import json
+import logging
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from apps.benchmark import stress
+from apps.benchmark.management.commands.runbenchmark import percentile, git_commit
+from apps.inventory.models import Inventory
+from apps.metrics import histograms
+from apps.staff.models import ERPUser
+
+
+class Command(BaseCommand):
+    help = ('多线程/多进程并发执行下单/出库/作废/入库, 争用同一组热点商品; '
+            '结束后校验库存不变量(无超卖/无负数/占用与订单一致), 报告 TPS、锁等待、死锁和重试次数')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='每个进程的并发线程数')
+        parser.add_argument('--processes', type=int, default=1, help='进程数(大于1时 fork 子进程, 仅支持 Linux/macOS)')
+        parser.add_argument('--duration', type=float, default=10, help='运行时间(秒)')
+        parser.add_argument('--operations', type=int, help='每个线程执行的操作次数(达到后提前结束)')
+        parser.add_argument('--skus', type=int, default=5, help='热点商品数量, 越少争用越激烈')
+        parser.add_argument('--in-stock', type=int, default=20, help='每个热点商品的初始在库数量')
+        parser.add_argument('--mix', type=int, nargs=4, default=[5, 3, 1, 1],
+                            metavar=('CREATE', 'INSTALL', 'ABANDON', 'RECEIVE'), help='各操作的权重')
+        parser.add_argument('--seed', type=int, default=0, help='随机种子')
+        parser.add_argument('--keep', action='store_true', help='保留压测数据(默认结束后删除)')
+        parser.add_argument('--output', help='结果写入 JSON 文件')
+
+    def handle(self, *args, **options):
+        if options['processes'] > 1 and 'fork' not in multiprocessing.get_all_start_methods():
+            raise CommandError('当前系统不支持 fork, 请使用 --processes 1 并增加 --threads')
+        if Inventory.objects.filter(name__startswith=f'{stress.PREFIX}-').exists() or \
+                ERPUser.objects.filter(account=stress.PREFIX.lower()).exists():
+            raise CommandError('数据库中已有压测数据(上次运行使用了 --keep?), 请先删除')
+        if connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING('SQLite 只允许一个写事务, 并发写入会串行执行, 锁争用数据仅在 MySQL 上有意义'))
+
+        # 每个请求的指标日志和 4xx/5xx 日志会淹没输出, 压测期间关闭(结果统计在报告中)
+        logging.getLogger('apps.metrics.requests').setLevel(logging.WARNING)
+        logging.getLogger('django.request').setLevel(logging.CRITICAL)
+        logging.getLogger('apps.common.retries').setLevel(logging.ERROR)
+        try:
+            # 创建压测数据失败(例如唯一约束冲突)时也清理已写入的部分
+            context = stress.setup(options['skus'], options['in_stock'])
+            before = stress.lock_status()
+            records, elapsed, retries = self.run(context, options)
+            after = stress.lock_status()
+            violations = stress.check_invariants(context)
+            report = self.report(records, elapsed, retries, before, after, violations, options)
+        finally:
+            if not options['keep']:
+                stress.teardown()
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, ensure_ascii=False, indent=2, sort_keys=True)
+            self.stdout.write(f"结果已写入 {options['output']}")
+        if violations:
+            raise CommandError(f'{len(violations)}条库存不变量被破坏')
+        self.stdout.write(self.style.SUCCESS('库存不变量全部成立!'))
+
+    def run(self, context, options):
+        arguments = (context, options['threads'], options['duration'], options['mix'], options['operations'],
+                     options['seed'])
+        if options['processes'] == 1:
+            before = histograms.lock_events()
+            records, elapsed = stress.run(*arguments)
+            return records, elapsed, stress.lock_event_delta(before, histograms.lock_events())
+
+        # 父进程的连接在 fork 前关闭, 避免子进程继承同一个套接字
+        connections.close_all()
+        start = time.perf_counter()
+        with multiprocessing.get_context('fork').Pool(options['processes']) as pool:
+            results = pool.starmap(stress.run_process, [(number, *arguments) for number in range(options['processes'])])
+        retries = {}
+        for _, _, events in results:
+            for key, count in events.items():
+                retries[key] = retries.get(key, 0) + count
+        return [record for records, _, _ in results for record in records], time.perf_counter() - start, retries
+
+    def report(self, records, elapsed, retries, before, after, violations, options):
+        operations = {}
+        self.stdout.write(f"{'操作':<8} {'次数':>6} {'成功':>6} {'拒绝':>6} {'繁忙':>6} {'死锁':>6} {'锁超时':>6} {'错误':>6} "
+                          f"{'p50(ms)':>9} {'p95(ms)':>9}")
+        for operation in stress.OPERATIONS + ('total',):
+            rows = [record for record in records if operation in ('total', record[0])]
+            if not rows:
+                continue
+            durations = [duration for _, _, duration in rows]
+            outcomes = {outcome: sum(1 for _, result, _ in rows if result == outcome)
+                        for outcome in ('ok', 'rejected', 'busy', 'deadlock', 'lock_timeout', 'error')}
+            operations[operation] = {
+                'count': len(rows),
+                **outcomes,
+                'p50_ms': round(percentile(durations, 50), 2),
+                'p95_ms': round(percentile(durations, 95), 2),
+            }
+            row = operations[operation]
+            self.stdout.write(f"{operation:<8} {row['count']:>6} {row['ok']:>6} {row['rejected']:>6} {row['busy']:>6} "
+                              f"{row['deadlock']:>6} {row['lock_timeout']:>6} {row['error']:>6} "
+                              f"{row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f}")
+
+        committed = operations.get('total', {}).get('ok', 0)
+        locks = None
+        if before is not None and after is not None:
+            locks = {
+                'waits': after['Innodb_row_lock_waits'] - before['Innodb_row_lock_waits'],
+                'wait_ms': after['Innodb_row_lock_time'] - before['Innodb_row_lock_time'],
+            }
+        self.stdout.write(f"耗时 {elapsed:.1f}s, 成功事务 {committed}, TPS {committed / elapsed:.1f}")
+        self.stdout.write(f"行锁等待 {locks['waits']} 次, 共 {locks['wait_ms']}ms" if locks
+                          else '行锁等待: 仅 MySQL 可统计')
+        self.stdout.write('锁冲突重试: ' + (', '.join(f'{key} {count}次' for key, count in sorted(retries.items()))
+                                           if retries else '无'))
+        for violation in violations:
+            self.stdout.write(self.style.ERROR(violation))
+
+        return {
+            'commit': git_commit(),
+            'database': connection.vendor,
+            'threads': options['threads'],
+            'processes': options['processes'],
+            'skus': options['skus'],
+            'mix': dict(zip(stress.OPERATIONS, options['mix'])),
+            'elapsed_s': round(elapsed, 2),
+            'tps': round(committed / elapsed, 1),
+            'row_locks': locks,
+            'lock_retries': retries,
+            'operations': operations,
+            'violations': violations,
+            'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
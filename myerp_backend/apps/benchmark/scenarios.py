@@ -0,0 +1,45 @@
+from apps.client.models import Client
+from apps.order.models import Order
+from apps.inventory.models import Purchase
+
+# 基准测试的接口: (名称, 路径, 查询参数); 路径中的 {order_id} 等由 context() 填充
+SCENARIOS = [
+    ('orders.list', '/api/orders/', {}),
+    ('orders.list.filtered', '/api/orders/', {'delivery_status': '1', 'brand_id': '{brand_id}'}),
+    ('orders.list.search', '/api/orders/', {'order_number': '{order_number_part}'}),
+    ('orders.list.cursor', '/api/orders/', {'cursor': '', 'stats': '0'}),
+    ('orders.detail', '/api/orders/{order_id}/', {}),
+    ('operation_logs.list', '/api/operation-logs/', {'order_id': '{order_id}'}),
+    ('inventory.list', '/api/inventory/', {}),
+    ('inventory.list.search', '/api/inventory/', {'name': 'SEED-1'}),
+    ('purchase.list', '/api/purchase/list/', {}),
+    ('purchase.detail', '/api/purchase/detail/{purchase_id}/', {}),
+    ('client.list', '/api/client/', {'page': '1'}),
+    ('client.list.search', '/api/client/', {'name': '{client_name_part}'}),
+    ('client.overdue', '/api/client/overdue/', {}),
+    ('home.inventory_by_brand', '/api/inventory-by-brand/', {}),
+    ('home.staff_performance', '/api/staff-performance/', {}),
+    ('home.current_year_sales', '/api/current-year-sales/', {}),
+]
+
+
+def context():
+    """
+    场景路径/参数中使用的样本数据(取最新的订单/发货单和任意客户)
+    """
+    order = Order.objects.order_by('-sign_time').values('id', 'brand_id', 'order_number').first()
+    client_name = Client.objects.order_by('uid').values_list('name', flat=True).first()
+    if order is None or client_name is None:
+        return None
+    return {
+        'order_id': order['id'],
+        'brand_id': order['brand_id'],
+        'order_number_part': order['order_number'][-5:],
+        'purchase_id': Purchase.objects.order_by('-id').values_list('id', flat=True).first() or 0,
+        'client_name_part': client_name[-2:],
+    }
+
+
+def build(scenario, values):
+    name, path, params = scenario
+    return name, path.format(**values), {key: value.format(**values) for key, value in params.items()}
@@ -0,0 +1,287 @@
+import random
+import re
+import threading
+import time
+from decimal import Decimal
+
+from django.db import connection, connections
+from django.db.models import Sum
+from rest_framework.test import APIClient
+
+from apps.brand.models import Brand
+from apps.category.models import Category
+from apps.client.models import Client
+from apps.common import seeds
+from apps.inventory import valuations
+from apps.inventory.models import Inventory, PurchaseDetail, ReceiveDetail
+from apps.metrics import histograms
+from apps.order import summaries, payments
+from apps.order.models import Order, OrderDetail, Installer
+from apps.search import tokens
+from apps.staff.authentications import generate_jwt
+from apps.staff.models import ERPUser
+
+PREFIX = 'STRESS'
+NAME = '并发压测'
+TELEPHONE_PREFIX = '198'  # 避开合成数据(seedbenchmarkdata)的号段, 实际号码取第一个未使用的
+OPERATIONS = ('create', 'install', 'abandon', 'receive')
+
+# 未被重试层处理的锁冲突按错误信息区分: MySQL 1213 死锁 / 1205 锁等待超时, SQLite 库被锁
+DEADLOCK = re.compile(r'1213|deadlock', re.I)
+LOCK_TIMEOUT = re.compile(r'1205|lock wait timeout|database is locked', re.I)
+
+
+def setup(skus, in_stock):
+    """
+    创建压测专用的员工/品牌/分类/客户/安装师傅和一组热点商品, 返回上下文
+    """
+    telephone = seeds.unused_telephone(TELEPHONE_PREFIX, ERPUser, Client, Installer)
+    user = ERPUser.objects.create_superuser(account=PREFIX.lower(), name=NAME, telephone=telephone,
+                                            password='111111')
+    brand = Brand.objects.create(name=NAME, intro=PREFIX)
+    category = Category.objects.create(name=NAME)
+    client = Client.objects.create(name=NAME, telephone=telephone, address=NAME, staff=user)
+    installer = Installer.objects.create(name=NAME, telephone=telephone)
+    inventories = [
+        Inventory.objects.create(name=f'{PREFIX}-{i}', brand=brand, category=category, cost=100, in_stock=in_stock)
+        for i in range(skus)
+    ]
+    valuations.adjust(valuations.contribution(inventory) for inventory in inventories)
+    return {
+        'token': generate_jwt(user),
+        'user_id': user.pk,
+        'brand_id': brand.id,
+        'client_id': client.pk,
+        'installer_id': installer.id,
+        'inventory_ids': [inventory.id for inventory in inventories],
+        'in_stock': in_stock,
+    }
+
+
+def teardown():
+    """
+    删除压测数据; 删除订单不经过 save, 最后重建受影响的派生表
+    """
+    Order.objects.filter(order_number__startswith=PREFIX).delete()
+    ERPUser.objects.filter(account=PREFIX.lower()).delete()
+    Brand.objects.filter(name=NAME).delete()
+    Category.objects.filter(name=NAME).delete()
+    Installer.objects.filter(name=NAME).delete()
+    valuations.rebuild()
+    summaries.rebuild()
+    tokens.sync('order.order_number')
+
+
+def lock_status():
+    """
+    MySQL 的行锁等待累计次数和时间(毫秒), 其他数据库返回 None
+    """
+    if connection.vendor != 'mysql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("SHOW GLOBAL STATUS WHERE Variable_name IN ('Innodb_row_lock_waits', 'Innodb_row_lock_time')")
+        return {name: int(value) for name, value in cursor.fetchall()}
+
+
+class Worker(threading.Thread):
+    """
+    一个压测线程: 用独立的测试客户端(独立数据库连接)按比例随机执行下单/出库/作废/入库
+    """
+
+    def __init__(self, number, context, deadline, weights, pool, pool_lock, max_operations=None, seed=0):
+        super().__init__(daemon=True)
+        self.number = number
+        self.context = context
+        self.deadline = deadline
+        self.weights = weights
+        self.pool = pool  # 新订单ID, 多个线程共享, 故意允许对同一订单并发出库/作废
+        self.pool_lock = pool_lock
+        self.max_operations = max_operations
+        self.rng = random.Random(seed * 1000 + number)
+        self.sequence = 0
+        self.records = []  # (操作, 结果, 耗时ms)
+
+    def run(self):
+        client = APIClient(SERVER_NAME='localhost')
+        client.credentials(HTTP_AUTHORIZATION=f"JWT {self.context['token']}")
+        try:
+            while time.perf_counter() < self.deadline and \
+                    (self.max_operations is None or len(self.records) < self.max_operations):
+                operation = self.rng.choices(OPERATIONS, weights=self.weights)[0]
+                start = time.perf_counter()
+                try:
+                    response = getattr(self, operation)(client)
+                    outcome = self.classify(response)
+                except Exception as e:  # 未被视图捕获的数据库异常
+                    outcome = self.classify_message(str(e)) or 'error'
+                if outcome is not None:
+                    self.records.append((operation, outcome, (time.perf_counter() - start) * 1000))
+        finally:
+            connection.close()
+
+    def details(self):
+        inventory_ids = self.context['inventory_ids']
+        ids = self.rng.sample(inventory_ids, self.rng.randint(1, min(3, len(inventory_ids))))
+        return [{'inventory_id': inventory_id, 'quantity': self.rng.randint(1, 3)} for inventory_id in ids]
+
+    def create(self, client):
+        self.sequence += 1
+        total_amount = Decimal(self.rng.randint(10, 100) * 100)
+        response = client.post('/api/order/create/', {
+            'order_number': f'{PREFIX}{self.number}-{self.sequence}',
+            'brand_id': self.context['brand_id'],
+            'client_id': self.context['client_id'],
+            'staff_id': self.context['user_id'],
+            'total_amount': str(total_amount),
+            'down_payment': str(total_amount / 2),
+            'total_cost': '0',
+            'gross_profit': str(total_amount),
+            'address': NAME,
+            'details': self.details(),
+        }, format='json')
+        if response.status_code == 201:
+            with self.pool_lock:
+                self.pool.append(response.data['order_id'])
+        return response
+
+    def pick(self):
+        with self.pool_lock:
+            return self.rng.choice(self.pool) if self.pool else None
+
+    def forget(self, order_id):
+        with self.pool_lock:
+            if order_id in self.pool:
+                self.pool.remove(order_id)
+
+    def install(self, client):
+        order_id = self.pick()
+        if order_id is None:
+            return None
+        response = client.put(f'/api/order-install/{order_id}/', {
+            'installer_id': self.context['installer_id'], 'installation_fee': '0', 'transportation_fee': '0'
+        }, format='json')
+        if response.status_code == 200:
+            self.forget(order_id)
+        return response
+
+    def abandon(self, client):
+        order_id = self.pick()
+        if order_id is None:
+            return None
+        response = client.post('/api/order/abandon/', {'order_id': order_id}, format='json')
+        if response.status_code == 200:
+            self.forget(order_id)
+        return response
+
+    def receive(self, client):
+        """补货: 先发货(增加在途)再入库(在途转在库)"""
+        details = self.details()
+        response = client.post('/api/purchase/', {
+            'brand_id': self.context['brand_id'], 'total_cost': '0', 'details': details
+        }, format='json')
+        if response.status_code not in (200, 201):
+            return response
+        return client.post('/api/receive/', {'brand_id': self.context['brand_id'], 'details': details}, format='json')
+
+    def classify(self, response):
+        if response is None:
+            return None  # 没有可操作的订单, 不计入
+        if response.status_code < 300:
+            return 'ok'
+        if response.status_code == 503:
+            return 'busy'  # 锁冲突重试用尽(或 NOWAIT 加锁失败)
+        detail = str(getattr(response, 'data', '') or '')
+        return self.classify_message(detail) or ('rejected' if response.status_code < 500 else 'error')
+
+    @staticmethod
+    def classify_message(message):
+        if DEADLOCK.search(message):
+            return 'deadlock'
+        if LOCK_TIMEOUT.search(message):
+            return 'lock_timeout'
+        return None
+
+
+def run(context, threads, duration, weights, max_operations=None, seed=0, offset=0):
+    """
+    启动 threads 个压测线程运行 duration 秒(或每个线程执行 max_operations 次), 返回全部记录和耗时
+    """
+    pool, pool_lock = [], threading.Lock()
+    deadline = time.perf_counter() + duration
+    workers = [Worker(offset + i, context, deadline, weights, pool, pool_lock, max_operations, seed)
+               for i in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return [record for worker in workers for record in worker.records], time.perf_counter() - start
+
+
+def run_process(number, context, threads, duration, weights, max_operations=None, seed=0):
+    """
+    子进程入口: fork 继承的数据库连接不能与父进程共用, 先全部关闭再启动本进程的压测线程
+
+    返回 (记录, 耗时, 本进程的锁冲突计数)
+    """
+    connections.close_all()
+    before = histograms.lock_events()
+    records, elapsed = run(context, threads, duration, weights, max_operations, seed, offset=number * threads)
+    return records, elapsed, lock_event_delta(before, histograms.lock_events())
+
+
+def lock_event_delta(before, after):
+    """
+    两次 histograms.lock_events() 快照之差, 按 (事件, 原因) 合计: {'retry:deadlock': 3, ...}
+    """
+    totals = {}
+    for (event, _, reason), count in after.items():
+        key = f'{event}:{reason}'
+        totals[key] = totals.get(key, 0) + count - before.get((event, _, reason), 0)
+    return {key: count for key, count in totals.items() if count}
+
+
+def check_invariants(context):
+    """
+    校验压测商品的库存账与订单/入库记录一致, 返回违反的规则列表
+
+    压测商品初始只有在库数量, 因此:
+    占用 = 新订单明细合计, 已售 = 已送货订单明细合计, 在库 = 初始 + 入库 - 已售, 在途 = 发货 - 入库
+    """
+    violations = []
+    inventory_ids = context['inventory_ids']
+
+    def quantities(queryset, field):
+        return dict(queryset.values(field).annotate(total=Sum('quantity')).values_list(field, 'total'))
+
+    details = OrderDetail.objects.filter(inventory_id__in=inventory_ids)
+    reserved = quantities(details.filter(order__delivery_status=1), 'inventory_id')
+    sold = quantities(details.filter(order__delivery_status=2), 'inventory_id')
+    purchased = quantities(PurchaseDetail.objects.filter(inventory_id__in=inventory_ids), 'inventory_id')
+    received = quantities(ReceiveDetail.objects.filter(inventory_id__in=inventory_ids), 'inventory_id')
+
+    for inventory in Inventory.objects.filter(id__in=inventory_ids).order_by('id'):
+        expected = {
+            'been_order': reserved.get(inventory.id, 0),
+            'sold': sold.get(inventory.id, 0),
+            'in_stock': context['in_stock'] + received.get(inventory.id, 0) - sold.get(inventory.id, 0),
+            'on_road': purchased.get(inventory.id, 0) - received.get(inventory.id, 0),
+        }
+        for field, value in expected.items():
+            actual = getattr(inventory, field)
+            if actual < 0:
+                violations.append(f'{inventory.name}: {field} 为负数({actual})')
+            if actual != value:
+                violations.append(f'{inventory.name}: {field} 为 {actual}, 按订单/入库记录应为 {value}')
+        can_be_sold = context['in_stock'] + purchased.get(inventory.id, 0) - reserved.get(inventory.id, 0) \
+            - sold.get(inventory.id, 0)
+        if inventory.can_be_sold() != can_be_sold:
+            violations.append(f'{inventory.name}: 可售数量为 {inventory.can_be_sold()}, 应为 {can_be_sold}')
+
+    if valuations.verify():
+        violations.append('库存价值汇总与库存不一致')
+    if summaries.verify():
+        violations.append('订单月度汇总与订单不一致')
+    if payments.drifts():
+        violations.append('订单尾款与收款记录不一致')
+    return violations
@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import TruncDate
+
+from apps.client.models import Client
+
+
+class Command(BaseCommand):
+    help = '按客户级别和最近一次跟进时间重新计算全部客户的最晚跟进日期(next_follow_due)'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            # 每个级别一条 UPDATE, 不需要把客户逐个加载到内存
+            cleared = Client.objects.exclude(level__in=Client.FOLLOW_UP_DAYS).update(next_follow_due=None)
+            updated = 0
+            for level, days in Client.FOLLOW_UP_DAYS.items():
+                updated += Client.objects.filter(level=level).update(
+                    next_follow_due=TruncDate(F('last_follow_time') + timedelta(days=days))
+                )
+        self.stdout.write(self.style.SUCCESS(f'最晚跟进日期回填完成: 需要跟进{updated}位, 无需跟进{cleared}位!'))
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.6 on 2026-10-18 18:04
+
+from django.conf import settings
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import TruncDate
+
+# 迁移时的跟进期限规则(与 Client.FOLLOW_UP_DAYS 一致)
+FOLLOW_UP_DAYS = {1: 1, 2: 7, 3: 30}
+
+
+def backfill_next_follow_due(apps, schema_editor):
+    Client = apps.get_model('client', 'Client')
+    for level, days in FOLLOW_UP_DAYS.items():
+        Client.objects.filter(level=level).update(
+            next_follow_due=TruncDate(F('last_follow_time') + timedelta(days=days))
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0002_alter_client_telephone'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='next_follow_due',
+            field=models.DateField(blank=True, db_index=True, null=True, verbose_name='最晚跟进日期'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['staff', 'next_follow_due'], name='client_staff_follow_due_idx'),
+        ),
+        migrations.RunPython(backfill_next_follow_due, migrations.RunPython.noop),
+    ]
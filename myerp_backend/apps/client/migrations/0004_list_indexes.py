@@ -0,0 +1,27 @@
+# Generated by Django 5.1.6 on 2026-10-18 18:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0003_client_next_follow_due'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['level', 'last_follow_time'], name='client_level_follow_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['staff', 'level', 'last_follow_time'], name='client_staff_level_follow_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='followuprecord',
+            index=models.Index(fields=['client', 'created_at'], name='follow_client_created_idx'),
+        ),
+    ]
@@ -2,6 +2,7 @@ from django.db import models
 from django.utils import timezone
 from datetime import timedelta
 from shortuuidfield import ShortUUIDField
+from apps.search import tokens
 from apps.staff.models import ERPUser
 
 # Create your models here.
@@ -16,6 +17,8 @@ class Client(models.Model):
         (4, '四级客户'),
         (5, '已流失'),
     )
+    # 各级别客户的跟进期限(天): 一级客户需要次日跟进, 二级客户需要一周内跟进, 三级客户需要一月内跟进
+    FOLLOW_UP_DAYS = {1: 1, 2: 7, 3: 30}
     
     uid = ShortUUIDField(primary_key=True)
     name = models.CharField(max_length=30, verbose_name='客户姓名')
@@ -24,6 +27,7 @@ class Client(models.Model):
     remark = models.TextField(blank=True, null=True, verbose_name='备注信息')
     level = models.IntegerField(choices=LEVEL_CHOICES, default=1, verbose_name='客户级别')
     last_follow_time = models.DateTimeField(default=timezone.now, verbose_name='最近一次跟进时间')
+    next_follow_due = models.DateField(null=True, blank=True, db_index=True, verbose_name='最晚跟进日期')
     staff = models.ForeignKey(ERPUser, on_delete=models.CASCADE, related_name='clients', verbose_name='所属员工')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
@@ -32,28 +36,44 @@ class Client(models.Model):
         verbose_name = '客户'
         verbose_name_plural = verbose_name
         ordering = ['level', 'last_follow_time']
+        indexes = [
+            models.Index(fields=['staff', 'next_follow_due'], name='client_staff_follow_due_idx'),
+            # 客户列表按 (级别, 最近跟进时间) 排序, 员工只能查看自己的客户
+            models.Index(fields=['level', 'last_follow_time'], name='client_level_follow_idx'),
+            models.Index(fields=['staff', 'level', 'last_follow_time'], name='client_staff_level_follow_idx'),
+        ]
     
     def __str__(self):
         return self.name
+
+    def save(self, *args, **kwargs):
+        """重写save方法，根据客户级别和最近一次跟进时间同步最晚跟进日期"""
+        self.next_follow_due = self.latest_follow_time.date() if self.latest_follow_time else None
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'level', 'last_follow_time'} & set(update_fields):
+            kwargs['update_fields'] = list(update_fields) + ['next_follow_due']
+        super().save(*args, **kwargs)
+        # 姓名/电话变化时更新检索词元
+        tokens.index_instance(self, update_fields=update_fields)
+
+    @staticmethod
+    def overdue_filter():
+        """
+        与 is_overdue 等价的查询条件: 最晚跟进日期不晚于明天, 且今天还没有跟进过
+        (四级/已成交/已流失客户的 next_follow_due 为空, 不会被选中)
+        """
+        now = timezone.now()
+        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        return models.Q(next_follow_due__lte=now.date() + timedelta(days=1), last_follow_time__lt=today_start)
     
     @property
     def latest_follow_time(self):
         """计算最晚跟进时间"""
-        if self.level == 0 or self.level == 5:
-            return None
-        
-        if self.level == 1:
-            # 一级客户需要次日跟进
-            return self.last_follow_time + timedelta(days=1)
-        elif self.level == 2:
-            # 二级客户需要一周内跟进
-            return self.last_follow_time + timedelta(days=7)
-        elif self.level == 3:
-            # 三级客户需要一月内跟进
-            return self.last_follow_time + timedelta(days=30)
-        elif self.level == 4:
-            # 四级客户不需要跟进
+        days = self.FOLLOW_UP_DAYS.get(self.level)
+        if days is None:
+            # 已成交/已流失/四级客户不需要跟进
             return None
+        return self.last_follow_time + timedelta(days=days)
     
     @property
     def is_overdue(self):
@@ -97,6 +117,9 @@ class FollowUpRecord(models.Model):
         verbose_name = '跟进记录'
         verbose_name_plural = verbose_name
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['client', 'created_at'], name='follow_client_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.client.name}的跟进记录-{self.created_at.strftime('%Y-%m-%d')}"
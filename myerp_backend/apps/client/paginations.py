@@ -1,7 +1,8 @@
-from rest_framework.pagination import PageNumberPagination
+from apps.common.paginations import PageOrCursorPagination
 
-class ClientPagination(PageNumberPagination):
+class ClientPagination(PageOrCursorPagination):
     """客户列表分页类"""
     page_size = 15  # 每页显示15条记录
     page_size_query_param = 'page_size'  # 允许客户端通过page_size参数覆盖页面大小
-    max_page_size = 100  # 最大页面大小 
\ No newline at end of file
+    max_page_size = 100  # 最大页面大小
+    keyset_ordering = ('level', 'last_follow_time', 'uid')  # 游标分页排序键, 与列表排序一致
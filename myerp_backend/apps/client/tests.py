@@ -1,3 +1,59 @@
+from datetime import timedelta
+
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.staff.models import ERPUser
+
+from .models import Client
+
+
+class OverdueClientTest(TestCase):
+    """需要跟进的客户接口: 查询条件与 is_overdue 一致, 默认返回列表"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.boss = ERPUser.objects.create_superuser(account='boss', name='老板', telephone='13000000000',
+                                                    password='111111')
+        now = timezone.now()
+        offsets = [timedelta(0), timedelta(days=1), timedelta(days=2), timedelta(days=6), timedelta(days=7),
+                   timedelta(days=8), timedelta(days=29), timedelta(days=30), timedelta(days=31)]
+        for level, _ in Client.LEVEL_CHOICES:
+            for offset in offsets:
+                Client.objects.create(name=f'{level}-{offset.days}', address='地址', level=level,
+                                      last_follow_time=now - offset, staff=cls.boss)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.boss)
+
+    def expected(self, clients):
+        return sorted((client for client in clients if client.is_overdue),
+                      key=lambda client: (client.level, client.last_follow_time, client.uid))
+
+    def test_overdue_matches_is_overdue(self):
+        response = self.client.get('/api/client/overdue/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response.data, list)
+        expected = self.expected(Client.objects.exclude(level__in=[0, 5]))
+        self.assertTrue(expected)
+        self.assertEqual([row['uid'] for row in response.data], [client.uid for client in expected])
+        self.assertTrue(all(row['is_overdue'] for row in response.data))
+
+    def test_overdue_level_filter(self):
+        for level in (1, 2, 3, 4):
+            response = self.client.get('/api/client/overdue/', {'level': level})
+            expected = self.expected(Client.objects.filter(level=level))
+            self.assertEqual([row['uid'] for row in response.data], [client.uid for client in expected])
+
+    def test_overdue_paginated_on_request(self):
+        expected = [client.uid for client in self.expected(Client.objects.exclude(level__in=[0, 5]))]
+
+        response = self.client.get('/api/client/overdue/', {'page': 1, 'page_size': 2})
+        self.assertEqual(response.data['count'], len(expected))
+        self.assertEqual([row['uid'] for row in response.data['results']], expected[:2])
 
-# Create your tests here.
+        response = self.client.get('/api/client/overdue/', {'cursor': '', 'page_size': 2})
+        self.assertEqual([row['uid'] for row in response.data['results']], expected[:2])
+        self.assertIsNotNone(response.data['next'])
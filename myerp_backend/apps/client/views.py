@@ -3,9 +3,8 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Q
-from django.utils import timezone
 from apps.staff.permissions import IsBoss,IsManager
+from apps.search import tokens
 
 from .models import Client, FollowUpRecord
 from .serializers import (
@@ -68,12 +67,12 @@ class ClientModelViewSet(viewsets.GenericViewSet,
             # 按客户名称筛选
             name = request.query_params.get('name')
             if name:
-                queryset = queryset.filter(name__contains=name)
+                queryset = tokens.filter_queryset(queryset, 'client.name', name)
             
             # 按电话筛选
             telephone = request.query_params.get('telephone')
             if telephone:
-                queryset = queryset.filter(telephone__contains=telephone)
+                queryset = tokens.filter_queryset(queryset, 'client.telephone', telephone)
         else:
             # 没有筛选参数时，默认排除已成交和已流失的客户
             queryset = queryset.exclude(level__in=[0, 5])
@@ -138,23 +137,27 @@ class ClientModelViewSet(viewsets.GenericViewSet,
     
     @action(detail=False, methods=['get'])
     def overdue(self, request):
-        """获取已过期需要跟进的客户列表"""
+        """
+        获取已过期需要跟进的客户列表(按最晚跟进日期的索引范围查询)
+
+        默认与原接口一致直接返回全部客户的列表; 请求带 ?page= 或 ?cursor= 时才返回分页对象
+        """
         # 获取基本的查询集，这里会应用上面的筛选逻辑
         queryset = self.get_queryset()
         
-        # 如果没有明确的级别筛选，确保排除不需要跟进的客户级别
-        level = request.query_params.get('level')
-        if not level or not level.isdigit():
-            queryset = queryset.filter(~Q(level=0) & ~Q(level=4) & ~Q(level=5))
-        
-        # 在Python层面过滤过期客户，因为is_overdue是计算属性
-        overdue_clients = [client for client in queryset if client.is_overdue]
+        # 四级/已成交/已流失客户的最晚跟进日期为空, 范围条件会自然排除
+        queryset = queryset.filter(Client.overdue_filter())
         
         # 排序：先按客户级别，再按最后跟进时间的升序排序（最久未跟进的排前面）
-        overdue_clients.sort(key=lambda x: (x.level, x.last_follow_time or timezone.now().replace(year=2000)))
+        queryset = queryset.order_by('level', 'last_follow_time', 'uid')
+        
+        paginator = self.paginator
+        if {paginator.page_query_param, paginator.cursor_query_param} & set(request.query_params):
+            page = self.paginate_queryset(queryset)
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
         
-        # 不进行分页，直接返回所有需要跟进的客户
-        serializer = self.get_serializer(overdue_clients, many=True)
+        serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
 class AllClientViewSet(viewsets.GenericViewSet,
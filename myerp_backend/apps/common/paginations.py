@@ -0,0 +1,209 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.paginator import Paginator, Page, InvalidPage
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+# 超过该数量时, 估算模式不再精确计数
+ESTIMATE_THRESHOLD = 1000
+
+
+def estimate_count(queryset):
+    """
+    估算查询结果条数: 结果较少时精确计数(最多扫描 ESTIMATE_THRESHOLD 行),
+    较多时 MySQL 使用 EXPLAIN 的 rows 估算值, 其他数据库退回 COUNT(*)
+    """
+    capped = queryset.order_by()[:ESTIMATE_THRESHOLD + 1].count()
+    if capped <= ESTIMATE_THRESHOLD:
+        return capped
+
+    connection = connections[queryset.db]
+    if connection.vendor == 'mysql':
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {sql}', params)
+            columns = [column[0].lower() for column in cursor.description]
+            rows = [row[columns.index('rows')] or 0 for row in cursor.fetchall()]
+        if rows:
+            return max(max(rows), capped)
+    return queryset.count()
+
+
+def keyset_filter(ordering, position, nullable=()):
+    """
+    排在 position 之后的行的查询条件
+    (a DESC, b DESC) 在 (va, vb) 之后: a < va OR (a = va AND b < vb)
+
+    nullable 中的字段按 MySQL/SQLite 的规则把 NULL 视为最小值: 升序排在最前, 降序排在最后
+    """
+    condition = Q()
+    equal = {}
+    for field, value in zip(ordering, position):
+        name = field.lstrip('-')
+        descending = field.startswith('-')
+        if value is None:
+            # NULL 之后只有(升序时的)非 NULL 值
+            if not descending:
+                condition |= Q(**equal, **{f'{name}__isnull': False})
+        else:
+            after = Q(**{f'{name}__{"lt" if descending else "gt"}': value})
+            if descending and name in nullable:
+                after |= Q(**{f'{name}__isnull': True})
+            condition |= Q(**equal) & after
+        equal[name] = value  # value 为 None 时 Django 生成 IS NULL
+    return condition
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    使用估算总数的分页器: 估算值可能偏小, 因此不校验页码上限, 超出范围时返回空页
+    """
+
+    @property
+    def count(self):
+        if not hasattr(self, '_estimated_count'):
+            self._estimated_count = estimate_count(self.object_list)
+        return self._estimated_count
+
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise InvalidPage('页码必须是整数')
+        if number < 1:
+            raise InvalidPage('页码必须大于0')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        return Page(self.object_list[bottom:bottom + self.per_page], number, self)
+
+
+class KeysetPagination(BasePagination):
+    """
+    键集(游标)分页: 用上一页最后一行的排序键作为条件取下一页, 不做 COUNT(*) 也没有 OFFSET
+
+    ordering 必须以唯一字段结尾(例如 id), 保证排序稳定
+    """
+    page_size = 10
+    cursor_query_param = 'cursor'
+    ordering = ('-id',)
+    estimate_count = False
+    invalid_cursor_message = '无效的分页游标'
+
+    def __init__(self, ordering=None, page_size=None, cursor_query_param=None, estimate_count=None):
+        if ordering is not None:
+            self.ordering = ordering
+        if page_size is not None:
+            self.page_size = page_size
+        if cursor_query_param is not None:
+            self.cursor_query_param = cursor_query_param
+        if estimate_count is not None:
+            self.estimate_count = estimate_count
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.count = estimate_count(queryset) if self.estimate_count else None
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            nullable = {name for name in self.field_names() if queryset.model._meta.get_field(name).null}
+            queryset = queryset.filter(self.keyset_filter(position, nullable))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.next_position = [self.get_value(rows[-1], field) for field in self.field_names()] if has_next else None
+        return rows
+
+    def get_paginated_response(self, data):
+        content = OrderedDict()
+        if self.count is not None:
+            content['count'] = self.count
+            content['count_estimated'] = True
+        content['next'] = self.get_next_link()
+        content['previous'] = None
+        content['results'] = data
+        return Response(content)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param,
+                                   self.encode_cursor(self.next_position))
+
+    def field_names(self):
+        return [field.lstrip('-') for field in self.ordering]
+
+    def keyset_filter(self, position, nullable=()):
+        return keyset_filter(self.ordering, position, nullable)
+
+    @staticmethod
+    def get_value(row, field):
+        return row[field] if isinstance(row, dict) else getattr(row, field)
+
+    def encode_cursor(self, position):
+        raw = json.dumps([
+            value.isoformat() if hasattr(value, 'isoformat') else None if value is None else str(value)
+            for value in position
+        ])
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            fields = self.field_names()
+            if not isinstance(values, list) or len(values) != len(fields):
+                raise ValueError
+            return [None if value is None else model._meta.get_field(field).to_python(value)
+                    for field, value in zip(fields, values)]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+
+class PageOrCursorPagination(PageNumberPagination):
+    """
+    默认按页码分页; 请求带 ?cursor= 时改用键集分页(cursor 为空表示第一页)
+    ?count=estimate 时总数使用估算值, 避免大表全表 COUNT(*)
+
+    子类通过 keyset_ordering 声明与列表一致、且以唯一字段结尾的排序键
+    """
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    keyset_ordering = ('-id',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        estimate = request.query_params.get(self.count_query_param) == 'estimate'
+
+        if self.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination(
+                ordering=self.keyset_ordering,
+                page_size=self.get_page_size(request),
+                cursor_query_param=self.cursor_query_param,
+                estimate_count=estimate
+            )
+            return self.keyset.paginate_queryset(queryset, request, view)
+
+        self.keyset = None
+        if estimate:
+            self.django_paginator_class = EstimatedCountPaginator
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        response = super().get_paginated_response(data)
+        if self.django_paginator_class is EstimatedCountPaginator:
+            response.data['count_estimated'] = True
+        return response
@@ -0,0 +1,118 @@
+import functools
+import logging
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from apps.metrics import histograms
+
+logger = logging.getLogger(__name__)
+
+# MySQL 错误码: 死锁(整个事务已被回滚) / 锁等待超时 / NOWAIT 加锁失败
+DEADLOCK = 1213
+LOCK_WAIT_TIMEOUT = 1205
+LOCK_NOWAIT = 3572
+
+MAX_BACKOFF = 1.0  # 单次退避的上限(秒)
+
+# 当前事务加锁时是否使用 NOWAIT, 由 atomic(nowait=...) 设置, for_update() 读取
+_nowait = ContextVar('nowait', default=False)
+
+
+class LockContention(APIException):
+    """
+    锁冲突重试用尽(或 NOWAIT 加锁失败), DRF 转换为 503 {'detail': ...}
+    """
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = '系统繁忙, 数据正在被其他操作修改, 请稍后重试'
+    default_code = 'lock_contention'
+
+
+def classify(error):
+    """
+    判断数据库异常是否为锁冲突, 返回 'deadlock' / 'lock_timeout' / 'nowait', 其他异常返回 None
+    """
+    if not isinstance(error, DatabaseError):
+        return None
+    code = error.args[0] if error.args else None
+    if code == DEADLOCK:
+        return 'deadlock'
+    if code == LOCK_WAIT_TIMEOUT:
+        return 'lock_timeout'
+    if code == LOCK_NOWAIT:
+        return 'nowait'
+    if 'database is locked' in str(error):  # SQLite 写锁被占用
+        return 'lock_timeout'
+    return None
+
+
+def raise_if_retryable(error):
+    """
+    视图中 except Exception 把所有异常转换为 400, 在此之前调用:
+    锁冲突继续抛出交给 atomic() 重试, 重试用尽的 LockContention 继续抛出由 DRF 返回 503
+    """
+    if isinstance(error, LockContention) or classify(error) is not None:
+        raise error
+
+
+def backoff(attempt):
+    """
+    第 attempt 次重试前的等待时间: 指数退避加全随机抖动, 避免冲突的事务同时重试再次冲突
+    """
+    return random.uniform(0, min(MAX_BACKOFF, settings.DB_RETRY_BACKOFF * 2 ** (attempt - 1)))
+
+
+def for_update(queryset):
+    """
+    select_for_update, 在 atomic(nowait=True) 中加锁不等待(锁被占用时立即报错)
+    """
+    return queryset.select_for_update(nowait=_nowait.get())
+
+
+def atomic(func=None, *, attempts=None, nowait=None, using=None):
+    """
+    代替 transaction.atomic 的装饰器: 遇到死锁/锁等待超时时回滚并重新执行整个函数
+
+    函数必须是完整的事务(重新执行时从头读取数据), 已在外层事务中时只执行一次, 由最外层负责重试.
+    nowait=True (默认取 settings.DB_LOCK_NOWAIT) 时 for_update() 不等待锁, 冲突立即返回 503 而不重试.
+    重试用尽抛出 LockContention; 每次重试和最终失败按函数名计入 /api/metrics
+    """
+    def decorator(func):
+        name = func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if transaction.get_connection(using).in_atomic_block:
+                with transaction.atomic(using=using):
+                    return func(*args, **kwargs)
+
+            total = attempts or settings.DB_RETRY_ATTEMPTS
+            token = _nowait.set(settings.DB_LOCK_NOWAIT if nowait is None else nowait)
+            try:
+                for attempt in range(1, total + 1):
+                    try:
+                        with transaction.atomic(using=using):
+                            return func(*args, **kwargs)
+                    except DatabaseError as e:
+                        reason = classify(e)
+                        if reason is None:
+                            raise
+                        if reason == 'nowait' or attempt == total:
+                            histograms.count_lock_failure(name, reason)
+                            logger.warning('%s 锁冲突(%s), 第%d次执行失败, 不再重试', name, reason, attempt)
+                            raise LockContention() from e
+                        histograms.count_retry(name, reason)
+                        delay = backoff(attempt)
+                        logger.info('%s 锁冲突(%s), %.0fms 后第%d次重试', name, reason, delay * 1000, attempt)
+                        time.sleep(delay)
+            finally:
+                _nowait.reset(token)
+
+        return wrapper
+
+    return decorator(func) if func is not None else decorator
@@ -0,0 +1,245 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+from faker import Faker
+
+from apps.brand.models import Brand
+from apps.category.models import Category
+from apps.client.models import Client, FollowUpRecord
+from apps.inventory import valuations
+from apps.inventory.models import (Inventory, Purchase, PurchaseDetail, PurchaseLog, Receive, ReceiveDetail,
+                                   ReceiveLog, InventoryLog)
+from apps.order import summaries
+from apps.order.models import Order, OrderDetail, OperationLog, BalancePayment
+from apps.search import tokens
+from apps.staff.models import ERPUser
+
+# 合成数据的名称/编号前缀, 便于识别和清理
+PREFIX = 'SEED'
+BATCH_SIZE = 2000
+CHUNK_SIZE = 10000  # 客户/订单分块生成和写入, 百万级数据也不会全部留在内存中
+
+
+@contextmanager
+def backdated(*fields):
+    """
+    临时关闭时间字段的 auto_now/auto_now_add, 使批量写入可以指定历史时间
+    """
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _field(model, name):
+    return model._meta.get_field(name)
+
+
+def _ids(queryset, key):
+    """
+    bulk_create 在 MySQL 上不回填自增主键, 写入后按唯一的名称/编号重新取回主键
+    """
+    return dict(queryset.values_list(key, 'pk'))
+
+
+def exists():
+    """
+    数据库中是否已有合成数据
+    """
+    return ERPUser.objects.filter(account__startswith=PREFIX.lower()).exists()
+
+
+def unused_telephone(prefix, *models, batch=1000):
+    """
+    返回以 prefix 开头、在 models 的 telephone 字段中都未使用的11位手机号
+
+    压测/基准命令创建临时员工/客户时使用, 不与真实数据和合成数据(员工 199xxxxxxxx, 客户 13xxxxxxxxx)冲突
+    """
+    width = 11 - len(prefix)
+    for start in range(0, 10 ** width, batch):
+        candidates = [f'{prefix}{i:0{width}d}' for i in range(start, min(start + batch, 10 ** width))]
+        used = set()
+        for model in models:
+            used.update(model.objects.filter(telephone__in=candidates).values_list('telephone', flat=True))
+        for telephone in candidates:
+            if telephone not in used:
+                return telephone
+    raise ValueError(f'没有以 {prefix} 开头的可用手机号')
+
+
+def flush():
+    """
+    删除全部合成数据(级联删除其订单/客户/单据/日志), 并重建派生表
+    """
+    Order.objects.filter(order_number__startswith=PREFIX).delete()
+    ERPUser.objects.filter(account__startswith=PREFIX.lower()).delete()
+    Brand.objects.filter(intro=PREFIX).delete()
+    Category.objects.filter(name__startswith='基准分类').delete()
+    rebuild_derived()
+
+
+def rebuild_derived():
+    """
+    批量写入绕过了模型的 save, 重建库存价值/订单月度汇总/检索词元
+    """
+    valuations.rebuild()
+    summaries.rebuild()
+    for kind in tokens.SEARCH_FIELDS:
+        tokens.rebuild(kind)
+
+
+def seed(orders=100000, staff=10, brands=5, categories=5, inventories=1000, days=730, random_seed=0,
+         derived=True, progress=None):
+    """
+    批量写入一套合成业务数据: 员工/品牌/分类/库存/客户/跟进记录/订单/订单明细/尾款/操作日志/发货/入库/库存日志
+
+    第一个员工为老板(账号 seed0, 密码 111111); 客户数为订单数的 1/5, 发货单和入库单各为订单数的 1/20,
+    时间均匀分布在最近 days 天内. 数据通过 bulk_create 写入, 不经过模型的 save;
+    derived=True 时最后重建派生表, 使合成数据与接口读取的汇总保持一致. 返回各表写入的行数
+    progress(已写入订单数, 订单总数) 在每块订单写入后调用
+    """
+    rng = random.Random(random_seed)
+    faker = Faker('zh_CN')
+    faker.seed_instance(random_seed)
+    now = timezone.now()
+    start = now - timedelta(days=days)
+
+    def moment(after=None):
+        begin = after or start
+        return begin + timedelta(seconds=rng.uniform(0, max((now - begin).total_seconds(), 1)))
+
+    counts = {}
+
+    # 员工(第一个为老板)
+    password = make_password('111111')
+    users = [ERPUser(account=f'{PREFIX.lower()}{i}', name=f'压测员工{i}', telephone=f'199{i:08d}', password=password,
+                     is_boss=i == 0, is_manager=i == 0, is_storekeeper=i == 0) for i in range(staff)]
+    ERPUser.objects.bulk_create(users, batch_size=BATCH_SIZE)
+    user_ids = [user.pk for user in users]
+    counts['staff'] = len(users)
+
+    with backdated(_field(Brand, 'create_time'), _field(Category, 'create_time')):
+        Brand.objects.bulk_create([Brand(name=f'基准品牌{i}', intro=PREFIX, create_time=start) for i in range(brands)])
+        Category.objects.bulk_create([Category(name=f'基准分类{i}', create_time=start) for i in range(categories)])
+    brand_ids = list(_ids(Brand.objects.filter(intro=PREFIX), 'name').values())
+    category_ids = list(_ids(Category.objects.filter(name__startswith='基准分类'), 'name').values())
+    counts['brands'], counts['categories'] = len(brand_ids), len(category_ids)
+
+    Inventory.objects.bulk_create([
+        Inventory(name=f'{PREFIX}-{i}', brand_id=rng.choice(brand_ids), category_id=rng.choice(category_ids),
+                  cost=Decimal(rng.randint(100, 5000)), on_road=rng.randint(0, 5), in_stock=rng.randint(0, 50))
+        for i in range(inventories)
+    ], batch_size=BATCH_SIZE)
+    inventory_ids = list(Inventory.objects.filter(name__startswith=f'{PREFIX}-').values_list('pk', flat=True))
+    counts['inventories'] = len(inventory_ids)
+
+    # 客户及其跟进记录, 只保留 (uid, 员工) 供订单引用
+    client_refs = []
+    client_total = max(orders // 5, 1)
+    for begin in range(0, client_total, CHUNK_SIZE):
+        clients = []
+        for i in range(begin, min(begin + CHUNK_SIZE, client_total)):
+            client = Client(name=faker.name(), telephone=f'13{i:09d}', address=faker.address()[:200],
+                            level=rng.randint(0, 5), last_follow_time=moment(), staff_id=rng.choice(user_ids),
+                            created_at=start)
+            client.next_follow_due = client.latest_follow_time.date() if client.latest_follow_time else None
+            clients.append(client)
+        with backdated(_field(Client, 'created_at'), _field(FollowUpRecord, 'created_at')):
+            Client.objects.bulk_create(clients, batch_size=BATCH_SIZE)
+            FollowUpRecord.objects.bulk_create([
+                FollowUpRecord(client=client, staff_id=client.staff_id, content='合成跟进记录',
+                               created_at=client.last_follow_time)
+                for client in clients
+            ], batch_size=BATCH_SIZE)
+        client_refs += [(client.pk, client.staff_id) for client in clients]
+    counts['clients'] = counts['follow_records'] = len(client_refs)
+
+    # 订单: 约 1/10 作废, 已送货订单约一半已结清(收取一笔尾款)
+    counts.update(orders=0, order_details=0, balance_payments=0, operation_logs=0)
+    for begin in range(0, orders, CHUNK_SIZE):
+        rows = []
+        for i in range(begin, min(begin + CHUNK_SIZE, orders)):
+            total_amount = Decimal(rng.randint(10, 500) * 100)
+            down_payment = (total_amount * Decimal(rng.choice(['0.3', '0.5', '1']))).quantize(Decimal('1'))
+            delivery_status = rng.choices((1, 2, 3), weights=(3, 6, 1))[0]
+            received = total_amount - down_payment if delivery_status == 2 and rng.random() < 0.5 else Decimal(0)
+            pending = total_amount - down_payment - received
+            total_cost = (total_amount * Decimal('0.6')).quantize(Decimal('1'))
+            client_id, staff_id = rng.choice(client_refs)
+            rows.append(Order(
+                order_number=f'{PREFIX}{i:08d}', brand_id=rng.choice(brand_ids), client_id=client_id,
+                staff_id=staff_id, sign_time=moment(), total_amount=total_amount, down_payment=down_payment,
+                received_balance=received, pending_balance=pending, delivery_status=delivery_status,
+                payment_status=3 if delivery_status == 3 else (2 if pending <= 0 else 1),
+                total_cost=total_cost, gross_profit=total_amount - total_cost, address='合成地址'
+            ))
+        with backdated(_field(Order, 'sign_time')):
+            Order.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+        order_ids = _ids(Order.objects.filter(order_number__gte=rows[0].order_number,
+                                              order_number__lte=rows[-1].order_number), 'order_number')
+
+        details, payments, logs = [], [], []
+        for order in rows:
+            order_id = order_ids[order.order_number]
+            for inventory_id in rng.sample(inventory_ids, 2):
+                details.append(OrderDetail(order_id=order_id, inventory_id=inventory_id, quantity=rng.randint(1, 3)))
+            logs.append(OperationLog(order_id=order_id, description=f'创建订单: {order.order_number}',
+                                     operator_id=order.staff_id, created_at=order.sign_time))
+            if order.received_balance:
+                paid_at = moment(order.sign_time)
+                payments.append(BalancePayment(order_id=order_id, amount=order.received_balance,
+                                               operator_id=order.staff_id, payment_time=paid_at))
+                logs.append(OperationLog(order_id=order_id, description=f'收到尾款 ¥{order.received_balance}',
+                                         operator_id=order.staff_id, created_at=paid_at))
+        OrderDetail.objects.bulk_create(details, batch_size=BATCH_SIZE)
+        with backdated(_field(BalancePayment, 'payment_time'), _field(OperationLog, 'created_at')):
+            BalancePayment.objects.bulk_create(payments, batch_size=BATCH_SIZE)
+            OperationLog.objects.bulk_create(logs, batch_size=BATCH_SIZE)
+        counts['orders'] += len(rows)
+        counts['order_details'] += len(details)
+        counts['balance_payments'] += len(payments)
+        counts['operation_logs'] += len(logs)
+        if progress:
+            progress(counts['orders'], orders)
+
+    # 发货单/入库单及其日志
+    for model, detail_model, log_model, parent in (
+            (Purchase, PurchaseDetail, PurchaseLog, 'purchase'), (Receive, ReceiveDetail, ReceiveLog, 'receive')):
+        extra = {'total_cost': Decimal(0)} if model is Purchase else {}
+        with backdated(_field(model, 'create_time')):
+            model.objects.bulk_create([
+                model(brand_id=rng.choice(brand_ids), user_id=rng.choice(user_ids), create_time=moment(), **extra)
+                for _ in range(max(orders // 20, 1))
+            ], batch_size=BATCH_SIZE)
+        # 合成单据没有唯一编号, 按合成员工取回本次写入的单据
+        parents = list(model.objects.filter(user_id__in=user_ids).values_list('pk', 'create_time'))
+        detail_model.objects.bulk_create([
+            detail_model(**{f'{parent}_id': pk}, inventory_id=inventory_id, quantity=rng.randint(1, 10))
+            for pk, _ in parents for inventory_id in rng.sample(inventory_ids, 3)
+        ], batch_size=BATCH_SIZE)
+        with backdated(_field(log_model, 'create_time')):
+            log_model.objects.bulk_create([
+                log_model(**{f'{parent}_id': pk}, content='合成单据日志', operator_id=rng.choice(user_ids),
+                          create_time=moment(create_time))
+                for pk, create_time in parents for _ in range(2)
+            ], batch_size=BATCH_SIZE)
+        counts[parent] = len(parents)
+
+    with backdated(_field(InventoryLog, 'create_time')):
+        InventoryLog.objects.bulk_create([
+            InventoryLog(content='合成库存日志', operator_id=rng.choice(user_ids), create_time=moment())
+            for _ in range(max(orders // 10, 1))
+        ], batch_size=BATCH_SIZE)
+    counts['inventory_logs'] = max(orders // 10, 1)
+
+    if derived:
+        rebuild_derived()
+    return counts
@@ -0,0 +1,199 @@
+import base64
+import json
+from datetime import timedelta
+
+from django.db import IntegrityError, OperationalError, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from apps.brand.models import Brand
+from apps.client.models import Client
+from apps.inventory.models import Inventory, Purchase
+from apps.job.models import Job
+from apps.metrics import histograms
+from apps.order.models import Order
+from apps.staff.models import ERPUser
+
+from . import paginations, retries
+
+
+@override_settings(DB_RETRY_ATTEMPTS=3, DB_RETRY_BACKOFF=0, DB_LOCK_NOWAIT=False)
+class RetryAtomicTest(TransactionTestCase):
+    """retries.atomic: 锁冲突时重新执行整个事务, 其他异常立即抛出"""
+
+    def setUp(self):
+        histograms.reset()
+        self.calls = 0
+
+    def failing(self, *errors):
+        """
+        返回一个被 retries.atomic 装饰的函数, 依次抛出 errors 中的异常, 之后返回执行次数
+        """
+        @retries.atomic
+        def operation():
+            self.calls += 1
+            if self.calls <= len(errors):
+                raise errors[self.calls - 1]
+            return self.calls
+        return operation
+
+    def events(self):
+        return {(event, reason): count for (event, _, reason), count in histograms.lock_events().items()}
+
+    def test_deadlock_is_retried(self):
+        operation = self.failing(OperationalError(retries.DEADLOCK, 'Deadlock found when trying to get lock'))
+        self.assertEqual(operation(), 2)
+        self.assertEqual(self.events(), {('retry', 'deadlock'): 1})
+
+    def test_other_errors_propagate_immediately(self):
+        operation = self.failing(IntegrityError(1062, "Duplicate entry 'A001'"))
+        with self.assertRaises(IntegrityError):
+            operation()
+        self.assertEqual(self.calls, 1)
+
+        self.calls = 0
+        operation = self.failing(OperationalError(1054, "Unknown column 'x'"))
+        with self.assertRaises(OperationalError):
+            operation()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.events(), {})
+
+    def test_retry_limit(self):
+        timeout = OperationalError(retries.LOCK_WAIT_TIMEOUT, 'Lock wait timeout exceeded')
+        operation = self.failing(*[timeout] * 5)
+        with self.assertRaises(retries.LockContention):
+            operation()
+        self.assertEqual(self.calls, 3)
+        self.assertEqual(self.events(), {('retry', 'lock_timeout'): 2, ('failure', 'lock_timeout'): 1})
+
+        self.calls = 0
+        operation = self.failing(*[timeout] * 4)
+        with override_settings(DB_RETRY_ATTEMPTS=5):
+            self.assertEqual(operation(), 5)
+
+    def test_nowait_fails_fast(self):
+        operation = self.failing(OperationalError(retries.LOCK_NOWAIT, 'Statement aborted because lock(s) '
+                                                                       'could not be acquired immediately'))
+        with self.assertRaises(retries.LockContention) as context:
+            operation()
+        self.assertEqual(context.exception.status_code, 503)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.events(), {('failure', 'nowait'): 1})
+
+    def test_nested_call_runs_once(self):
+        operation = self.failing(OperationalError(retries.DEADLOCK, 'Deadlock found when trying to get lock'))
+        with self.assertRaises(OperationalError):
+            with transaction.atomic():
+                operation()
+        self.assertEqual(self.calls, 1)
+
+    def test_for_update_uses_nowait_setting(self):
+        @retries.atomic(nowait=True)
+        def locked():
+            return retries.for_update(Inventory.objects).query.select_for_update_nowait
+
+        self.assertTrue(locked())
+        with override_settings(DB_LOCK_NOWAIT=True):
+            self.assertTrue(retries.atomic(locked.__wrapped__)())
+        self.assertFalse(retries.atomic(locked.__wrapped__)())
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+class KeysetPaginationTest(TestCase):
+    """游标分页: 排序键重复/NULL、非法游标、页码与游标切换"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.boss = ERPUser.objects.create_superuser(account='boss', name='老板', telephone='13000000000',
+                                                    password='111111')
+        cls.brand = Brand.objects.create(name='测试品牌', intro='')
+        moment = timezone.now() - timedelta(days=3)
+        # 7个客户的级别和最近跟进时间完全相同, 只能按 uid 区分先后
+        for i in range(7):
+            Client.objects.create(name=f'客户{i}', address='地址', level=1, last_follow_time=moment, staff=cls.boss)
+        Client.objects.create(name='二级客户', address='地址', level=2, last_follow_time=moment, staff=cls.boss)
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.boss)
+
+    def walk(self, url, params):
+        """
+        从第一页开始沿 next 链接取完全部页, 返回各页结果的 ID 列表
+        """
+        pages = []
+        response = self.api.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            pages.append([row.get('uid', row.get('id')) for row in response.data['results']])
+            if response.data['next'] is None:
+                return pages
+            response = self.api.get(response.data['next'])
+
+    def test_ties_across_page_boundary(self):
+        pages = self.walk('/api/client/', {'cursor': '', 'page_size': 3})
+        expected = list(Client.objects.order_by('level', 'last_follow_time', 'uid').values_list('uid', flat=True))
+        self.assertEqual([len(page) for page in pages], [3, 3, 2])
+        self.assertEqual(sum(pages, []), expected)
+
+        order = {'brand': self.brand, 'client': Client.objects.first(), 'staff': self.boss, 'total_amount': 100,
+                 'down_payment': 0, 'total_cost': 0, 'gross_profit': 100, 'address': '地址'}
+        for i in range(5):
+            Order.objects.create(order_number=f'P{i}', **order)
+        Order.objects.update(sign_time=timezone.now())
+        pages = self.walk('/api/orders/', {'cursor': '', 'page_size': 2})
+        self.assertEqual(sum(pages, []), list(Order.objects.order_by('-id').values_list('id', flat=True)))
+
+        Purchase.objects.bulk_create([Purchase(brand=self.brand, total_cost=0, user=self.boss) for _ in range(25)])
+        Purchase.objects.update(create_time=timezone.now())
+        pages = self.walk('/api/purchase/list/', {'cursor': ''})
+        self.assertEqual([len(page) for page in pages], [20, 5])
+        self.assertEqual(sum(pages, []), list(Purchase.objects.order_by('-id').values_list('id', flat=True)))
+
+    def test_null_sort_keys_are_not_dropped(self):
+        moment = timezone.now()
+        for start_time in (None, moment, None, moment, moment - timedelta(hours=1), None, moment):
+            Job.objects.create(kind='test', created_by=self.boss, start_time=start_time)
+        factory = APIRequestFactory()
+
+        for ordering in (('start_time', 'id'), ('-start_time', 'id'), ('-start_time', '-id')):
+            paginator = paginations.KeysetPagination(ordering=ordering, page_size=2)
+            ids, cursor = [], ''
+            while cursor is not None:
+                request = Request(factory.get('/', {'cursor': cursor}))
+                ids += [job.id for job in paginator.paginate_queryset(Job.objects.all(), request)]
+                cursor = paginator.encode_cursor(paginator.next_position) if paginator.next_position else None
+            expected = list(Job.objects.order_by(*ordering).values_list('id', flat=True))
+            self.assertEqual(ids, expected, ordering)
+
+    def test_invalid_cursor_is_not_found(self):
+        for cursor in ('not-base64!', encode_cursor({'level': 1}), encode_cursor([1, 'uid']),
+                       encode_cursor(['x', 'not-a-date', 'uid']), base64.urlsafe_b64encode(b'\xff').decode()):
+            response = self.api.get('/api/client/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 404, cursor)
+            self.assertEqual(response.data['detail'], '无效的分页游标')
+
+    def test_page_number_and_cursor(self):
+        response = self.api.get('/api/client/', {'page': 2, 'page_size': 3})
+        self.assertEqual(response.data['count'], 8)
+        self.assertIn('page=3', response.data['next'])
+        self.assertEqual(len(response.data['results']), 3)
+
+        response = self.api.get('/api/client/', {'cursor': '', 'page_size': 3})
+        self.assertNotIn('count', response.data)
+        self.assertIn('cursor=', response.data['next'])
+        self.assertNotIn('page=', response.data['next'])
+
+        response = self.api.get('/api/client/', {'cursor': '', 'page_size': 3, 'count': 'estimate'})
+        self.assertEqual((response.data['count'], response.data['count_estimated']), (8, True))
+
+        # 估算总数时不校验页码上限, 超出范围返回空页而不是 404
+        response = self.api.get('/api/client/', {'page': 100, 'count': 'estimate'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [])
+        self.assertTrue(response.data['count_estimated'])
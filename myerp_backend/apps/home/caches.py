@@ -0,0 +1,131 @@
+import random
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+# 首页看板的缓存名称
+INVENTORY_BY_BRAND = 'inventory_by_brand'  # 各品牌库存总价值
+STAFF_PERFORMANCE = 'staff_performance'  # 员工本月业绩
+MONTHLY_SALES = 'monthly_sales'  # 本年度每月销售额
+ORDER_STATS = 'order_stats'  # 订单列表顶部统计
+DASHBOARD_KEYS = (INVENTORY_BY_BRAND, STAFF_PERFORMANCE, MONTHLY_SALES, ORDER_STATS)
+
+FRESH_TIMEOUT = 60 * 5  # 新鲜期, 过期后由一个进程重建, 其余进程继续返回旧值
+STALE_TIMEOUT = 60 * 60  # 旧值最长保留时间
+LOCK_TIMEOUT = 30  # 重建锁的超时时间, 防止重建进程异常退出后永远不释放
+WAIT_TIMEOUT = 3  # 没有旧值可用时, 等待其他进程重建的最长时间
+STAT_KINDS = ('hit', 'miss', 'stale')
+
+
+def _version(name):
+    """
+    读取缓存版本号; 缓存不可用时返回 None
+    """
+    key = f'home:version:{name}'
+    version = cache.get(key)
+    if version is None:
+        # 用毫秒时间戳作为初始版本, 版本键被淘汰后也不会复用旧版本的数据
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _count(name, kind):
+    key = f'home:stats:{name}:{kind}'
+    try:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def _store(data_key, latest_key, value):
+    entry = {
+        'value': value,
+        # 新鲜期加入随机抖动, 避免所有看板在同一时刻集中过期
+        'fresh_until': time.time() + FRESH_TIMEOUT * random.uniform(0.9, 1.1),
+    }
+    cache.set_many({data_key: entry, latest_key: entry}, timeout=STALE_TIMEOUT)
+
+
+def get_or_build(name, builder, suffix=''):
+    """
+    读取看板缓存, 未命中或过期时只允许一个进程调用 builder 重建
+
+    suffix 用于区分同一看板的不同周期(例如年月), 周期变化后自然使用新的缓存
+    """
+    version = _version(name)
+    if version is None:
+        return builder()
+
+    data_key = f'home:{name}:{suffix}:{version}'
+    latest_key = f'home:{name}:{suffix}:latest'
+    lock_key = f'home:{name}:{suffix}:lock'
+
+    entry = cache.get(data_key)
+    if entry is not None and entry['fresh_until'] > time.time():
+        _count(name, 'hit')
+        return entry['value']
+
+    # 当前版本没有新鲜数据时, 旧版本的最后一次结果可以在重建期间继续使用
+    stale = entry if entry is not None else cache.get(latest_key)
+
+    if cache.add(lock_key, 1, timeout=LOCK_TIMEOUT):
+        try:
+            _count(name, 'miss')
+            value = builder()
+            _store(data_key, latest_key, value)
+            return value
+        finally:
+            cache.delete(lock_key)
+
+    if stale is not None:
+        _count(name, 'stale')
+        return stale['value']
+
+    # 没有任何旧值: 等待正在重建的进程, 超时后自行计算
+    deadline = time.time() + WAIT_TIMEOUT
+    while time.time() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(data_key)
+        if entry is not None:
+            _count(name, 'hit')
+            return entry['value']
+
+    _count(name, 'miss')
+    return builder()
+
+
+def invalidate(*names):
+    """
+    升级版本号使看板缓存失效, 旧数据仍作为重建期间的兜底
+    """
+    for name in names:
+        key = f'home:version:{name}'
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, int(time.time() * 1000), timeout=None)
+
+
+def invalidate_on_commit(*names):
+    """
+    在当前事务提交后再使缓存失效, 避免其他进程在提交前用旧数据重建
+    """
+    transaction.on_commit(lambda: invalidate(*names))
+
+
+def stats():
+    """
+    各看板缓存的命中/未命中/返回旧值次数
+    """
+    keys = {f'home:stats:{name}:{kind}': (name, kind) for name in DASHBOARD_KEYS for kind in STAT_KINDS}
+    values = cache.get_many(list(keys))
+    result = {name: {kind: 0 for kind in STAT_KINDS} for name in DASHBOARD_KEYS}
+    for key, (name, kind) in keys.items():
+        result[name][kind] = values.get(key, 0)
+    for counters in result.values():
+        total = counters['hit'] + counters['miss'] + counters['stale']
+        counters['hit_rate'] = round((counters['hit'] + counters['stale']) / total, 4) if total else 0
+    return result
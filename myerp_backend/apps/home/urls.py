@@ -12,4 +12,7 @@ urlpatterns = [
     
     # 获取当前年份1~12月的销售数据
     path('current-year-sales/', views.CurrentYearMonthlySalesView.as_view(), name='current_year_sales'),
+    
+    # 首页看板缓存命中统计
+    path('dashboard-cache-stats/', views.DashboardCacheStatsView.as_view(), name='dashboard_cache_stats'),
 ]
@@ -1,15 +1,14 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from django.db.models import Sum, Count, F, DecimalField, ExpressionWrapper
-from django.db.models.functions import TruncMonth
+from django.db.models import Sum, Count
 from django.utils import timezone
 import datetime
-from apps.inventory.models import Inventory
-from apps.order.models import Order
+from apps.inventory.models import InventoryValuation
+from apps.order.models import OrderMonthlySummary
 from rest_framework.permissions import IsAuthenticated
-from django.views.decorators.cache import cache_page
-from django.utils.decorators import method_decorator
+from apps.staff.permissions import IsBoss
+from . import caches
 
 class InventoryByBrandView(APIView):
     """
@@ -17,21 +16,10 @@ class InventoryByBrandView(APIView):
     """
     permission_classes = [IsAuthenticated]
     
-    @method_decorator(cache_page(60 * 5))  # 缓存5分钟
     def get(self, request):
         try:
-            # 获取所有品牌及其库存总价值
-            inventory_by_brand = Inventory.objects.values(
-                'brand__id', 
-                'brand__name'
-            ).annotate(
-                total_value=Sum(
-                    ExpressionWrapper(
-                        (F('on_road') + F('in_stock')) * F('cost'),
-                        output_field=DecimalField()
-                    )
-                )  # 每个品牌的库存总价值
-            ).order_by('-total_value')  # 按库存总价值降序排序
+            # 库存变动提交后缓存即失效, 无需按URL定时缓存
+            inventory_by_brand = caches.get_or_build(caches.INVENTORY_BY_BRAND, self.build)
             
             return Response({
                 'inventory_by_brand': inventory_by_brand
@@ -42,6 +30,16 @@ class InventoryByBrandView(APIView):
                 'detail': f'获取库存信息失败: {str(e)}'
             }, status=status.HTTP_400_BAD_REQUEST)
 
+    @staticmethod
+    def build():
+        # 获取所有品牌及其库存总价值(读取按品牌+分类维护的库存价值汇总表)
+        return list(InventoryValuation.objects.values(
+            'brand__id', 
+            'brand__name'
+        ).annotate(
+            total_value=Sum('total_value')  # 每个品牌的库存总价值
+        ).order_by('-total_value'))  # 按库存总价值降序排序
+
 
 class MonthlyOrdersByStaffView(APIView):
     """
@@ -49,7 +47,6 @@ class MonthlyOrdersByStaffView(APIView):
     """
     permission_classes = [IsAuthenticated]
 
-    @method_decorator(cache_page(60 * 5))
     def get(self, request):
         try:
             # 获取当前月的第一天和最后一天
@@ -60,23 +57,12 @@ class MonthlyOrdersByStaffView(APIView):
             else:
                 last_day = datetime.date(today.year, today.month + 1, 1) - datetime.timedelta(days=1)
             
-            # 查询本月的订单并按员工分组，只统计销售总金额
-            staff_performance = Order.objects.filter(
-                sign_time__date__gte=first_day,
-                sign_time__date__lte=last_day
-            ).exclude(
-                delivery_status=3  # 排除已作废订单
-            ).values(
-                'staff__uid', 
-                'staff__name'
-            ).annotate(
-                total_amount=Sum('total_amount')  # 订单总额
-            ).order_by('-total_amount')  # 按订单总额降序排序
-            
-            # 计算员工业绩占比
-            total_amount_sum = sum([staff['total_amount'] for staff in staff_performance]) or 1
-            for staff in staff_performance:
-                staff['amount_percentage'] = round(float(staff['total_amount']) / float(total_amount_sum) * 100, 2)
+            # 按年月区分缓存, 订单变动提交后缓存即失效
+            staff_performance = caches.get_or_build(
+                caches.STAFF_PERFORMANCE,
+                lambda: self.build(today.year, today.month),
+                suffix=first_day.strftime('%Y-%m')
+            )
             
             return Response({
                 'current_month': {
@@ -93,6 +79,27 @@ class MonthlyOrdersByStaffView(APIView):
                 'detail': f'获取订单信息失败: {str(e)}'
             }, status=status.HTTP_400_BAD_REQUEST)
 
+    @staticmethod
+    def build(year, month):
+        # 读取本月的订单月度汇总并按员工分组，只统计销售总金额(汇总已排除作废订单)
+        staff_performance = list(OrderMonthlySummary.objects.filter(
+            year=year,
+            month=month,
+            order_count__gt=0
+        ).values(
+            'staff__uid', 
+            'staff__name'
+        ).annotate(
+            total_amount=Sum('total_amount')  # 订单总额
+        ).order_by('-total_amount'))  # 按订单总额降序排序
+        
+        # 计算员工业绩占比
+        total_amount_sum = sum([staff['total_amount'] for staff in staff_performance]) or 1
+        for staff in staff_performance:
+            staff['amount_percentage'] = round(float(staff['total_amount']) / float(total_amount_sum) * 100, 2)
+        
+        return staff_performance
+
 
 
 class CurrentYearMonthlySalesView(APIView):
@@ -101,31 +108,17 @@ class CurrentYearMonthlySalesView(APIView):
     """
     permission_classes = [IsAuthenticated]
     
-    @method_decorator(cache_page(60 * 5))
     def get(self, request):
         try:
             # 锚定当前年份
             current_year = timezone.now().year
             
-            # 查询当前年份的订单数据并按月分组
-            monthly_sales = Order.objects.filter(
-                sign_time__year=current_year
-            ).exclude(
-                delivery_status=3  # 排除已作废订单
-            ).annotate(
-                month=TruncMonth('sign_time')
-            ).values('month').annotate(
-                total_amount=Sum('total_amount')  # 每月的订单总额
-            ).order_by('month')
-            
-            # 创建初始化的月份数据字典(1-12月)，默认销售额为0
-            sales_by_month = {month: 0 for month in range(1, 13)}
-            
-            # 使用查询结果更新字典
-            for item in monthly_sales:
-                if item['month']:
-                    month_number = item['month'].month
-                    sales_by_month[month_number] = float(item['total_amount']) if item['total_amount'] else 0
+            # 按年份区分缓存, 订单变动提交后缓存即失效
+            sales_by_month = caches.get_or_build(
+                caches.MONTHLY_SALES,
+                lambda: self.build(current_year),
+                suffix=str(current_year)
+            )
             
             # 直接返回月份->销售额的字典
             return Response(sales_by_month)
@@ -133,4 +126,32 @@ class CurrentYearMonthlySalesView(APIView):
         except Exception as e:
             return Response({
                 'detail': f'获取月度销售数据失败: {str(e)}'
-            }, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+    @staticmethod
+    def build(current_year):
+        # 读取当前年份的订单月度汇总并按月分组(汇总已排除作废订单)
+        monthly_sales = OrderMonthlySummary.objects.filter(
+            year=current_year
+        ).values('month').annotate(
+            total_amount=Sum('total_amount')  # 每月的订单总额
+        ).order_by('month')
+        
+        # 创建初始化的月份数据字典(1-12月)，默认销售额为0
+        sales_by_month = {month: 0 for month in range(1, 13)}
+        
+        # 使用查询结果更新字典
+        for item in monthly_sales:
+            sales_by_month[item['month']] = float(item['total_amount']) if item['total_amount'] else 0
+        
+        return sales_by_month
+
+
+class DashboardCacheStatsView(APIView):
+    """
+    首页看板缓存命中统计(监控用)
+    """
+    permission_classes = [IsAuthenticated, IsBoss]
+
+    def get(self, request):
+        return Response(caches.stats())
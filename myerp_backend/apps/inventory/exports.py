@@ -0,0 +1,89 @@
+import csv
+import tempfile
+
+from openpyxl import Workbook
+
+from apps.common.paginations import keyset_filter
+from .models import Inventory
+
+# 导出列: (查询字段, 表头), 与原 DataFrame 导出的列和顺序一致
+EXPORT_COLUMNS = (
+    ('id', 'id'),
+    ('name', '名称'),
+    ('brand__name', '品牌'),
+    ('category__name', '分类'),
+    ('size', '规格'),
+    ('color', '颜色'),
+    ('cost', '成本'),
+    ('on_road', '物流在途'),
+    ('in_stock', '当前在库'),
+    ('been_order', '已被订购'),
+    ('sold', '已售出'),
+)
+EXPORT_ORDERING = ('-brand_id', '-category_id', '-id')
+CHUNK_SIZE = 2000
+
+
+def iter_rows(chunk_size=CHUNK_SIZE, progress=None):
+    """
+    按 (品牌, 分类, ID) 倒序逐块读取库存, 每块一条查询, 内存中最多只保留一块
+
+    progress(已读取行数) 在每块读取后调用, 供后台任务汇报进度
+
+    MySQL 驱动不支持服务端游标, iterator() 仍会一次取回全部结果,
+    因此按排序键做键集分块, 每块只取 chunk_size 行
+    """
+    fields = [field for field, _ in EXPORT_COLUMNS]
+    key_fields = [field.lstrip('-') for field in EXPORT_ORDERING]
+    queryset = Inventory.objects.order_by(*EXPORT_ORDERING).values_list(*fields, *key_fields)
+
+    position = None
+    done = 0
+    while True:
+        chunk = queryset if position is None else queryset.filter(keyset_filter(EXPORT_ORDERING, position))
+        rows = list(chunk[:chunk_size])
+        for row in rows:
+            yield row[:len(fields)]
+        done += len(rows)
+        if progress:
+            progress(done)
+        if len(rows) < chunk_size:
+            break
+        position = rows[-1][len(fields):]
+
+
+class Echo:
+    """csv.writer 的伪文件对象, write 直接返回写入的内容"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(chunk_size=CHUNK_SIZE, progress=None):
+    """
+    逐行生成CSV内容(带BOM, Excel打开中文不乱码)
+    """
+    writer = csv.writer(Echo())
+    yield '\ufeff' + writer.writerow([header for _, header in EXPORT_COLUMNS])
+    for row in iter_rows(chunk_size, progress):
+        yield writer.writerow(row)
+
+
+def write_xlsx(chunk_size=CHUNK_SIZE, file=None, progress=None):
+    """
+    用 openpyxl 只写模式生成xlsx, 返回已回到开头的文件对象
+
+    只写模式逐行落盘, 内存占用与行数无关; 未指定 file 时写入临时文件,
+    调用方负责关闭(关闭后临时文件自动删除)
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('库存信息')
+    sheet.append([header for _, header in EXPORT_COLUMNS])
+    for row in iter_rows(chunk_size, progress):
+        sheet.append(row)
+
+    if file is None:
+        file = tempfile.TemporaryFile()
+    workbook.save(file)
+    file.seek(0)
+    return file
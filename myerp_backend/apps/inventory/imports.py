@@ -0,0 +1,275 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pandas as pd
+from django.db import transaction
+
+from apps.brand.models import Brand
+from apps.category.models import Category
+from apps.search import tokens
+from . import valuations
+from .models import Inventory, InventoryLog, Stocktake
+
+REQUIRED_COLUMNS = ['名称', '品牌', '分类', '规格', '颜色', '成本']
+BATCH_SIZE = 1000
+MAX_ERROR_ROWS = 20  # 错误提示中最多列出的行号数量
+
+
+class InventoryImportError(Exception):
+    """
+    库存Excel数据校验失败, 异常信息直接返回给前端, extra 为附加的响应字段
+    """
+
+    def __init__(self, message, **extra):
+        super().__init__(message)
+        self.extra = extra
+
+
+def _row_numbers(frame, mask):
+    """
+    把错误掩码转换为行号描述(与原逐行导入一致: 第一条数据为第1行)
+    """
+    numbers = [str(index + 1) for index in frame.index[mask]]
+    if len(numbers) > MAX_ERROR_ROWS:
+        return '、'.join(numbers[:MAX_ERROR_ROWS]) + f' 等{len(numbers)}行'
+    return '、'.join(numbers)
+
+
+def _is_blank(series):
+    return series.isna() | (series.astype(str).str.strip() == '')
+
+
+def parse_frame(df):
+    """
+    向量化校验并转换Excel数据, 返回列为
+    name, brand_id, category_id, size, color, cost, in_stock 的 DataFrame
+
+    所有错误一次性收集(带行号)后抛出 InventoryImportError
+    """
+    missing_columns = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing_columns:
+        raise InventoryImportError(f'缺少必要的列: {", ".join(missing_columns)}')
+
+    brand_names = df['品牌'].astype(str)
+    category_names = df['分类'].astype(str)
+    brand_ids = dict(Brand.objects.filter(name__in=brand_names.unique()).values_list('name', 'id'))
+    category_ids = dict(Category.objects.filter(name__in=category_names.unique()).values_list('name', 'id'))
+
+    invalid_brands = set(brand_names.unique()) - set(brand_ids)
+    if invalid_brands:
+        raise InventoryImportError(f'发现未经授权的品牌: {", ".join(invalid_brands)}，请先在系统中创建这些品牌。')
+    invalid_categories = set(category_names.unique()) - set(category_ids)
+    if invalid_categories:
+        raise InventoryImportError(
+            f'发现未经授权的分类: {", ".join(invalid_categories)}，请先在系统中创建这些分类。'
+        )
+
+    # 数值列: 空值不算格式错误, 无法转换的非空值才是
+    raw_cost = df['成本']
+    cost = pd.to_numeric(raw_cost, errors='coerce')
+    raw_in_stock = df['当前在库'] if '当前在库' in df.columns else pd.Series(0, index=df.index)
+    in_stock = pd.to_numeric(raw_in_stock, errors='coerce')
+
+    errors = []
+    blank_cost = _is_blank(raw_cost)
+    if blank_cost.any():
+        errors.append(f'第{_row_numbers(df, blank_cost)}行成本不能为空')
+    invalid = (cost.isna() & ~blank_cost) | (in_stock.isna() & ~_is_blank(raw_in_stock))
+    if invalid.any():
+        errors.append(f'第{_row_numbers(df, invalid)}行数据格式错误，请确保数值字段格式正确')
+    in_stock = in_stock.fillna(0)
+    negative = (cost < 0) | (in_stock < 0)
+    if negative.any():
+        errors.append(f'第{_row_numbers(df, negative)}行存在负数，所有数值必须大于等于0')
+    if errors:
+        raise InventoryImportError('；'.join(errors))
+
+    return pd.DataFrame({
+        'name': df['名称'].astype(str).str.upper(),  # 将名称中的英文字母转为大写
+        'brand_id': brand_names.map(brand_ids),
+        'category_id': category_names.map(category_ids),
+        'size': df['规格'].astype(str),
+        'color': df['颜色'].astype(str),
+        'cost': cost.round(2),
+        'in_stock': in_stock.astype('int64'),  # 小数按原逻辑截断取整
+    }, index=df.index)
+
+
+def build_inventories(frame):
+    """
+    由 parse_frame 的结果构建库存对象(不保存); 只保留当前在库数量, 其他数量为0
+    """
+    return [
+        Inventory(name=name, brand_id=brand_id, category_id=category_id, size=size, color=color,
+                  cost=cost, in_stock=in_stock)
+        for name, brand_id, category_id, size, color, cost, in_stock in zip(
+            frame['name'], frame['brand_id'].tolist(), frame['category_id'].tolist(), frame['size'],
+            frame['color'], frame['cost'].tolist(), frame['in_stock'].tolist()
+        )
+    ]
+
+
+NATURAL_KEY = ('name', 'brand_id', 'category_id', 'size', 'color')
+# 盘点后的目标状态: 只保留成本和当前在库, 其他数量归零(与整体替换导入一致)
+UPDATE_FIELDS = ['cost', 'in_stock', 'on_road', 'been_order', 'sold']
+SAMPLE_SIZE = 20  # 差异摘要中每类最多列出的商品数
+
+
+class InventoryDiff:
+    """
+    Excel 与现有库存按自然键(名称, 品牌, 分类, 规格, 颜色)比对的结果
+    """
+
+    def __init__(self):
+        self.to_create = []  # 新增的库存对象
+        self.to_update = []  # 已修改属性、待 bulk_update 的库存对象
+        self.unchanged = 0
+        self.to_remove = []  # Excel 中不存在的库存 [(id, 全名)]
+
+    def summary(self):
+        return {
+            'inserted': len(self.to_create),
+            'updated': len(self.to_update),
+            'unchanged': self.unchanged,
+            'removed': len(self.to_remove),
+            'inserted_items': [inventory.full_name() for inventory in self.to_create[:SAMPLE_SIZE]],
+            'updated_items': [inventory.full_name() for inventory in self.to_update[:SAMPLE_SIZE]],
+            'removed_items': [name for _, name in self.to_remove[:SAMPLE_SIZE]],
+        }
+
+
+def compute_diff(frame, lock=False):
+    """
+    在内存中计算 parse_frame 结果与数据库库存的差异, 不写数据库
+
+    lock=True 时(必须在事务内)按ID顺序锁定全部库存后再读取, 与 stocks.lock_inventories 的加锁顺序一致,
+    差异写入前其他下单/出库/明细修正无法修改这些库存
+    Excel 中自然键重复时无法确定对应关系, 抛出 InventoryImportError
+    """
+    duplicated = frame.duplicated(subset=list(NATURAL_KEY), keep=False)
+    if duplicated.any():
+        raise InventoryImportError(f'第{_row_numbers(frame, duplicated)}行商品重复(名称、品牌、分类、规格、颜色均相同)')
+
+    existing = {}
+    result = InventoryDiff()
+    queryset = Inventory.objects.only('id', *NATURAL_KEY, *UPDATE_FIELDS).order_by('id')
+    if lock:
+        queryset = queryset.select_for_update()
+    for inventory in queryset:
+        key = tuple(getattr(inventory, field) for field in NATURAL_KEY)
+        if key in existing:
+            # 数据库中的重复商品只保留最早的一条
+            result.to_remove.append((inventory.id, inventory.full_name()))
+        else:
+            existing[key] = inventory
+
+    for inventory in build_inventories(frame):
+        key = tuple(getattr(inventory, field) for field in NATURAL_KEY)
+        current = existing.pop(key, None)
+        if current is None:
+            result.to_create.append(inventory)
+            continue
+
+        target = {
+            'cost': Decimal(str(inventory.cost)).quantize(Decimal('0.01')),
+            'in_stock': inventory.in_stock, 'on_road': 0, 'been_order': 0, 'sold': 0
+        }
+        if all(getattr(current, field) == value for field, value in target.items()):
+            result.unchanged += 1
+        else:
+            for field, value in target.items():
+                setattr(current, field, value)
+            result.to_update.append(current)
+
+    result.to_remove.extend((inventory.id, inventory.full_name()) for inventory in existing.values())
+    return result
+
+
+def apply_diff(result):
+    """
+    分批写入差异: 新增 bulk_create, 修改 bulk_update, 删除按ID分批(级联删除关联明细)
+    """
+    Inventory.objects.bulk_create(result.to_create, batch_size=BATCH_SIZE)
+    Inventory.objects.bulk_update(result.to_update, UPDATE_FIELDS, batch_size=BATCH_SIZE)
+    remove_ids = [inventory_id for inventory_id, _ in result.to_remove]
+    for start in range(0, len(remove_ids), BATCH_SIZE):
+        Inventory.objects.filter(id__in=remove_ids[start:start + BATCH_SIZE]).delete()
+
+
+def check_undelivered_orders():
+    """
+    盘点前必须完成所有订单出库, 存在未出库订单时抛出 InventoryImportError
+    """
+    from apps.order.models import Order
+    undelivered_orders = Order.objects.filter(delivery_status=1)  # 1表示新订单
+    if undelivered_orders.exists():
+        raise InventoryImportError(
+            '系统中存在未出库的订单，请先完成所有订单出库操作再进行库存盘点',
+            order_count=undelivered_orders.count(),
+            order_numbers=list(undelivered_orders.values_list('order_number', flat=True))
+        )
+
+
+def import_inventory(df, operator, diff_mode=False, dry_run=False, progress=None):
+    """
+    执行库存盘点导入(同步接口和后台任务共用), 返回响应数据
+
+    diff_mode 为差异导入, dry_run 只返回差异摘要; progress(百分比) 用于汇报进度
+    数据不合规时抛出 InventoryImportError
+    """
+    progress = progress or (lambda percent: None)
+    if not dry_run:
+        check_undelivered_orders()
+
+    # 向量化校验和转换(缺少列/品牌分类不存在/数值错误一次性带行号返回)
+    frame = parse_frame(df)
+    progress(30)
+
+    # 预览: 在内存中与现有库存比对, 不加锁
+    if dry_run:
+        return {'detail': '预览完成，未写入任何数据', 'dry_run': True, **compute_diff(frame).summary()}
+    progress(50)
+
+    summary = None
+    with transaction.atomic():
+        # 先锁定全部库存再比对和复核订单: 比对结果在写入前不会被并发的下单/出库/明细修正改变
+        if diff_mode:
+            diff = compute_diff(frame, lock=True)
+            summary = diff.summary()
+        else:
+            list(Inventory.objects.select_for_update().order_by('id').values_list('id', flat=True))
+        check_undelivered_orders()
+
+        if diff_mode:
+            # 只新增/修改/删除有变化的商品, 未变化的商品及其关联明细保持不动
+            apply_diff(diff)
+        else:
+            # 首先清空所有库存记录, 再分批批量创建, 只保留当前在库数量, 其他数量都设为0
+            Inventory.objects.all().delete()
+            Inventory.objects.bulk_create(build_inventories(frame), batch_size=BATCH_SIZE)
+        inventory_count = len(frame)
+        progress(80)
+
+        # 库存已整体替换或批量修改, 重建库存价值汇总, 同步名称检索词元
+        valuations.rebuild()
+        tokens.sync('inventory.name')
+        progress(90)
+
+        # 创建库存日志
+        log_content = f"{operator.name}于{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}进行了库存盘点\n"
+        log_content += f"成功导入{inventory_count}条库存记录"
+        if summary:
+            log_content += (f"(新增{summary['inserted']}条, 修改{summary['updated']}条, "
+                             f"未变化{summary['unchanged']}条, 删除{summary['removed']}条)")
+        InventoryLog.objects.create(content=log_content, operator=operator)
+
+        # 记录本次盘点; 之前的发货/入库/订单在详情和日志接口中按时间关联展示失效提示
+        Stocktake.objects.create(operator=operator, inventory_count=inventory_count)
+
+    data = {
+        'detail': f'成功导入{inventory_count}条库存记录，所有库存仅保留当前在库数量，其他数量已重置为0',
+        'count': inventory_count
+    }
+    if summary:
+        data.update(summary)
+    return data
@@ -0,0 +1,53 @@
+import os
+from datetime import datetime
+
+import pandas as pd
+from django.db import transaction
+
+from apps.job import runner
+from . import exports, imports, valuations
+from .models import Inventory
+
+
+@runner.register('inventory_export')
+def export_inventory(context, file_type='xlsx'):
+    """导出库存到结果文件(xlsx 或 csv)"""
+    total = Inventory.objects.count()
+    extension = 'csv' if file_type == 'csv' else 'xlsx'
+    path = context.result_path(f"库存列表_{datetime.now().strftime('%Y-%m-%d')}.{extension}")
+
+    def progress(done):
+        context.progress(done * 100 // total if total else 100, f'已导出{done}/{total}条')
+
+    if extension == 'csv':
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            for line in exports.stream_csv(progress=progress):
+                file.write(line)
+    else:
+        with open(path, 'wb') as file:
+            exports.write_xlsx(file=file, progress=progress)
+    return {'count': total}
+
+
+@runner.register('inventory_import', submittable=False)
+def import_inventory(context, path, diff_mode=False, dry_run=False):
+    """执行库存盘点导入, path 为 runner.store_upload 保存的上传文件"""
+    input_path = context.input_path(path)
+    try:
+        context.progress(0, '正在读取Excel文件')
+        df = pd.read_excel(input_path)
+        context.progress(10, '正在校验数据')
+        return imports.import_inventory(df, context.operator, diff_mode=diff_mode, dry_run=dry_run,
+                                        progress=context.progress)
+    except imports.InventoryImportError as e:
+        # 与同步接口的 400 响应一致, 附加字段(例如未出库的订单号)保存到任务结果中
+        raise runner.JobError(str(e), result={'detail': str(e), **e.extra}) from e
+    finally:
+        os.remove(input_path)
+
+
+@runner.register('rebuild_valuations')
+def rebuild_valuations(context):
+    """重建库存价值汇总"""
+    with transaction.atomic():
+        return {'count': valuations.rebuild()}
@@ -0,0 +1,76 @@
+import io
+import time
+import tracemalloc
+
+import pandas as pd
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.brand.models import Brand
+from apps.category.models import Category
+from apps.inventory import exports
+from apps.inventory.models import Inventory
+
+
+class Command(BaseCommand):
+    help = '对比 DataFrame 整体导出与流式导出库存的耗时和峰值内存(数据在事务中生成, 结束后回滚)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000], help='库存记录条数')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            brand = Brand.objects.create(name='压测品牌', intro='benchexport')
+            category = Category.objects.create(name='压测分类')
+
+            self.stdout.write(f"{'行数':>8} {'方式':>10} {'耗时(s)':>10} {'峰值内存(MB)':>14} {'文件大小(KB)':>14}")
+            created = 0
+            for rows in sorted(options['rows']):
+                Inventory.objects.bulk_create([
+                    Inventory(name=f'BENCH-{i}', brand=brand, category=category, cost=100, in_stock=10)
+                    for i in range(created, rows)
+                ], batch_size=2000)
+                created = rows
+
+                for label, func in (('DataFrame', self.legacy), ('流式xlsx', self.stream_xlsx),
+                                    ('流式csv', self.stream_csv)):
+                    elapsed, peak, size = self.measure(func)
+                    self.stdout.write(f"{rows:>8} {label:>10} {elapsed:>10.2f} {peak / 1024 / 1024:>14.1f} "
+                                      f"{size / 1024:>14.0f}")
+
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def measure(func):
+        tracemalloc.start()
+        start = time.perf_counter()
+        size = func()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return elapsed, peak, size
+
+    @staticmethod
+    def legacy():
+        """原实现: values() 全部取出, 构建 DataFrame 后整体写入内存中的工作簿"""
+        results = Inventory.objects.order_by(*exports.EXPORT_ORDERING).values(
+            *[field for field, _ in exports.EXPORT_COLUMNS]
+        )
+        df = pd.DataFrame(results).rename(columns=dict(exports.EXPORT_COLUMNS))
+        buffer = io.BytesIO()
+        with pd.ExcelWriter(buffer) as writer:
+            df.to_excel(writer, sheet_name='库存信息', index=False)
+        return buffer.tell()
+
+    @staticmethod
+    def stream_xlsx():
+        file = exports.write_xlsx()
+        size = 0
+        with file:
+            while chunk := file.read(8192):
+                size += len(chunk)
+        return size
+
+    @staticmethod
+    def stream_csv():
+        return sum(len(line.encode('utf-8')) for line in exports.stream_csv())
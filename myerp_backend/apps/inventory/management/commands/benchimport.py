@@ -0,0 +1,88 @@
+import io
+import time
+
+import pandas as pd
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from openpyxl import Workbook
+
+from apps.brand.models import Brand
+from apps.category.models import Category
+from apps.inventory import imports
+from apps.inventory.models import Inventory
+
+
+class Command(BaseCommand):
+    help = '用合成的Excel对比逐行(iterrows)与向量化两种库存导入方式的耗时(数据在事务中写入, 结束后回滚)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000], help='Excel数据行数')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            brands = [Brand.objects.create(name=f'压测品牌{i}', intro='benchimport') for i in range(5)]
+            categories = [Category.objects.create(name=f'压测分类{i}') for i in range(5)]
+
+            self.stdout.write(f"{'行数':>8} {'读取Excel(s)':>12} {'逐行解析(s)':>12} {'向量化解析(s)':>14} "
+                              f"{'批量写入(s)':>12}")
+            for rows in options['rows']:
+                start = time.perf_counter()
+                df = pd.read_excel(self.workbook(rows, brands, categories))
+                read_elapsed = time.perf_counter() - start
+
+                start = time.perf_counter()
+                self.legacy(df)
+                legacy_elapsed = time.perf_counter() - start
+
+                start = time.perf_counter()
+                inventories = imports.build_inventories(imports.parse_frame(df))
+                vector_elapsed = time.perf_counter() - start
+
+                start = time.perf_counter()
+                with transaction.atomic():
+                    Inventory.objects.bulk_create(inventories, batch_size=imports.BATCH_SIZE)
+                    transaction.set_rollback(True)
+                write_elapsed = time.perf_counter() - start
+
+                self.stdout.write(f"{rows:>8} {read_elapsed:>12.2f} {legacy_elapsed:>12.2f} "
+                                  f"{vector_elapsed:>14.2f} {write_elapsed:>12.2f}")
+
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def workbook(rows, brands, categories):
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet('库存信息')
+        sheet.append(['名称', '品牌', '分类', '规格', '颜色', '成本', '当前在库'])
+        for i in range(rows):
+            sheet.append([f'bench-{i}', brands[i % len(brands)].name, categories[i % len(categories)].name,
+                          '原版', '原色', 100 + i % 50, '' if i % 10 == 0 else i % 30])
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        buffer.seek(0)
+        return buffer
+
+    @staticmethod
+    def legacy(df):
+        """原实现: iterrows 逐行取值, 每个单元格单独转换类型, 逐个构建库存对象"""
+        brands_dict = {brand.name: brand for brand in Brand.objects.filter(name__in=set(df['品牌'].astype(str)))}
+        categories_dict = {
+            category.name: category for category in Category.objects.filter(name__in=set(df['分类'].astype(str)))
+        }
+        inventory_objects = []
+        for index, row in df.iterrows():
+            def safe_convert_to_int(value):
+                if pd.isna(value) or value == '':
+                    return 0
+                return int(float(value))
+
+            inventory_objects.append(Inventory(
+                name=str(row['名称']).upper(),
+                brand=brands_dict[str(row['品牌'])],
+                category=categories_dict[str(row['分类'])],
+                size=str(row['规格']),
+                color=str(row['颜色']),
+                cost=float(row['成本']),
+                in_stock=safe_convert_to_int(row.get('当前在库', 0)),
+            ))
+        return inventory_objects
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.inventory import valuations
+
+
+class Command(BaseCommand):
+    help = '从库存表重新计算并重建库存价值汇总(按品牌+分类), 或仅校验汇总是否一致'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='只校验不重建, 存在差异时返回非0状态')
+
+    def handle(self, *args, **options):
+        if options['check']:
+            drifts = valuations.verify()
+            for brand_id, category_id, stored, real in drifts:
+                self.stdout.write(
+                    f'品牌{brand_id} 分类{category_id}: 汇总 数量{stored[0]} 价值{stored[1]} / 实际 数量{real[0]} 价值{real[1]}'
+                )
+            if drifts:
+                raise CommandError(f'库存价值汇总存在{len(drifts)}处差异, 请执行 rebuildvaluations 重建')
+            self.stdout.write(self.style.SUCCESS('库存价值汇总校验通过!'))
+            return
+
+        with transaction.atomic():
+            count = valuations.rebuild()
+            drifts = valuations.verify()
+        if drifts:
+            raise CommandError(f'重建后仍有{len(drifts)}处差异, 请检查是否有并发写入')
+        self.stdout.write(self.style.SUCCESS(f'库存价值汇总重建完成, 共{count}条!'))
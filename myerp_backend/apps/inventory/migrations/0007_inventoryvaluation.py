@@ -0,0 +1,47 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F, Sum, ExpressionWrapper, DecimalField
+
+
+def build_valuations(apps, schema_editor):
+    Inventory = apps.get_model('inventory', 'Inventory')
+    InventoryValuation = apps.get_model('inventory', 'InventoryValuation')
+    rows = Inventory.objects.values('brand_id', 'category_id').annotate(
+        quantity=Sum(F('on_road') + F('in_stock')),
+        total_value=Sum(ExpressionWrapper((F('on_road') + F('in_stock')) * F('cost'),
+                                          output_field=DecimalField(max_digits=20, decimal_places=2)))
+    ).order_by()
+    InventoryValuation.objects.bulk_create([
+        InventoryValuation(brand_id=row['brand_id'], category_id=row['category_id'],
+                           quantity=row['quantity'] or 0, total_value=row['total_value'] or 0)
+        for row in rows
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('brand', '0001_initial'),
+        ('category', '0001_initial'),
+        ('inventory', '0006_inventorylog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryValuation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(default=0)),
+                ('total_value', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('update_time', models.DateTimeField(auto_now=True)),
+                ('brand', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='valuations', related_query_name='valuations', to='brand.brand')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='valuations', related_query_name='valuations', to='category.category')),
+            ],
+            options={
+                'unique_together': {('brand', 'category')},
+            },
+        ),
+        migrations.RunPython(build_valuations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_inventoryvaluation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Stocktake',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('inventory_count', models.IntegerField(default=0)),
+                ('create_time', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('operator', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stocktakes', related_query_name='stocktakes', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.6 on 2026-10-18 18:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_stocktake'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inventorylog',
+            index=models.Index(fields=['create_time'], name='inventorylog_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchaselog',
+            index=models.Index(fields=['purchase', 'create_time'], name='purchaselog_purchase_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='receivelog',
+            index=models.Index(fields=['receive', 'create_time'], name='receivelog_receive_time_idx'),
+        ),
+    ]
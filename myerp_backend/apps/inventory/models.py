@@ -2,6 +2,7 @@ from django.db import models
 
 from apps.brand.models import Brand
 from apps.category.models import Category
+from apps.search import tokens
 from apps.staff.models import ERPUser
 
 
@@ -19,6 +20,11 @@ class Inventory(models.Model):
     been_order = models.IntegerField(default=0)
     sold = models.IntegerField(default=0)
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # 名称变化时更新检索词元
+        tokens.index_instance(self, update_fields=kwargs.get('update_fields'))
+
     def full_name(self):
         return self.name + f'({self.size},{self.color})'
 
@@ -64,13 +70,61 @@ class PurchaseLog(models.Model):
     operator = models.ForeignKey(ERPUser, on_delete=models.CASCADE, related_name='purchase_logs', related_query_name='purchase_logs')
     create_time = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['purchase', 'create_time'], name='purchaselog_purchase_time_idx'),
+        ]
+
 class ReceiveLog(models.Model):
     receive = models.ForeignKey(Receive, on_delete=models.CASCADE, related_name='logs', related_query_name='logs')
     content = models.TextField()
     operator = models.ForeignKey(ERPUser, on_delete=models.CASCADE, related_name='receive_logs', related_query_name='receive_logs')
     create_time = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['receive', 'create_time'], name='receivelog_receive_time_idx'),
+        ]
+
 class InventoryLog(models.Model):
     content = models.TextField()
     operator = models.ForeignKey(ERPUser, on_delete=models.CASCADE, related_name='inventory_logs', related_query_name='inventory_logs')
     create_time = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['create_time'], name='inventorylog_time_idx'),
+        ]
+
+class InventoryValuation(models.Model):
+    """
+    库存价值汇总(按品牌+分类), 随每次库存变动增量维护
+    """
+    brand = models.ForeignKey(Brand, on_delete=models.CASCADE, related_name='valuations', related_query_name='valuations')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='valuations', related_query_name='valuations')
+    quantity = models.IntegerField(default=0)  # 物流在途 + 当前在库
+    total_value = models.DecimalField(max_digits=20, decimal_places=2, default=0)  # (物流在途 + 当前在库) * 成本
+    update_time = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('brand', 'category')
+
+class StocktakeQuerySet(models.QuerySet):
+    def after(self, time):
+        """
+        指定时间之后进行的盘点(时间倒序), 该时间点的数据已被这些盘点作废
+        """
+        return self.filter(create_time__gt=time).select_related('operator').order_by('-create_time')
+
+class Stocktake(models.Model):
+    """
+    库存盘点记录: 盘点之前的发货/入库/订单数据全部失效, 详情和日志接口按时间关联展示
+    """
+    operator = models.ForeignKey(ERPUser, on_delete=models.CASCADE, related_name='stocktakes', related_query_name='stocktakes')
+    inventory_count = models.IntegerField(default=0)  # 本次盘点导入的库存记录数
+    create_time = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    objects = StocktakeQuerySet.as_manager()
+
+    def message(self):
+        return f"{self.create_time.strftime('%Y-%m-%d %H:%M:%S')}进行了库存盘点，此次盘点之前的所有数据已失效!"
@@ -1,7 +1,9 @@
-from rest_framework.pagination import PageNumberPagination
+from apps.common.paginations import PageOrCursorPagination
 
-class InventoryPagination(PageNumberPagination):
+class InventoryPagination(PageOrCursorPagination):
     page_size = 10
+    keyset_ordering = ('-id',)
 
-class PurchasePagination(PageNumberPagination):
-    page_size = 20
\ No newline at end of file
+class PurchasePagination(PageOrCursorPagination):
+    page_size = 20
+    keyset_ordering = ('-create_time', '-id')
@@ -3,7 +3,7 @@ from rest_framework import serializers
 from apps.brand.serializers import BrandSerializer
 from apps.category.serializers import CategorySerializer
 from apps.staff.serializers import StaffSerializer
-from . import models
+from . import models, stocktakes
 
 
 class InventorySerializer(serializers.ModelSerializer):
@@ -79,9 +79,26 @@ class ReceiveLogSerializer(serializers.ModelSerializer):
         model = models.ReceiveLog
         fields = ['id', 'content', 'operator_name', 'create_time']
 
+class StocktakeLogSerializer(serializers.ModelSerializer):
+    """盘点记录以日志的格式展示在发货/入库详情中(type 为 stocktake, id 为 "stocktake-<盘点ID>")"""
+    id = serializers.SerializerMethodField()
+    type = serializers.SerializerMethodField()
+    content = serializers.CharField(source='message', read_only=True)
+    operator_name = serializers.CharField(source='operator.name', read_only=True)
+
+    class Meta:
+        model = models.Stocktake
+        fields = ['id', 'type', 'content', 'operator_name', 'create_time']
+
+    def get_id(self, obj):
+        return stocktakes.entry_id(obj)
+
+    def get_type(self, obj):
+        return stocktakes.ENTRY_TYPE
+
 class ReceiveDetailFullSerializer(serializers.ModelSerializer):
     details = ReceiveDetailSerializer(source='details.all', many=True, read_only=True)
-    logs = ReceiveLogSerializer(source='ordered_logs', many=True, read_only=True)
+    logs = serializers.SerializerMethodField()
     brand = BrandSerializer(read_only=True)
     user = StaffSerializer(read_only=True)
     
@@ -89,6 +106,10 @@ class ReceiveDetailFullSerializer(serializers.ModelSerializer):
         model = models.Receive
         fields = ['id', 'brand', 'user', 'create_time', 'details', 'logs']
 
+    def get_logs(self, obj):
+        entries = stocktakes.merge_logs(obj.ordered_logs, obj.create_time)
+        return stocktakes.serialize_logs(entries, ReceiveLogSerializer, StocktakeLogSerializer)
+
 class PurchaseLogSerializer(serializers.ModelSerializer):
     operator_name = serializers.CharField(source='operator.name', read_only=True)
     
@@ -98,7 +119,7 @@ class PurchaseLogSerializer(serializers.ModelSerializer):
 
 class PurchaseDetailFullSerializer(serializers.ModelSerializer):
     details = PurchaseDetailSerializer(source='details.all', many=True, read_only=True)
-    logs = PurchaseLogSerializer(source='ordered_logs', many=True, read_only=True)
+    logs = serializers.SerializerMethodField()
     brand = BrandSerializer(read_only=True)
     user = StaffSerializer(read_only=True)
     
@@ -106,6 +127,10 @@ class PurchaseDetailFullSerializer(serializers.ModelSerializer):
         model = models.Purchase
         fields = ['id', 'brand', 'total_cost', 'user', 'create_time', 'details', 'logs']
 
+    def get_logs(self, obj):
+        entries = stocktakes.merge_logs(obj.ordered_logs, obj.create_time)
+        return stocktakes.serialize_logs(entries, PurchaseLogSerializer, StocktakeLogSerializer)
+
 class InventoryLogSerializer(serializers.ModelSerializer):
     operator_name = serializers.CharField(source='operator.name', read_only=True)
     
@@ -0,0 +1,166 @@
+from collections import OrderedDict
+
+from django.db.models import F, Case, When, Value, IntegerField
+
+from apps.common import retries
+
+from . import valuations
+from .models import Inventory
+
+# 各类库存流转对应的字段变化方向(乘以数量即为增量)
+PURCHASE = {'on_road': 1}  # 发货: 增加在途
+RECEIVE = {'on_road': -1, 'in_stock': 1}  # 入库: 在途转在库
+INSTALL = {'been_order': -1, 'in_stock': -1, 'sold': 1}  # 订单出库: 占用和在库转为已售
+
+
+class StockError(Exception):
+    """
+    库存操作失败(商品不存在/品牌不符/库存不足)
+    """
+
+
+def merge_quantities(details):
+    """
+    合并明细中同一商品的数量, 返回按库存ID升序排列的 {inventory_id: quantity}
+    """
+    quantities = {}
+    for item in details:
+        inventory_id = int(item['inventory_id'])
+        quantities[inventory_id] = quantities.get(inventory_id, 0) + int(item['quantity'])
+    return OrderedDict(sorted(quantities.items()))
+
+
+def lock_inventories(inventory_ids, brand_id=None):
+    """
+    用一条 select_for_update 按ID升序锁定所有库存记录, 返回 {inventory_id: inventory}
+
+    所有写库存的流程都按相同的顺序加锁, 避免两个事务交叉等待造成死锁; 涉及已有订单的流程(出库/作废)先锁订单再锁库存
+    在 retries.atomic(nowait=True) 中不等待锁
+    """
+    inventory_ids = sorted(set(inventory_ids))
+    inventories = OrderedDict(
+        (inventory.id, inventory)
+        for inventory in retries.for_update(Inventory.objects).filter(id__in=inventory_ids).order_by('id')
+    )
+
+    for inventory_id in inventory_ids:
+        inventory = inventories.get(inventory_id)
+        if inventory is None:
+            raise StockError(f"商品ID {inventory_id} 不存在")
+        if brand_id is not None and inventory.brand_id != int(brand_id):
+            raise StockError(f"商品 {inventory.full_name()} 不属于所选品牌")
+
+    return inventories
+
+
+def apply_deltas(inventories, deltas):
+    """
+    把多个商品的数量变化合并成一条 UPDATE ... CASE 语句执行
+
+    deltas: {inventory_id: {'been_order': 2, 'in_stock': -2}}
+    执行后同步修改已锁定的内存对象, 调用方无需 refresh_from_db, 并同步维护库存价值汇总
+    """
+    updates = {}
+    fields = sorted({field for changes in deltas.values() for field in changes})
+    for field in fields:
+        whens = [
+            When(id=inventory_id, then=Value(changes[field]))
+            for inventory_id, changes in deltas.items()
+            if changes.get(field)
+        ]
+        if whens:
+            updates[field] = F(field) + Case(*whens, default=Value(0), output_field=IntegerField())
+
+    if not updates:
+        return 0
+
+    count = Inventory.objects.filter(id__in=list(deltas)).update(**updates)
+    valuations.adjust(valuations.delta_changes(inventories, deltas))
+
+    for inventory_id, changes in deltas.items():
+        inventory = inventories[inventory_id]
+        for field, delta in changes.items():
+            setattr(inventory, field, getattr(inventory, field) + delta)
+
+    return count
+
+
+def reserve_stock(details, brand_id=None, allow_oversell=True):
+    """
+    订单占用库存: 一次加锁, 内存校验可售数量, 一条语句累加 been_order
+
+    返回 (inventories, quantities, shortages)
+    shortages 为可售数量不足的商品列表; allow_oversell=False 时直接抛出 StockError
+    """
+    quantities = merge_quantities(details)
+    inventories = lock_inventories(quantities.keys(), brand_id=brand_id)
+
+    shortages = []
+    for inventory_id, quantity in quantities.items():
+        inventory = inventories[inventory_id]
+        available = inventory.can_be_sold()
+        if available < quantity:
+            shortages.append({
+                'name': inventory.full_name(),
+                'required': quantity,
+                'available': available
+            })
+
+    if shortages and not allow_oversell:
+        message = "以下商品可售数量不足：\n"
+        for item in shortages:
+            message += f"- {item['name']}：需要 {item['required']} 件，可售仅 {item['available']} 件\n"
+        raise StockError(message)
+
+    apply_deltas(inventories, {
+        inventory_id: {'been_order': quantity} for inventory_id, quantity in quantities.items()
+    })
+
+    return inventories, quantities, shortages
+
+
+def move_stock(details, movement, brand_id=None):
+    """
+    发货/入库等库存流转: 一次加锁, 一条语句写入所有商品的增量
+
+    movement 为 PURCHASE / RECEIVE 等字段方向表
+    返回 (inventories, quantities), 供调用方构建明细和日志, 无需再访问 detail.inventory
+    """
+    quantities = merge_quantities(details)
+    inventories = lock_inventories(quantities.keys(), brand_id=brand_id)
+
+    apply_deltas(inventories, {
+        inventory_id: {field: sign * quantity for field, sign in movement.items()}
+        for inventory_id, quantity in quantities.items()
+    })
+
+    return inventories, quantities
+
+
+def install_stock(details):
+    """
+    订单出库: 一次加锁, 内存校验在库数量, 一条语句扣减占用/在库并累加已售
+
+    多个订单一起出库时传入全部明细, 同一商品的数量先合并再校验; 在库不足时抛出 StockError
+    返回 (inventories, quantities)
+    """
+    quantities = merge_quantities(details)
+    inventories = lock_inventories(quantities.keys())
+
+    shortages = [
+        (inventories[inventory_id], quantity)
+        for inventory_id, quantity in quantities.items()
+        if inventories[inventory_id].in_stock < quantity
+    ]
+    if shortages:
+        message = "以下商品库存不足：\n"
+        for inventory, quantity in shortages:
+            message += f"- {inventory.full_name()}：需要 {quantity} 件，库存仅 {inventory.in_stock} 件\n"
+        raise StockError(message)
+
+    apply_deltas(inventories, {
+        inventory_id: {field: sign * quantity for field, sign in INSTALL.items()}
+        for inventory_id, quantity in quantities.items()
+    })
+
+    return inventories, quantities
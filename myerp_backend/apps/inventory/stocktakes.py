@@ -0,0 +1,34 @@
+from .models import Stocktake
+
+ENTRY_TYPE = 'stocktake'  # 并入日志列表的盘点记录的 type 字段
+
+
+def entry_id(stocktake):
+    """
+    盘点记录在日志列表中的ID: 加上类型前缀, 不会与日志自身的整数ID重复
+    """
+    return f'{ENTRY_TYPE}-{stocktake.pk}'
+
+
+def merge_logs(logs, since, time_field='create_time'):
+    """
+    把 since 之后的盘点记录按时间倒序并入日志列表
+
+    代替以前盘点时给每条历史记录逐条写入的盘点日志, 返回的列表中混有日志对象和 Stocktake 对象
+    """
+    entries = list(logs) + list(Stocktake.objects.after(since))
+    return sorted(
+        entries,
+        key=lambda entry: entry.create_time if isinstance(entry, Stocktake) else getattr(entry, time_field),
+        reverse=True
+    )
+
+
+def serialize_logs(entries, log_serializer, stocktake_serializer):
+    """
+    按类型分别序列化 merge_logs 的结果
+    """
+    return [
+        (stocktake_serializer if isinstance(entry, Stocktake) else log_serializer)(entry).data
+        for entry in entries
+    ]
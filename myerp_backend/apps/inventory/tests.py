@@ -1,3 +1,209 @@
-from django.test import TestCase
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import pandas as pd
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from apps.brand.models import Brand
+from apps.category.models import Category
+from apps.client.models import Client
+from apps.common import retries
+from apps.order.models import Order
+from apps.staff.models import ERPUser
+
+from . import imports, stocks, valuations
+from .models import Inventory, InventoryLog, Stocktake, Purchase, PurchaseLog, Receive
+
+
+class InventoryImportTest(TestCase):
+    """库存盘点导入: 自然键比对、差异分类、预览不写库、分批写入、未出库订单拦截"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.boss = ERPUser.objects.create_superuser(account='boss', name='老板', telephone='13000000000',
+                                                    password='111111')
+        cls.brand = Brand.objects.create(name='测试品牌', intro='')
+        cls.category = Category.objects.create(name='沙发')
+
+    def create(self, name, size='原版', color='原色', cost=10, in_stock=0, **kwargs):
+        return Inventory.objects.create(name=name, brand=self.brand, category=self.category, size=size,
+                                        color=color, cost=cost, in_stock=in_stock, **kwargs)
+
+    def frame(self, *rows):
+        """
+        rows 为 (名称, 规格, 颜色, 成本, 当前在库), 品牌和分类固定
+        """
+        return pd.DataFrame([
+            {'名称': name, '品牌': self.brand.name, '分类': self.category.name, '规格': size, '颜色': color,
+             '成本': cost, '当前在库': in_stock}
+            for name, size, color, cost, in_stock in rows
+        ])
+
+    def counts(self, summary):
+        return {key: summary[key] for key in ('inserted', 'updated', 'unchanged', 'removed')}
+
+    def test_diff_classification(self):
+        unchanged = self.create('A1', cost=10, in_stock=5)
+        updated = self.create('B1', cost=20, in_stock=3, on_road=2, been_order=1)
+        removed = self.create('C1', in_stock=1)
+        # 名称按大写匹配; 颜色不同视为另一个商品
+        df = self.frame(('a1', '原版', '原色', 10, 5), ('B1', '原版', '原色', 25, 3), ('C1', '原版', '白色', 10, 1))
+
+        data = imports.import_inventory(df, self.boss, diff_mode=True)
+        self.assertEqual(self.counts(data), {'inserted': 1, 'updated': 1, 'unchanged': 1, 'removed': 1})
+        self.assertEqual(data['count'], 3)
+        self.assertEqual(data['inserted_items'], ['C1(原版,白色)'])
+        self.assertEqual(data['updated_items'], ['B1(原版,原色)'])
+        self.assertEqual(data['removed_items'], ['C1(原版,原色)'])
+
+        # 未变化和修改的商品保留原ID, 其他数量归零
+        self.assertEqual(Inventory.objects.get(pk=unchanged.pk).in_stock, 5)
+        updated.refresh_from_db()
+        self.assertEqual((updated.cost, updated.in_stock, updated.on_road, updated.been_order),
+                         (Decimal('25.00'), 3, 0, 0))
+        self.assertFalse(Inventory.objects.filter(pk=removed.pk).exists())
+        self.assertEqual(Inventory.objects.count(), 3)
+        self.assertEqual((Stocktake.objects.get().inventory_count, InventoryLog.objects.count()), (3, 1))
+        self.assertEqual(valuations.verify(), [])
+
+    def test_database_duplicates_keep_earliest(self):
+        first = self.create('A1', in_stock=5)
+        self.create('A1', in_stock=5)
+
+        data = imports.import_inventory(self.frame(('A1', '原版', '原色', 10, 5)), self.boss, diff_mode=True)
+        self.assertEqual(self.counts(data), {'inserted': 0, 'updated': 0, 'unchanged': 1, 'removed': 1})
+        self.assertEqual(list(Inventory.objects.values_list('pk', flat=True)), [first.pk])
+
+    def test_duplicate_rows_rejected(self):
+        df = self.frame(('A1', '原版', '原色', 10, 5), ('a1', '原版', '原色', 12, 1))
+        with self.assertRaisesMessage(imports.InventoryImportError, '第1、2行商品重复'):
+            imports.import_inventory(df, self.boss, diff_mode=True)
+        self.assertFalse(Stocktake.objects.exists())
+
+    def test_dry_run_does_not_write(self):
+        self.create('A1', cost=20, in_stock=3)
+        self.create('B1')
+
+        with self.assertNumQueries(3):  # 品牌、分类、现有库存
+            data = imports.import_inventory(self.frame(('A1', '原版', '原色', 25, 3), ('N1', '原版', '原色', 1, 1)),
+                                            self.boss, diff_mode=True, dry_run=True)
+        self.assertTrue(data['dry_run'])
+        self.assertEqual(self.counts(data), {'inserted': 1, 'updated': 1, 'unchanged': 0, 'removed': 1})
+        self.assertEqual(sorted(Inventory.objects.values_list('name', 'cost')),
+                         [('A1', Decimal('20.00')), ('B1', Decimal('10.00'))])
+        self.assertFalse(Stocktake.objects.exists())
+        self.assertFalse(InventoryLog.objects.exists())
+
+    def test_apply_diff_in_batches(self):
+        for i in range(5):
+            self.create(f'U{i}', cost=1)
+            self.create(f'R{i}')
+        rows = [(f'U{i}', '原版', '原色', 2, i) for i in range(5)] + [(f'N{i}', '原版', '原色', 3, i) for i in range(5)]
+
+        table = connection.ops.quote_name(Inventory._meta.db_table)
+        with mock.patch.object(imports, 'BATCH_SIZE', 2), CaptureQueriesContext(connection) as context:
+            data = imports.import_inventory(self.frame(*rows), self.boss, diff_mode=True)
+        self.assertEqual(self.counts(data), {'inserted': 5, 'updated': 5, 'unchanged': 0, 'removed': 5})
+        inserts = [query for query in context.captured_queries if query['sql'].startswith(f'INSERT INTO {table}')]
+        deletes = [query for query in context.captured_queries if query['sql'].startswith(f'DELETE FROM {table}')]
+        self.assertEqual((len(inserts), len(deletes)), (3, 3))
+
+        self.assertEqual(sorted(Inventory.objects.values_list('name', 'cost', 'in_stock')),
+                         sorted((name, Decimal(cost), in_stock) for name, _, _, cost, in_stock in rows))
+        self.assertEqual(valuations.verify(), [])
+
+    def test_replace_mode(self):
+        old = self.create('A1', in_stock=5, on_road=3, sold=2)
+
+        data = imports.import_inventory(self.frame(('A1', '原版', '原色', 10, 4), ('B1', '原版', '原色', 5, 0)),
+                                        self.boss)
+        self.assertEqual(data['count'], 2)
+        self.assertNotIn('inserted', data)
+        self.assertFalse(Inventory.objects.filter(pk=old.pk).exists())
+        self.assertEqual(sorted(Inventory.objects.values_list('name', 'in_stock', 'on_road', 'sold')),
+                         [('A1', 4, 0, 0), ('B1', 0, 0, 0)])
+        self.assertEqual(valuations.verify(), [])
+
+    def test_undelivered_orders_block_import(self):
+        inventory = self.create('A1', in_stock=5)
+        client = Client.objects.create(name='客户', telephone='13100000000', address='地址', staff=self.boss)
+        Order.objects.create(order_number='U001', brand=self.brand, client=client, staff=self.boss,
+                             total_amount=100, down_payment=0, total_cost=10, gross_profit=90, address='地址',
+                             delivery_status=1)
+        df = self.frame(('A1', '原版', '原色', 10, 1))
+
+        for diff_mode in (False, True):
+            with self.assertRaises(imports.InventoryImportError) as context:
+                imports.import_inventory(df, self.boss, diff_mode=diff_mode)
+            self.assertEqual(context.exception.extra, {'order_count': 1, 'order_numbers': ['U001']})
+        inventory.refresh_from_db()
+        self.assertEqual(inventory.in_stock, 5)
+        self.assertFalse(Stocktake.objects.exists())
+
+        # 预览不写库, 不受未出库订单限制
+        data = imports.import_inventory(df, self.boss, diff_mode=True, dry_run=True)
+        self.assertEqual(self.counts(data), {'inserted': 0, 'updated': 1, 'unchanged': 0, 'removed': 0})
+
+
+@override_settings(DB_RETRY_ATTEMPTS=3, DB_RETRY_BACKOFF=0, DB_LOCK_NOWAIT=False)
+class StockMovementRetryTest(TransactionTestCase):
+    """发货/入库: 锁冲突时整体重新执行事务, NOWAIT 加锁失败返回 503 而不是 400"""
+
+    def setUp(self):
+        self.boss = ERPUser.objects.create_superuser(account='boss', name='老板', telephone='13000000000',
+                                                     password='111111')
+        self.brand = Brand.objects.create(name='测试品牌', intro='')
+        category = Category.objects.create(name='沙发')
+        self.sofa = Inventory.objects.create(name='沙发A', brand=self.brand, category=category, cost=100)
+        self.api = APIClient()
+        self.api.force_authenticate(self.boss)
+
+    def conflict(self, *errors):
+        """
+        让 stocks.lock_inventories 依次抛出 errors 中的异常, 之后正常加锁
+        """
+        lock_inventories = stocks.lock_inventories
+        errors = list(errors)
+
+        def lock(*args, **kwargs):
+            if errors:
+                raise errors.pop(0)
+            return lock_inventories(*args, **kwargs)
+
+        return mock.patch.object(stocks, 'lock_inventories', side_effect=lock)
+
+    def purchase(self):
+        return self.api.post('/api/purchase/', {
+            'brand_id': self.brand.id, 'total_cost': '300',
+            'details': [{'inventory_id': self.sofa.id, 'quantity': 3}],
+        }, format='json')
+
+    def receive(self):
+        return self.api.post('/api/receive/', {
+            'brand_id': self.brand.id, 'details': [{'inventory_id': self.sofa.id, 'quantity': 2}],
+        }, format='json')
+
+    def test_deadlock_is_retried(self):
+        deadlock = OperationalError(retries.DEADLOCK, 'Deadlock found when trying to get lock')
+        timeout = OperationalError(retries.LOCK_WAIT_TIMEOUT, 'Lock wait timeout exceeded')
+        with self.conflict(deadlock):
+            self.assertEqual(self.purchase().status_code, 201)
+        with self.conflict(timeout):
+            self.assertEqual(self.receive().status_code, 201)
+
+        # 失败的那次执行已整体回滚, 只留下一张发货单和一张入库单
+        self.assertEqual((Purchase.objects.count(), PurchaseLog.objects.count(), Receive.objects.count()), (1, 1, 1))
+        self.sofa.refresh_from_db()
+        self.assertEqual((self.sofa.on_road, self.sofa.in_stock), (1, 2))
+
+    def test_nowait_returns_503(self):
+        nowait = OperationalError(retries.LOCK_NOWAIT, 'Statement aborted because lock(s) '
+                                                       'could not be acquired immediately')
+        for send in (self.purchase, self.receive):
+            with self.conflict(nowait):
+                self.assertEqual(send().status_code, 503)
+        self.assertFalse(Purchase.objects.exists())
+        self.assertFalse(Receive.objects.exists())
@@ -0,0 +1,132 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import F, Sum, ExpressionWrapper, DecimalField
+
+from apps.home import caches
+from .models import Inventory, InventoryValuation
+
+# 影响库存价值的数量字段
+VALUED_FIELDS = ('on_road', 'in_stock')
+
+
+def adjust(changes):
+    """
+    按 (brand_id, category_id) 累加库存数量和价值的变化
+
+    changes: 可迭代的 (brand_id, category_id, quantity_delta, value_delta)
+    必须在库存变动所在的事务内调用, 与库存一起提交或回滚
+    """
+    caches.invalidate_on_commit(caches.INVENTORY_BY_BRAND)
+
+    merged = defaultdict(lambda: [0, Decimal('0')])
+    for brand_id, category_id, quantity_delta, value_delta in changes:
+        merged[(brand_id, category_id)][0] += quantity_delta
+        merged[(brand_id, category_id)][1] += Decimal(str(value_delta))
+
+    for (brand_id, category_id), (quantity_delta, value_delta) in sorted(merged.items()):
+        if not quantity_delta and not value_delta:
+            continue
+        rows = InventoryValuation.objects.filter(brand_id=brand_id, category_id=category_id)
+        values = {'quantity': F('quantity') + quantity_delta, 'total_value': F('total_value') + value_delta}
+        if not rows.update(**values):
+            # 新的品牌/分类组合: 先插入零值行(并发插入同一行时忽略冲突), 再累加, 不会因唯一约束失败
+            InventoryValuation.objects.bulk_create(
+                [InventoryValuation(brand_id=brand_id, category_id=category_id)], ignore_conflicts=True
+            )
+            rows.update(**values)
+
+
+def contribution(inventory):
+    """
+    单个库存记录当前的 (brand_id, category_id, quantity, value)
+    """
+    quantity = inventory.on_road + inventory.in_stock
+    return inventory.brand_id, inventory.category_id, quantity, quantity * Decimal(str(inventory.cost))
+
+
+def delta_changes(inventories, deltas):
+    """
+    把 stocks.apply_deltas 的增量换算为价值变化
+    """
+    for inventory_id, changes in deltas.items():
+        quantity_delta = sum(changes.get(field, 0) for field in VALUED_FIELDS)
+        if quantity_delta:
+            inventory = inventories[inventory_id]
+            yield (inventory.brand_id, inventory.category_id, quantity_delta,
+                   quantity_delta * Decimal(str(inventory.cost)))
+
+
+def replace_changes(old, new):
+    """
+    库存记录被修改(成本/数量/品牌/分类)时, 先减去旧贡献再加上新贡献
+
+    old 为修改前 contribution() 的结果, new 为修改后的库存对象
+    """
+    brand_id, category_id, quantity, value = old
+    yield brand_id, category_id, -quantity, -value
+    yield contribution(new)
+
+
+def compute():
+    """
+    直接从库存表重新计算汇总 {(brand_id, category_id): (quantity, total_value)}
+    """
+    rows = Inventory.objects.values('brand_id', 'category_id').annotate(
+        quantity=Sum(F('on_road') + F('in_stock')),
+        total_value=Sum(
+            ExpressionWrapper(
+                (F('on_road') + F('in_stock')) * F('cost'),
+                output_field=DecimalField(max_digits=20, decimal_places=2)
+            )
+        )
+    ).order_by()
+    return {
+        (row['brand_id'], row['category_id']): (row['quantity'] or 0, Decimal(str(row['total_value'] or 0)))
+        for row in rows
+    }
+
+
+def rebuild():
+    """
+    清空并重建全部汇总(库存Excel导入、修复数据时使用), 返回写入的行数
+    """
+    caches.invalidate_on_commit(caches.INVENTORY_BY_BRAND)
+
+    InventoryValuation.objects.all().delete()
+    valuations = [
+        InventoryValuation(brand_id=brand_id, category_id=category_id, quantity=quantity, total_value=total_value)
+        for (brand_id, category_id), (quantity, total_value) in compute().items()
+    ]
+    InventoryValuation.objects.bulk_create(valuations)
+    return len(valuations)
+
+
+def verify():
+    """
+    对比汇总表和实时计算结果, 返回不一致的列表 [(brand_id, category_id, 汇总值, 实际值)]
+    """
+    expected = compute()
+    actual = {
+        (row.brand_id, row.category_id): (row.quantity, row.total_value)
+        for row in InventoryValuation.objects.all()
+    }
+    drifts = []
+    for key in sorted(set(expected) | set(actual)):
+        stored = actual.get(key, (0, Decimal('0')))
+        real = expected.get(key, (0, Decimal('0')))
+        if stored[0] != real[0] or Decimal(stored[1]).quantize(Decimal('0.01')) != real[1].quantize(Decimal('0.01')):
+            drifts.append((key[0], key[1], stored, real))
+    return drifts
+
+
+def total(brand_id=None, category_id=None):
+    """
+    读取汇总表得到库存总价值(按品牌/分类筛选)
+    """
+    queryset = InventoryValuation.objects.all()
+    if brand_id:
+        queryset = queryset.filter(brand_id=brand_id)
+    if category_id:
+        queryset = queryset.filter(category_id=category_id)
+    return queryset.aggregate(total=Sum('total_value'))['total'] or 0
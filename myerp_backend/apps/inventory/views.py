@@ -4,15 +4,17 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.db.models import F, Sum, ExpressionWrapper, DecimalField
-from . import models, serializers, paginations
+from . import models, serializers, paginations, stocks, valuations, exports, imports
 import pandas as pd
-from django.http import HttpResponse
+from django.http import StreamingHttpResponse, FileResponse
 from datetime import datetime
 import os  # 添加os模块用于文件扩展名验证
 from rest_framework.parsers import MultiPartParser  # 添加文件上传解析器
-from apps.order.models import OperationLog
 from django.db.models import Prefetch
 from apps.staff.permissions import IsStorekeeper,IsBoss
+from apps.job import runner
+from apps.search import tokens
+from apps.common import retries
 
 class InventoryViewSet(viewsets.GenericViewSet,
                        viewsets.mixins.CreateModelMixin,
@@ -37,19 +39,30 @@ class InventoryViewSet(viewsets.GenericViewSet,
             category_id = request.query_params.get('category_id')
             name = request.query_params.get('name')
 
-            if int(brand_id) > 0:
+            # 只带分页参数(page/cursor/count)时, 筛选参数可能不存在
+            if brand_id and int(brand_id) > 0:
                 queryset = queryset.filter(brand_id=brand_id)
-            if int(category_id) > 0:
+            if category_id and int(category_id) > 0:
                 queryset = queryset.filter(category_id=category_id)
-            if str(name) != '':
-                queryset = queryset.filter(name__contains=name)
+            if name:
+                queryset = tokens.filter_queryset(queryset, 'inventory.name', name)
 
         return queryset.order_by('-id').all()
 
-    def list(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset())
+    def get_total_cost(self, queryset):
+        """
+        库存总价值: 按品牌/分类筛选时直接读取汇总表, 按名称模糊搜索时才实时计算
+        """
+        params = self.request.query_params
+        if not params.get('name'):
+            brand_id = params.get('brand_id')
+            category_id = params.get('category_id')
+            return valuations.total(
+                brand_id=brand_id if brand_id and int(brand_id) > 0 else None,
+                category_id=category_id if category_id and int(category_id) > 0 else None
+            )
 
-        total_cost = queryset.annotate(
+        return queryset.annotate(
             current_inventory=F('on_road') + F('in_stock')
         ).aggregate(
             total=Sum(
@@ -60,6 +73,24 @@ class InventoryViewSet(viewsets.GenericViewSet,
             )
         )['total'] or 0
 
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            inventory = serializer.save()
+            valuations.adjust([valuations.contribution(inventory)])
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            old = valuations.contribution(
+                models.Inventory.objects.select_for_update().get(id=serializer.instance.id)
+            )
+            inventory = serializer.save()
+            valuations.adjust(valuations.replace_changes(old, inventory))
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+
+        total_cost = self.get_total_cost(queryset)
+
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -107,53 +138,54 @@ class PurchaseView(APIView):
             return Response({'detail': '错误, 数据不合规!'}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            with transaction.atomic():
-
-                purchase = models.Purchase.objects.create(
-                    brand_id=serializer.validated_data['brand_id'],
-                    total_cost=serializer.validated_data['total_cost'],
-                    user=request.user
-                )
-
-                # 批量处理采购详情
-                details = []
-                for detail in serializer.validated_data['details']:
-                    inventory = models.Inventory.objects.select_for_update().get(id=detail['inventory_id'])
-
-                    if inventory.brand != purchase.brand:
-                        raise Exception('错误!单次发货必须同一品牌!')
-
-                    # 原子更新在途库存
-                    inventory.on_road = F('on_road') + detail['quantity']
-                    inventory.save(update_fields=['on_road'])
-
-                    # 构建采购明细对象
-                    details.append(models.PurchaseDetail(
-                        purchase=purchase,
-                        inventory=inventory,
-                        quantity=detail['quantity']
-                    ))
-
-                # 批量创建采购明细
-                models.PurchaseDetail.objects.bulk_create(details)
-
-                # 创建采购日志，记录详细的采购信息
-                log_content = f"用户{request.user.name}于{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}进行了采购操作\n"
-                log_content += "采购明细：\n"
-                for detail in details:
-                    log_content += f"- {detail.inventory.full_name()}：{detail.quantity}个，单价：{detail.inventory.cost}元\n"
-                log_content += f"总成本：{serializer.validated_data['total_cost']}元"
-
-                models.PurchaseLog.objects.create(
-                    purchase=purchase,
-                    content=log_content,
-                    operator=request.user
-                )
-
+            purchase = self.create_purchase(serializer.validated_data, request.user)
             return Response({'purchase_id': purchase.id, 'message': "发货成功!"}, status=status.HTTP_201_CREATED)
-        except:
+        except Exception as e:
+            retries.raise_if_retryable(e)
             return Response({'detail': '发货失败!'}, status=status.HTTP_400_BAD_REQUEST)
 
+    @retries.atomic
+    def create_purchase(self, validated_data, operator):
+        """
+        在一个事务中增加在途库存并创建发货单/明细/日志, 遇到死锁或锁等待超时时整体重新执行
+        """
+        purchase = models.Purchase.objects.create(
+            brand_id=validated_data['brand_id'],
+            total_cost=validated_data['total_cost'],
+            user=operator
+        )
+
+        # 按ID顺序一次性锁定所有商品, 一条语句增加在途库存
+        inventories, _ = stocks.move_stock(validated_data['details'], stocks.PURCHASE, brand_id=purchase.brand_id)
+
+        # 构建采购明细对象
+        details = [
+            models.PurchaseDetail(
+                purchase=purchase,
+                inventory=inventories[int(detail['inventory_id'])],
+                quantity=detail['quantity']
+            )
+            for detail in validated_data['details']
+        ]
+
+        # 批量创建采购明细
+        models.PurchaseDetail.objects.bulk_create(details)
+
+        # 创建采购日志，记录详细的采购信息(使用已加载的库存对象)
+        log_content = f"用户{operator.name}于{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}进行了采购操作\n"
+        log_content += "采购明细：\n"
+        for detail in validated_data['details']:
+            inventory = inventories[int(detail['inventory_id'])]
+            log_content += f"- {inventory.full_name()}：{detail['quantity']}个，单价：{inventory.cost}元\n"
+        log_content += f"总成本：{validated_data['total_cost']}元"
+
+        models.PurchaseLog.objects.create(
+            purchase=purchase,
+            content=log_content,
+            operator=operator
+        )
+        return purchase
+
 class PurchaseList(APIView):
     """
     发货列表（支持分页查询）
@@ -225,52 +257,52 @@ class ReceiveView(APIView):
             return Response({'detail': '错误, 数据不合规!'}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            with transaction.atomic():
-
-                receive = models.Receive.objects.create(
-                    brand_id=serializer.validated_data['brand_id'],
-                    user=request.user
-                )
-
-                # 批量处理入库详情
-                details = []
-                for detail in serializer.validated_data['details']:
-                    inventory = models.Inventory.objects.select_for_update().get(id=detail['inventory_id'])
-
-                    if inventory.brand != receive.brand:
-                        raise Exception('错误!单次入库必须同一品牌!')
-
-                    # 原子更新库存：减少on_road，增加in_stock
-                    inventory.on_road = F('on_road') - detail['quantity']
-                    inventory.in_stock = F('in_stock') + detail['quantity']
-                    inventory.save(update_fields=['on_road', 'in_stock'])
-
-                    # 构建入库明细对象
-                    details.append(models.ReceiveDetail(
-                        receive=receive,
-                        inventory=inventory,
-                        quantity=detail['quantity']
-                    ))
-
-                # 批量创建入库明细
-                models.ReceiveDetail.objects.bulk_create(details)
-
-                # 创建入库日志，记录详细的入库信息
-                log_content = f"用户{request.user.name}于{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}进行了入库操作\n"
-                log_content += "入库明细：\n"
-                for detail in details:
-                    log_content += f"- {detail.inventory.full_name()}：{detail.quantity}个\n"
-
-                models.ReceiveLog.objects.create(
-                    receive=receive,
-                    content=log_content,
-                    operator=request.user
-                )
-
+            receive = self.create_receive(serializer.validated_data, request.user)
             return Response({'receive_id': receive.id, 'message': "入库成功!"}, status=status.HTTP_201_CREATED)
         except Exception as e:
+            retries.raise_if_retryable(e)
             return Response({'detail': f'入库失败! {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
 
+    @retries.atomic
+    def create_receive(self, validated_data, operator):
+        """
+        在一个事务中把在途库存转为在库并创建入库单/明细/日志, 遇到死锁或锁等待超时时整体重新执行
+        """
+        receive = models.Receive.objects.create(
+            brand_id=validated_data['brand_id'],
+            user=operator
+        )
+
+        # 按ID顺序一次性锁定所有商品, 一条语句完成在途转在库
+        inventories, _ = stocks.move_stock(validated_data['details'], stocks.RECEIVE, brand_id=receive.brand_id)
+
+        # 构建入库明细对象
+        details = [
+            models.ReceiveDetail(
+                receive=receive,
+                inventory=inventories[int(detail['inventory_id'])],
+                quantity=detail['quantity']
+            )
+            for detail in validated_data['details']
+        ]
+
+        # 批量创建入库明细
+        models.ReceiveDetail.objects.bulk_create(details)
+
+        # 创建入库日志，记录详细的入库信息(使用已加载的库存对象)
+        log_content = f"用户{operator.name}于{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}进行了入库操作\n"
+        log_content += "入库明细：\n"
+        for detail in validated_data['details']:
+            inventory = inventories[int(detail['inventory_id'])]
+            log_content += f"- {inventory.full_name()}：{detail['quantity']}个\n"
+
+        models.ReceiveLog.objects.create(
+            receive=receive,
+            content=log_content,
+            operator=operator
+        )
+        return receive
+
 class ReceiveList(APIView):
     """
     收货列表（支持分页查询）
@@ -336,7 +368,7 @@ class PurchaseDetailUpdateView(APIView):
     """
     permission_classes = [IsAuthenticated,IsBoss]
 
-    @transaction.atomic
+    @retries.atomic
     def put(self, request, id):
         try:
             # 1. 获取并验证输入数据
@@ -352,7 +384,7 @@ class PurchaseDetailUpdateView(APIView):
                 return Response({'detail': '数量必须为正整数'}, status=status.HTTP_400_BAD_REQUEST)
             
             # 2. 锁定并获取采购明细
-            detail = models.PurchaseDetail.objects.select_for_update().get(id=id)
+            detail = retries.for_update(models.PurchaseDetail.objects).get(id=id)
             old_quantity = detail.quantity
             diff = new_quantity - old_quantity
             
@@ -360,8 +392,8 @@ class PurchaseDetailUpdateView(APIView):
                 return Response({'detail': '数量未变更'}, status=status.HTTP_400_BAD_REQUEST)
             
             # 3. 获取关联的库存和采购单
-            inventory = models.Inventory.objects.select_for_update().get(id=detail.inventory.id)
-            purchase = models.Purchase.objects.select_for_update().get(id=detail.purchase.id)
+            inventory = retries.for_update(models.Inventory.objects).get(id=detail.inventory.id)
+            purchase = retries.for_update(models.Purchase.objects).get(id=detail.purchase.id)
             
             # 4. 检查是否已有收货记录
             # 获取该库存项关联的收货记录
@@ -377,9 +409,11 @@ class PurchaseDetailUpdateView(APIView):
                 }, status=status.HTTP_400_BAD_REQUEST)
             
             # 5. 更新库存
+            old_valuation = valuations.contribution(inventory)
             inventory.on_road = F('on_road') + diff
             inventory.save(update_fields=['on_road'])
             inventory.refresh_from_db()  # 刷新获取最新值
+            valuations.adjust(valuations.replace_changes(old_valuation, inventory))
             
             # 6. 更新采购明细
             detail.quantity = new_quantity
@@ -415,6 +449,7 @@ class PurchaseDetailUpdateView(APIView):
         except models.PurchaseDetail.DoesNotExist:
             return Response({'detail': '找不到指定的采购明细'}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
+            retries.raise_if_retryable(e)
             return Response({'detail': f'更新失败：{str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
 
 class ReceiveDetailUpdateView(APIView):
@@ -423,7 +458,7 @@ class ReceiveDetailUpdateView(APIView):
     """
     permission_classes = [IsAuthenticated,IsBoss|IsStorekeeper]
 
-    @transaction.atomic
+    @retries.atomic
     def put(self, request, id):
         try:
             # 1. 获取并验证输入数据
@@ -439,7 +474,7 @@ class ReceiveDetailUpdateView(APIView):
                 return Response({'detail': '数量必须为正整数'}, status=status.HTTP_400_BAD_REQUEST)
             
             # 2. 锁定并获取收货明细
-            detail = models.ReceiveDetail.objects.select_for_update().get(id=id)
+            detail = retries.for_update(models.ReceiveDetail.objects).get(id=id)
             old_quantity = detail.quantity
             diff = new_quantity - old_quantity
             
@@ -447,16 +482,18 @@ class ReceiveDetailUpdateView(APIView):
                 return Response({'detail': '数量未变更'}, status=status.HTTP_400_BAD_REQUEST)
             
             # 3. 获取关联的库存
-            inventory = models.Inventory.objects.select_for_update().get(id=detail.inventory.id)
+            inventory = retries.for_update(models.Inventory.objects).get(id=detail.inventory.id)
 
             
             # 4. 更新库存
+            old_valuation = valuations.contribution(inventory)
             inventory.in_stock = F('in_stock') + diff
             # 同时需要更新on_road（在途数量会相应减少）
             if inventory.on_road >= diff:
                 inventory.on_road = F('on_road') - diff
             inventory.save(update_fields=['in_stock', 'on_road'])
             inventory.refresh_from_db()  # 刷新获取最新值
+            valuations.adjust(valuations.replace_changes(old_valuation, inventory))
             
             # 5. 更新收货明细
             detail.quantity = new_quantity
@@ -489,6 +526,7 @@ class ReceiveDetailUpdateView(APIView):
         except models.ReceiveDetail.DoesNotExist:
             return Response({'detail': '找不到指定的收货明细'}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
+            retries.raise_if_retryable(e)
             return Response({'detail': f'更新失败：{str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
 
 class PurchaseDetailDeleteView(APIView):
@@ -497,15 +535,15 @@ class PurchaseDetailDeleteView(APIView):
     """
     permission_classes = [IsAuthenticated,IsBoss]
 
-    @transaction.atomic
+    @retries.atomic
     def delete(self, request, id):
         try:
             # 1. 锁定并获取采购明细
-            detail = models.PurchaseDetail.objects.select_for_update().get(id=id)
+            detail = retries.for_update(models.PurchaseDetail.objects).get(id=id)
             
             # 2. 锁定并获取相关的库存和采购单
-            inventory = models.Inventory.objects.select_for_update().get(id=detail.inventory.id)
-            purchase = models.Purchase.objects.select_for_update().get(id=detail.purchase.id)
+            inventory = retries.for_update(models.Inventory.objects).get(id=detail.inventory.id)
+            purchase = retries.for_update(models.Purchase.objects).get(id=detail.purchase.id)
             
             # 3. 检查是否已有收货记录
             related_receives = models.ReceiveDetail.objects.filter(
@@ -525,8 +563,11 @@ class PurchaseDetailDeleteView(APIView):
                     'detail': f'库存在途数量异常，当前在途数量{inventory.on_road}小于待删除数量{detail.quantity}'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
+            old_valuation = valuations.contribution(inventory)
             inventory.on_road = F('on_road') - detail.quantity
             inventory.save(update_fields=['on_road'])
+            inventory.refresh_from_db()
+            valuations.adjust(valuations.replace_changes(old_valuation, inventory))
             
             # 5. 更新采购单总成本
             cost_reduction = detail.quantity * inventory.cost
@@ -560,6 +601,7 @@ class PurchaseDetailDeleteView(APIView):
         except models.PurchaseDetail.DoesNotExist:
             return Response({'detail': '找不到指定的采购明细'}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
+            retries.raise_if_retryable(e)
             return Response({'detail': f'删除失败：{str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
 
 class ReceiveDetailDeleteView(APIView):
@@ -568,24 +610,26 @@ class ReceiveDetailDeleteView(APIView):
     """
     permission_classes = [IsAuthenticated,IsBoss]
 
-    @transaction.atomic
+    @retries.atomic
     def delete(self, request, id):
         try:
             # 1. 锁定并获取收货明细
-            detail = models.ReceiveDetail.objects.select_for_update().get(id=id)
+            detail = retries.for_update(models.ReceiveDetail.objects).get(id=id)
             
             # 2. 锁定并获取相关的库存和收货单
-            inventory = models.Inventory.objects.select_for_update().get(id=detail.inventory.id)
-            receive = models.Receive.objects.select_for_update().get(id=detail.receive.id)
+            inventory = retries.for_update(models.Inventory.objects).get(id=detail.inventory.id)
+            receive = retries.for_update(models.Receive.objects).get(id=detail.receive.id)
             
             
             # 3. 更新库存（减少实际库存，增加在途数量）
+            old_valuation = valuations.contribution(inventory)
             inventory.in_stock = F('in_stock') - detail.quantity
             inventory.on_road = F('on_road') + detail.quantity
             inventory.save(update_fields=['in_stock', 'on_road'])
             
             # 刷新库存对象以获取最新值
             inventory.refresh_from_db()
+            valuations.adjust(valuations.replace_changes(old_valuation, inventory))
             
             # 4. 删除收货明细
             detail.delete()
@@ -619,70 +663,56 @@ class ReceiveDetailDeleteView(APIView):
         except models.ReceiveDetail.DoesNotExist:
             return Response({'detail': '找不到指定的收货明细'}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
+            retries.raise_if_retryable(e)
             return Response({'detail': f'删除失败：{str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
 
 class InventoryDownloadView(APIView):
     """
-    库存数据下载接口
+    库存数据下载接口(流式导出, ?file_type=csv 导出CSV, 默认xlsx)
+
+    ?async=1 提交后台导出任务, 立即返回任务ID, 完成后通过 /api/jobs/<id>/download/ 下载
     """
     permission_classes = [IsAuthenticated,IsBoss]
     def get(self, request):
-        # 获取所有库存数据
-        queryset = models.Inventory.objects.order_by('-brand__id', '-category__id', '-id').all()
-        results = queryset.values('id', 'name', 'brand__name', 'category__name', 'size', 'color', 'cost', 'on_road', 'in_stock', 'been_order', 'sold')
-
-        try: 
-            # 如果没有数据，创建一个空的DataFrame但包含所有列
-            if not results:
-                inventory_df = pd.DataFrame(columns=[
-                    'id', 'name', 'brand__name', 'category__name', 'size', 
-                    'color', 'cost', 'on_road', 'in_stock', 'been_order', 'sold'
-                ])
-            else:
-                inventory_df = pd.DataFrame(results)
-
-            inventory_df = inventory_df.rename(columns={
-                'name': '名称',
-                'brand__name': '品牌',
-                'category__name': '分类',
-                'size': '规格',
-                'color': '颜色',
-                'cost': '成本',
-                'on_road': '物流在途',
-                'in_stock': '当前在库',
-                'been_order': '已被订购',
-                'sold': '已售出'
-            })
-            
-            # 获取日期 yyyy-mm-dd
-            date = datetime.now().strftime('%Y-%m-%d')
-            response = HttpResponse(content_type='application/xlsx')
-            response['Content-Disposition'] = f"attachment; filename=库存列表_{date}.xlsx"
-            with pd.ExcelWriter(response) as writer:
-                inventory_df.to_excel(writer, sheet_name='库存信息', index=False)
-            
-            return response
+        file_type = 'csv' if request.query_params.get('file_type') == 'csv' else 'xlsx'
+        if request.query_params.get('async') == '1':
+            job = runner.submit('inventory_export', request.user, file_type=file_type)
+            return Response({'job_id': job.id, 'detail': '导出任务已提交'}, status=status.HTTP_202_ACCEPTED)
+
+        # 获取日期 yyyy-mm-dd
+        date = datetime.now().strftime('%Y-%m-%d')
+
+        try:
+            if file_type == 'csv':
+                response = StreamingHttpResponse(exports.stream_csv(), content_type='text/csv; charset=utf-8')
+                response['Content-Disposition'] = f"attachment; filename=库存列表_{date}.csv"
+                return response
+
+            # 只写模式逐块写入临时文件, 再分块传输给客户端
+            return FileResponse(exports.write_xlsx(), as_attachment=True, filename=f"库存列表_{date}.xlsx",
+                                content_type='application/xlsx')
         except Exception as e:
             return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 class InventoryUploadView(APIView):
     """
     库存数据上传接口
+
+    ?mode=diff 按自然键(名称, 品牌, 分类, 规格, 颜色)差异导入, 只写入变化的商品;
+    ?dry_run=1 只返回差异摘要, 不写入数据库;
+    ?async=1 保存文件后提交后台导入任务, 立即返回任务ID
     """
     permission_classes = [IsAuthenticated,IsBoss]
     parser_classes = [MultiPartParser]  # 添加文件上传解析器
     
     def post(self, request):
         try:
-            # 验证当前系统中是否存在未出库的订单
-            from apps.order.models import Order
-            undelivered_orders = Order.objects.filter(delivery_status=1)  # 1表示新订单
-            if undelivered_orders.exists():
-                return Response({
-                    'detail': '系统中存在未出库的订单，请先完成所有订单出库操作再进行库存盘点',
-                    'order_count': undelivered_orders.count(),
-                    'order_numbers': list(undelivered_orders.values_list('order_number', flat=True))
-                }, status=status.HTTP_400_BAD_REQUEST)
+            diff_mode = request.query_params.get('mode') == 'diff'
+            dry_run = request.query_params.get('dry_run') == '1'
+
+            # 验证当前系统中是否存在未出库的订单(预览不写入数据, 无需验证)
+            if not dry_run:
+                imports.check_undelivered_orders()
 
             # 1. 验证文件是否存在
             if 'file' not in request.FILES:
@@ -694,152 +724,22 @@ class InventoryUploadView(APIView):
             file_extension = os.path.splitext(file.name)[1].lower()
             if file_extension not in ['.xlsx', '.xls']:
                 return Response({'detail': '只支持.xlsx或.xls格式的文件'}, status=status.HTTP_400_BAD_REQUEST)
+
+            # 异步: 保存文件后交给后台任务, 不占用请求进程
+            if request.query_params.get('async') == '1':
+                job = runner.submit('inventory_import', request.user, path=runner.store_upload(file),
+                                    diff_mode=diff_mode, dry_run=dry_run)
+                return Response({'job_id': job.id, 'detail': '导入任务已提交'}, status=status.HTTP_202_ACCEPTED)
             
             # 3. 读取Excel文件
             df = pd.read_excel(file)
-            
-            # 4. 验证必要的列是否存在
-            required_columns = ['名称', '品牌', '分类', '规格', '颜色', '成本']
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            if missing_columns:
-                return Response(
-                    {'detail': f'缺少必要的列: {", ".join(missing_columns)}'}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # 5. 创建空列表用于存储要创建的库存对象
-            inventory_objects = []
-            
-            # 获取所有品牌和分类的集合，用于验证
-            existing_brands = set(models.Brand.objects.values_list('name', flat=True))
-            existing_categories = set(models.Category.objects.values_list('name', flat=True))
-            
-            # 获取Excel中的所有品牌和分类
-            excel_brands = set(df['品牌'].astype(str).unique())
-            excel_categories = set(df['分类'].astype(str).unique())
-            
-            # 检查是否有不存在的品牌
-            invalid_brands = excel_brands - existing_brands
-            if invalid_brands:
-                return Response({
-                    'detail': f'发现未经授权的品牌: {", ".join(invalid_brands)}，请先在系统中创建这些品牌。'
-                }, status=status.HTTP_400_BAD_REQUEST)
-            
-            # 检查是否有不存在的分类
-            invalid_categories = excel_categories - existing_categories
-            if invalid_categories:
-                return Response({
-                    'detail': f'发现未经授权的分类: {", ".join(invalid_categories)}，请先在系统中创建这些分类。'
-                }, status=status.HTTP_400_BAD_REQUEST)
-            
-            # 预先获取所有需要用到的品牌和分类对象
-            brands_dict = {brand.name: brand for brand in models.Brand.objects.filter(name__in=excel_brands)}
-            categories_dict = {category.name: category for category in models.Category.objects.filter(name__in=excel_categories)}
-            
-            # 6. 开启事务处理
-            with transaction.atomic():
-                # 首先清空所有库存记录
-                models.Inventory.objects.all().delete()
-                
-                # 遍历Excel的每一行
-                for index, row in df.iterrows():
-                    # 从预加载的字典中获取品牌和分类对象
-                    brand = brands_dict[str(row['品牌'])]
-                    category = categories_dict[str(row['分类'])]
-                    
-                    # 确保数值字段为正确的类型，处理空值和NaN
-                    try:
-                        # 处理成本字段
-                        cost = row['成本']
-                        if pd.isna(cost) or cost == '':
-                            return Response({
-                                'detail': f'第{index + 1}行成本不能为空'
-                            }, status=status.HTTP_400_BAD_REQUEST)
-                        cost = float(cost)
-                        
-                        # 处理其他数值字段，空值或NaN都转为0
-                        def safe_convert_to_int(value):
-                            if pd.isna(value) or value == '':
-                                return 0
-                            return int(float(value))
-                        
-                        # 只统计in_stock库存数量，其他数量都设为0
-                        in_stock = safe_convert_to_int(row.get('当前在库', 0))
-                        
-                        # 验证数值是否为负数
-                        if cost < 0 or in_stock < 0:
-                            return Response({
-                                'detail': f'第{index + 1}行存在负数，所有数值必须大于等于0'
-                            }, status=status.HTTP_400_BAD_REQUEST)
-                            
-                    except (ValueError, TypeError) as e:
-                        return Response({
-                            'detail': f'第{index + 1}行数据格式错误：{str(e)}，请确保数值字段格式正确'
-                        }, status=status.HTTP_400_BAD_REQUEST)
-                    
-                    # 创建库存对象（但不保存到数据库）
-                    inventory = models.Inventory(
-                        name=str(row['名称']).upper(),  # 将名称中的英文字母转为大写
-                        brand=brand,
-                        category=category,
-                        size=str(row['规格']),
-                        color=str(row['颜色']),
-                        cost=cost,
-                        on_road=0,  # 物流在途设为0
-                        in_stock=in_stock,  # 只保留当前在库数量
-                        been_order=0,  # 已被订购设为0
-                        sold=0  # 已售出设为0
-                    )
-                    inventory_objects.append(inventory)
-                
-                # 7. 批量创建库存记录
-                models.Inventory.objects.bulk_create(inventory_objects)
-
-                # 8. 创建库存日志
-                log_content = f"{request.user.name}于{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}进行了库存盘点\n"
-                log_content += f"成功导入{len(inventory_objects)}条库存记录"
-                models.InventoryLog.objects.create(
-                    content=log_content,
-                    operator=request.user
-                )
 
-                # 获取当前时间作为盘点时间点
-                current_time = datetime.now()
-                inventory_check_message = f"{current_time.strftime('%Y-%m-%d %H:%M:%S')}进行了库存盘点，此次盘点之前的所有数据已失效!"
-                
-                # 为所有采购记录添加盘点日志
-                purchases = models.Purchase.objects.filter(create_time__lt=current_time)
-                for purchase in purchases:
-                    models.PurchaseLog.objects.create(
-                        purchase=purchase,
-                        content=inventory_check_message,
-                        operator=request.user
-                    )
-                
-                # 为所有收货记录添加盘点日志
-                receives = models.Receive.objects.filter(create_time__lt=current_time)
-                for receive in receives:
-                    models.ReceiveLog.objects.create(
-                        receive=receive,
-                        content=inventory_check_message,
-                        operator=request.user
-                    )
-                
-                # 为订单添加操作日志
-                from apps.order.models import Order
-                orders = Order.objects.filter(sign_time__lt=current_time)
-                for order in orders:
-                    OperationLog.objects.create(
-                        order=order,
-                        description=inventory_check_message,
-                        operator=request.user
-                    )
-                
-            return Response({
-                'detail': f'成功导入{len(inventory_objects)}条库存记录，所有库存仅保留当前在库数量，其他数量已重置为0',
-                'count': len(inventory_objects)
-            }, status=status.HTTP_201_CREATED)
-            
+            # 4. 校验、比对并写入(与后台任务共用同一流程)
+            data = imports.import_inventory(df, request.user, diff_mode=diff_mode, dry_run=dry_run)
+            return Response(data, status=status.HTTP_200_OK if dry_run else status.HTTP_201_CREATED)
+
+        except imports.InventoryImportError as e:
+            return Response({'detail': str(e), **e.extra}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({'detail': f'导入失败: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -861,7 +761,7 @@ class PurchaseCostUpdateView(APIView):
     """
     permission_classes = [IsAuthenticated,IsBoss]
     
-    @transaction.atomic
+    @retries.atomic
     def put(self, request, id):
         try:
             # 1. 获取并验证输入数据
@@ -877,7 +777,7 @@ class PurchaseCostUpdateView(APIView):
                 return Response({'detail': '总成本必须为非负数'}, status=status.HTTP_400_BAD_REQUEST)
             
             # 2. 锁定并获取采购单
-            purchase = models.Purchase.objects.select_for_update().get(id=id)
+            purchase = retries.for_update(models.Purchase.objects).get(id=id)
             old_total_cost = purchase.total_cost
             
             # 如果成本没有变化，直接返回
@@ -926,6 +826,7 @@ class PurchaseCostUpdateView(APIView):
         except models.Purchase.DoesNotExist:
             return Response({'detail': '找不到指定的采购单'}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
+            retries.raise_if_retryable(e)
             return Response({'detail': f'修改失败：{str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
+
+
+class JobConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.job'
+
+    def ready(self):
+        # 各应用在 jobs.py 中注册自己的后台任务
+        autodiscover_modules('jobs')
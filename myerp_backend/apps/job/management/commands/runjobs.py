@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.job import runner
+
+
+class Command(BaseCommand):
+    help = '后台任务 worker: 轮询任务表, 依次执行排队中的导入/导出/重建任务'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='执行完当前排队的任务后退出')
+        parser.add_argument('--interval', type=float, default=2, help='队列为空时的轮询间隔(秒)')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"已注册的任务: {', '.join(runner.submittable_kinds())}")
+        try:
+            while True:
+                job = runner.claim_next()
+                if job is None:
+                    if options['once']:
+                        return
+                    time.sleep(options['interval'])
+                    continue
+
+                self.stdout.write(f"开始执行 {job}")
+                job = runner.execute(job)
+                self.stdout.write(f"{job} {job.get_status_display()} {job.message}")
+        except KeyboardInterrupt:
+            self.stdout.write('worker 已停止')
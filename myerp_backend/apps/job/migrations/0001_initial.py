@@ -0,0 +1,40 @@
+# Generated by Django 5.1.6 on 2026-10-18 18:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=50, verbose_name='任务类型')),
+                ('params', models.JSONField(default=dict, verbose_name='任务参数')),
+                ('status', models.IntegerField(choices=[(1, '排队中'), (2, '执行中'), (3, '已完成'), (4, '失败')], db_index=True, default=1, verbose_name='状态')),
+                ('progress', models.IntegerField(default=0, verbose_name='进度(0-100)')),
+                ('message', models.CharField(blank=True, default='', max_length=500, verbose_name='进度说明/错误信息')),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='执行结果')),
+                ('result_file', models.CharField(blank=True, default='', max_length=200, verbose_name='结果文件(相对任务文件目录)')),
+                ('result_name', models.CharField(blank=True, default='', max_length=100, verbose_name='下载文件名')),
+                ('create_time', models.DateTimeField(auto_now_add=True, verbose_name='提交时间')),
+                ('start_time', models.DateTimeField(blank=True, null=True, verbose_name='开始时间')),
+                ('finish_time', models.DateTimeField(blank=True, null=True, verbose_name='结束时间')),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to=settings.AUTH_USER_MODEL, verbose_name='提交人')),
+            ],
+            options={
+                'verbose_name': '后台任务',
+                'verbose_name_plural': '后台任务',
+                'ordering': ['-id'],
+            },
+        ),
+    ]
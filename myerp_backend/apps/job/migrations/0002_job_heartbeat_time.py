@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 18:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('job', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='heartbeat_time',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='最近一次汇报进度的时间'),
+        ),
+    ]
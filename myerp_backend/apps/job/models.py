@@ -0,0 +1,41 @@
+from django.db import models
+
+from apps.staff.models import ERPUser
+
+
+class Job(models.Model):
+    """
+    后台任务(导入/导出/重建汇总), 由 runjobs 命令在独立进程中执行
+    """
+    QUEUED = 1
+    RUNNING = 2
+    SUCCEEDED = 3
+    FAILED = 4
+    STATUS_CHOICES = (
+        (QUEUED, '排队中'),
+        (RUNNING, '执行中'),
+        (SUCCEEDED, '已完成'),
+        (FAILED, '失败'),
+    )
+
+    kind = models.CharField(max_length=50, verbose_name='任务类型')
+    params = models.JSONField(default=dict, verbose_name='任务参数')
+    status = models.IntegerField(choices=STATUS_CHOICES, default=QUEUED, db_index=True, verbose_name='状态')
+    progress = models.IntegerField(default=0, verbose_name='进度(0-100)')
+    message = models.CharField(max_length=500, blank=True, default='', verbose_name='进度说明/错误信息')
+    result = models.JSONField(null=True, blank=True, verbose_name='执行结果')
+    result_file = models.CharField(max_length=200, blank=True, default='', verbose_name='结果文件(相对任务文件目录)')
+    result_name = models.CharField(max_length=100, blank=True, default='', verbose_name='下载文件名')
+    created_by = models.ForeignKey(ERPUser, on_delete=models.CASCADE, related_name='jobs', verbose_name='提交人')
+    create_time = models.DateTimeField(auto_now_add=True, verbose_name='提交时间')
+    start_time = models.DateTimeField(null=True, blank=True, verbose_name='开始时间')
+    finish_time = models.DateTimeField(null=True, blank=True, verbose_name='结束时间')
+    heartbeat_time = models.DateTimeField(null=True, blank=True, verbose_name='最近一次汇报进度的时间')
+
+    class Meta:
+        verbose_name = '后台任务'
+        verbose_name_plural = verbose_name
+        ordering = ['-id']
+
+    def __str__(self):
+        return f"{self.kind}#{self.id}"
@@ -0,0 +1,9 @@
+from apps.common.paginations import PageOrCursorPagination
+
+
+class JobPagination(PageOrCursorPagination):
+    """后台任务列表分页器"""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    keyset_ordering = ('-id',)
@@ -0,0 +1,175 @@
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, close_old_connections, connection, connections
+from django.db.models import Q
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# {任务类型: (函数, 是否允许通过接口直接提交)}
+_registry = {}
+
+
+class JobError(Exception):
+    """
+    提交或执行后台任务失败; result 为保存到任务结果中的附加信息(例如导入冲突的订单号)
+    """
+
+    def __init__(self, message, result=None):
+        super().__init__(message)
+        self.result = result
+
+
+def register(kind, submittable=True):
+    """
+    注册后台任务: 函数签名为 func(context, **params), 返回可JSON序列化的结果
+
+    submittable=False 的任务只能由业务接口提交(例如参数中包含服务器文件路径的导入任务)
+    """
+    def decorator(func):
+        _registry[kind] = (func, submittable)
+        return func
+    return decorator
+
+
+def submittable_kinds():
+    return sorted(kind for kind, (_, submittable) in _registry.items() if submittable)
+
+
+def files_dir(*parts):
+    path = os.path.join(settings.JOB_FILES_DIR, *parts)
+    os.makedirs(os.path.dirname(path) if parts else path, exist_ok=True)
+    return path
+
+
+def store_upload(uploaded_file):
+    """
+    把上传的文件保存到任务文件目录, 返回相对路径(作为任务参数)
+    """
+    extension = os.path.splitext(uploaded_file.name)[1].lower()
+    relative_path = os.path.join('uploads', f'{uuid.uuid4().hex}{extension}')
+    with open(files_dir(relative_path), 'wb') as file:
+        for chunk in uploaded_file.chunks():
+            file.write(chunk)
+    return relative_path
+
+
+def submit(kind, user, **params):
+    """
+    提交任务到队列, 立即返回 Job; 由 runjobs 进程异步执行
+    """
+    if kind not in _registry:
+        raise JobError(f'未知的任务类型: {kind}')
+    return Job.objects.create(kind=kind, params=params, created_by=user)
+
+
+class JobContext:
+    """
+    传给任务函数的上下文: 操作人、进度汇报和结果文件
+    """
+
+    def __init__(self, job):
+        self.job = job
+        self.operator = job.created_by
+        self._connection = None
+
+    def progress(self, percent, message=''):
+        """
+        汇报进度并刷新心跳; 任务在事务中执行时通过独立连接写入, 轮询接口可以立即看到
+        """
+        percent = max(0, min(100, int(percent)))
+        now = datetime.now()
+        if not connection.in_atomic_block:
+            Job.objects.filter(pk=self.job.pk).update(progress=percent, message=message, heartbeat_time=now)
+            return
+        if connection.vendor == 'sqlite':
+            return  # SQLite 只允许一个写连接, 事务内的进度只能在提交后可见
+        try:
+            if self._connection is None:
+                self._connection = connections.create_connection(DEFAULT_DB_ALIAS)
+            quote = self._connection.ops.quote_name
+            with self._connection.cursor() as cursor:
+                cursor.execute(
+                    f"UPDATE {quote(Job._meta.db_table)} SET {quote('progress')} = %s, {quote('message')} = %s, "
+                    f"{quote('heartbeat_time')} = %s WHERE {quote('id')} = %s",
+                    [percent, message[:500], now, self.job.pk]
+                )
+        except DatabaseError:
+            logger.warning('任务 %s 汇报进度失败', self.job, exc_info=True)
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def result_path(self, download_name):
+        """
+        返回结果文件的绝对路径, 任务把结果写入该路径后即可通过下载接口获取
+        """
+        extension = os.path.splitext(download_name)[1]
+        self.job.result_file = os.path.join('results', f'{self.job.pk}{extension}')
+        self.job.result_name = download_name
+        return files_dir(self.job.result_file)
+
+    def input_path(self, relative_path):
+        return os.path.join(settings.JOB_FILES_DIR, relative_path)
+
+
+def reap_stale():
+    """
+    把超过 JOB_STALE_TIMEOUT 没有心跳的执行中任务标记为失败(执行它的 worker 已崩溃或被杀死), 返回数量
+    """
+    deadline = datetime.now() - timedelta(seconds=settings.JOB_STALE_TIMEOUT)
+    stale = Q(heartbeat_time__lt=deadline) | Q(heartbeat_time__isnull=True, start_time__lt=deadline)
+    return Job.objects.filter(stale, status=Job.RUNNING).update(
+        status=Job.FAILED, finish_time=datetime.now(),
+        message=f'执行任务的进程已退出(超过{settings.JOB_STALE_TIMEOUT // 60}分钟没有进度), 请重新提交'
+    )
+
+
+def claim_next():
+    """
+    领取最早排队的任务; 多个 worker 同时运行时用条件更新保证同一任务只被领取一次
+    """
+    reap_stale()
+    candidates = Job.objects.filter(status=Job.QUEUED).order_by('id').values_list('id', flat=True)[:10]
+    for job_id in candidates:
+        claimed = Job.objects.filter(pk=job_id, status=Job.QUEUED).update(
+            status=Job.RUNNING, start_time=datetime.now(), heartbeat_time=datetime.now(), progress=0
+        )
+        if claimed:
+            return Job.objects.select_related('created_by').get(pk=job_id)
+    return None
+
+
+def execute(job):
+    """
+    执行已领取的任务, 记录结果或错误信息
+    """
+    func, _ = _registry.get(job.kind, (None, False))
+    context = JobContext(job)
+    try:
+        if func is None:
+            raise JobError(f'未知的任务类型: {job.kind}')
+        result = func(context, **job.params)
+        job.status = Job.SUCCEEDED
+        job.progress = 100
+        job.message = ''
+        job.result = result
+    except Exception as e:
+        logger.exception('后台任务 %s 执行失败', job)
+        job.status = Job.FAILED
+        job.message = str(e)[:500]
+        job.result = e.result if isinstance(e, JobError) else None
+    finally:
+        context.close()
+    job.finish_time = datetime.now()
+    job.save(update_fields=['status', 'progress', 'message', 'result', 'result_file', 'result_name',
+                            'finish_time'])
+    close_old_connections()
+    return job
@@ -0,0 +1,26 @@
+from rest_framework import serializers
+
+from .models import Job
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """后台任务序列化器"""
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    created_by_name = serializers.CharField(source='created_by.name', read_only=True)
+    has_file = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'kind', 'params', 'status', 'status_display', 'progress', 'message', 'result',
+            'result_name', 'has_file', 'created_by_name', 'create_time', 'start_time', 'finish_time'
+        ]
+
+    def get_has_file(self, obj):
+        return bool(obj.result_file)
+
+
+class JobSubmitSerializer(serializers.Serializer):
+    """提交后台任务"""
+    kind = serializers.CharField(required=True)
+    params = serializers.DictField(required=False, default=dict)
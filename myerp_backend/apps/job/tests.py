@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from apps.staff.models import ERPUser
+
+from . import runner
+from .models import Job
+
+
+@runner.register('test_conflict', submittable=False)
+def conflict(context):
+    raise runner.JobError('存在冲突', result={'detail': '存在冲突', 'order_numbers': ['A001']})
+
+
+@runner.register('test_progress', submittable=False)
+def report_progress(context):
+    context.progress(40, '处理中')
+    return {'progress': Job.objects.get(pk=context.job.pk).progress}
+
+
+class JobRunnerTest(TestCase):
+    """后台任务的领取/执行/心跳"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.boss = ERPUser.objects.create_superuser(account='boss', name='老板', telephone='13000000000',
+                                                    password='111111')
+
+    def run_job(self, kind):
+        job = runner.submit(kind, self.boss)
+        claimed = runner.claim_next()
+        self.assertEqual(claimed.pk, job.pk)
+        return runner.execute(claimed)
+
+    def test_error_result_is_stored(self):
+        job = self.run_job('test_conflict')
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.message, '存在冲突')
+        self.assertEqual(Job.objects.get(pk=job.pk).result['order_numbers'], ['A001'])
+
+    @override_settings(JOB_STALE_TIMEOUT=60)
+    def test_stale_running_job_is_failed(self):
+        long_ago = datetime.now() - timedelta(minutes=5)
+        stale = Job.objects.create(kind='test_progress', created_by=self.boss, status=Job.RUNNING,
+                                   start_time=long_ago, heartbeat_time=long_ago)
+        legacy = Job.objects.create(kind='test_progress', created_by=self.boss, status=Job.RUNNING,
+                                    start_time=long_ago)
+        alive = Job.objects.create(kind='test_progress', created_by=self.boss, status=Job.RUNNING,
+                                   start_time=long_ago, heartbeat_time=datetime.now())
+
+        self.assertIsNone(runner.claim_next())
+        self.assertEqual(Job.objects.get(pk=stale.pk).status, Job.FAILED)
+        self.assertEqual(Job.objects.get(pk=legacy.pk).status, Job.FAILED)
+        self.assertEqual(Job.objects.get(pk=alive.pk).status, Job.RUNNING)
+
+
+class JobProgressTest(TransactionTestCase):
+    """任务不在事务中时, 进度立即写入(轮询接口可见)"""
+
+    def test_progress_refreshes_heartbeat(self):
+        boss = ERPUser.objects.create_superuser(account='boss', name='老板', telephone='13000000000',
+                                                password='111111')
+        runner.submit('test_progress', boss)
+        job = runner.execute(runner.claim_next())
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertEqual(job.result, {'progress': 40})
+        self.assertIsNotNone(Job.objects.get(pk=job.pk).heartbeat_time)
@@ -0,0 +1,9 @@
+from rest_framework.routers import DefaultRouter
+from .views import JobViewSet
+
+app_name = 'job'
+
+router = DefaultRouter()
+router.register('jobs', JobViewSet, basename='jobs')
+
+urlpatterns = [] + router.urls
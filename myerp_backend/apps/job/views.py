@@ -0,0 +1,46 @@
+import os
+
+from django.conf import settings
+from django.http import FileResponse
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from apps.staff.permissions import IsBoss
+from . import serializers, paginations, runner
+from .models import Job
+
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    后台任务: 提交、查询进度、下载结果文件
+    """
+    queryset = Job.objects.select_related('created_by').order_by('-id')
+    serializer_class = serializers.JobSerializer
+    permission_classes = [IsAuthenticated, IsBoss]
+    pagination_class = paginations.JobPagination
+
+    def create(self, request):
+        """提交任务, 立即返回任务ID, 通过 GET /api/jobs/<id>/ 轮询进度"""
+        serializer = serializers.JobSubmitSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({'detail': '错误, 数据不合规!'}, status=status.HTTP_400_BAD_REQUEST)
+
+        kind = serializer.validated_data['kind']
+        if kind not in runner.submittable_kinds():
+            return Response({'detail': f'不支持的任务类型: {kind}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        job = runner.submit(kind, request.user, **serializer.validated_data['params'])
+        return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """下载任务生成的结果文件"""
+        job = self.get_object()
+        if job.status != Job.SUCCEEDED:
+            return Response({'detail': '任务尚未完成'}, status=status.HTTP_400_BAD_REQUEST)
+        path = os.path.join(settings.JOB_FILES_DIR, job.result_file) if job.result_file else ''
+        if not path or not os.path.exists(path):
+            return Response({'detail': '该任务没有可下载的文件'}, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=job.result_name)
@@ -0,0 +1,136 @@
+import threading
+
+# 桶的上界: 请求耗时(秒) / 每个请求的 SQL 条数
+DURATION_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_lock = threading.Lock()
+_views = {}
+_lock_events = {}  # {(事件, 函数名, 原因): 次数}, 事件为 retry(已重试) / failure(重试用尽或 NOWAIT 失败)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def lines(self, name, labels):
+        """
+        Prometheus 文本格式的 _bucket/_sum/_count 行(桶计数为累计值)
+        """
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f'{name}_sum{{{labels}}} {round(self.sum, 6)}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+class ViewStats:
+    def __init__(self):
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.db_seconds = 0.0
+        self.render_seconds = 0.0
+        self.statuses = {}
+
+
+def observe(view, status_code, timings):
+    """
+    按视图名累计一次请求的指标(当前进程内)
+    """
+    with _lock:
+        stats = _views.get(view)
+        if stats is None:
+            stats = _views[view] = ViewStats()
+        stats.duration.observe(timings.total_time)
+        stats.queries.observe(timings.queries)
+        stats.db_seconds += timings.db_time
+        stats.render_seconds += timings.render_time
+        status = f'{status_code // 100}xx'
+        stats.statuses[status] = stats.statuses.get(status, 0) + 1
+
+
+def count_retry(operation, reason):
+    """
+    事务因锁冲突回滚后重试一次
+    """
+    _count_lock_event('retry', operation, reason)
+
+
+def count_lock_failure(operation, reason):
+    """
+    事务因锁冲突最终失败(重试用尽或 NOWAIT 加锁失败)
+    """
+    _count_lock_event('failure', operation, reason)
+
+
+def _count_lock_event(event, operation, reason):
+    with _lock:
+        key = (event, operation, reason)
+        _lock_events[key] = _lock_events.get(key, 0) + 1
+
+
+def lock_events():
+    """
+    当前进程的锁冲突计数快照 {(事件, 函数名, 原因): 次数}
+    """
+    with _lock:
+        return dict(_lock_events)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render():
+    """
+    当前进程的全部指标, Prometheus 文本格式
+    """
+    with _lock:
+        views = sorted(_views.items())
+        lines = [
+            '# HELP myerp_request_duration_seconds 请求总耗时',
+            '# TYPE myerp_request_duration_seconds histogram',
+        ]
+        for view, stats in views:
+            lines += stats.duration.lines('myerp_request_duration_seconds', f'view="{_escape(view)}"')
+        lines += [
+            '# HELP myerp_request_queries 每个请求执行的 SQL 条数',
+            '# TYPE myerp_request_queries histogram',
+        ]
+        for view, stats in views:
+            lines += stats.queries.lines('myerp_request_queries', f'view="{_escape(view)}"')
+        for name, attr, help_text in (
+                ('myerp_request_db_seconds_total', 'db_seconds', '执行 SQL 的累计耗时'),
+                ('myerp_request_render_seconds_total', 'render_seconds', '渲染 JSON 响应的累计耗时')):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+            lines += [f'{name}{{view="{_escape(view)}"}} {round(getattr(stats, attr), 6)}' for view, stats in views]
+        lines += ['# HELP myerp_requests_total 请求次数(按响应状态分类)', '# TYPE myerp_requests_total counter']
+        for view, stats in views:
+            lines += [f'myerp_requests_total{{view="{_escape(view)}",status="{status}"}} {count}'
+                      for status, count in sorted(stats.statuses.items())]
+        for event, name, help_text in (
+                ('retry', 'myerp_db_lock_retries_total', '事务因死锁/锁等待超时回滚后重试的次数'),
+                ('failure', 'myerp_db_lock_failures_total', '事务因锁冲突最终失败的次数')):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+            lines += [f'{name}{{operation="{_escape(operation)}",reason="{reason}"}} {count}'
+                      for (kind, operation, reason), count in sorted(_lock_events.items()) if kind == event]
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    with _lock:
+        _views.clear()
+        _lock_events.clear()
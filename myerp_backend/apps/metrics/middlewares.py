@@ -0,0 +1,69 @@
+import json
+import logging
+from contextlib import ExitStack
+
+from django.db import connections
+
+from . import histograms, timings
+
+logger = logging.getLogger('apps.metrics.requests')
+
+
+class RequestMetricsMiddleware:
+    """
+    记录每个请求的 SQL 条数/耗时、最慢语句、JSON 渲染耗时和总耗时:
+    写入 Server-Timing 响应头和一行 JSON 日志, 并按视图名累计到进程内的直方图(/api/metrics)
+
+    流式响应(StreamingHttpResponse, 例如库存 CSV 导出)只统计到视图返回为止,
+    迭代响应内容时执行的 SQL 不计入; 日志中以 "streaming": true 标记
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        current = timings.RequestTimings()
+        token = timings.current.set(current)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(current))
+                response = self.get_response(request)
+        finally:
+            timings.current.reset(token)
+
+        view = self.view_name(request)
+        histograms.observe(view, response.status_code, current)
+        total = current.total_time
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={current.db_time * 1000:.1f};desc="{current.queries} queries"',
+            f'db-slowest;dur={current.slowest_time * 1000:.1f}',
+            f'render;dur={current.render_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+        if not logger.isEnabledFor(logging.INFO):
+            return response
+        user = getattr(request, 'user', None)
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': view,
+            'status': response.status_code,
+            'user': getattr(user, 'pk', None),
+            'queries': current.queries,
+            'db_ms': round(current.db_time * 1000, 1),
+            'slowest_ms': round(current.slowest_time * 1000, 1),
+            'slowest_sql': current.slowest_sql,
+            'render_ms': round(current.render_time * 1000, 1),
+            'total_ms': round(total * 1000, 1),
+            'streaming': response.streaming,
+        }, ensure_ascii=False))
+        return response
+
+    @staticmethod
+    def view_name(request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return 'unmatched'
+        return match.view_name or match._func_path
@@ -0,0 +1,21 @@
+import time
+
+from rest_framework import renderers
+
+from . import timings
+
+
+class TimedJSONRenderer(renderers.JSONRenderer):
+    """
+    把响应数据编码为 JSON 时计时, 计入当前请求的渲染耗时(请求之外不计时)
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        current = timings.current.get()
+        if current is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        start = time.perf_counter()
+        try:
+            return super().render(data, accepted_media_type, renderer_context)
+        finally:
+            current.render_time += time.perf_counter() - start
@@ -0,0 +1,42 @@
+import contextvars
+import time
+
+# 当前请求的计时器, 由中间件设置; 请求之外(命令/后台任务)为 None, 不计时
+current = contextvars.ContextVar('request_timings', default=None)
+
+SQL_MAX_LENGTH = 300  # 日志中最慢语句的最大长度
+
+
+class RequestTimings:
+    """
+    单个请求的 SQL 条数/耗时、最慢语句、JSON 渲染耗时
+
+    渲染耗时由 renderers.TimedJSONRenderer 在把响应数据编码为 JSON 时累计, 不包含视图中读取 serializer.data 的时间
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_sql = ''
+        self.render_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        """
+        connection.execute_wrapper 的回调, 记录每条语句的耗时
+        """
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.queries += 1
+            self.db_time += elapsed
+            if elapsed > self.slowest_time:
+                self.slowest_time = elapsed
+                self.slowest_sql = sql[:SQL_MAX_LENGTH]
+
+    @property
+    def total_time(self):
+        return time.perf_counter() - self.start
@@ -0,0 +1,9 @@
+from django.urls import path
+from . import views
+
+app_name = 'metrics'
+
+urlpatterns = [
+    # 请求指标(Prometheus 文本格式)
+    path('metrics', views.MetricsView.as_view(), name='metrics'),
+]
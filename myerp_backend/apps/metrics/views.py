@@ -0,0 +1,16 @@
+from django.http import HttpResponse
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
+
+from apps.staff.permissions import IsBoss
+from . import histograms
+
+
+class MetricsView(APIView):
+    """
+    各接口的请求耗时/SQL条数直方图(处理本次请求的进程), Prometheus 文本格式
+    """
+    permission_classes = [IsAuthenticated, IsBoss]
+
+    def get(self, request):
+        return HttpResponse(histograms.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,163 @@
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from apps.common import retries
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+TTL = 60 * 60 * 24  # 幂等键保留时间(秒), 覆盖前端的所有重试
+PENDING_TIMEOUT = 60  # 处理中的幂等键超过该时间仍未完成, 视为请求进程已退出, 允许重新处理
+
+
+def _in_progress():
+    return Response({'detail': '相同的请求正在处理中, 请稍后重试'}, status=status.HTTP_409_CONFLICT)
+
+
+def _cache_key(scope, user_id, key):
+    return f'idempotency:{scope}:{user_id}:{key}'
+
+
+def fingerprint(data):
+    """
+    请求内容摘要: 同一个幂等键只能用于内容相同的请求
+    """
+    if hasattr(data, 'lists'):  # 表单提交的 QueryDict
+        data = dict(data.lists())
+    payload = json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _replay(entry, digest):
+    if entry['fingerprint'] != digest:
+        return Response({'detail': f'{HEADER} 已用于内容不同的请求, 请更换后重新提交'},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    return Response(entry['response'], status=entry['status_code'], headers={REPLAYED_HEADER: 'true'})
+
+
+def _entry(record):
+    return {'fingerprint': record.fingerprint, 'status_code': record.status_code, 'response': record.response}
+
+
+def _claim(user, scope, key, digest):
+    """
+    插入"处理中"的幂等键占位, 唯一约束保证同一个键只有一个请求进入业务事务
+
+    返回 (record, None) 表示由本请求处理; (None, response) 表示直接返回已保存的响应或冲突提示
+    """
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(user=user, scope=scope, key=key, fingerprint=digest,
+                                                 created_at=now), None
+    except IntegrityError:
+        pass
+
+    record = IdempotencyKey.objects.filter(user=user, scope=scope, key=key).first()
+    if record is not None and record.status_code is not None:
+        cache.set(_cache_key(scope, user.pk, key), _entry(record), timeout=TTL)
+        return None, _replay(_entry(record), digest)
+
+    # 处理中的占位超时未完成时接管; 条件更新保证只有一个重试请求能接管.
+    # 原请求仍在业务事务中时持有占位行的锁, 接管在这里等待, 原请求提交后条件不再成立
+    if record is not None and record.created_at < now - timedelta(seconds=PENDING_TIMEOUT):
+        try:
+            taken = IdempotencyKey.objects.filter(pk=record.pk, status_code__isnull=True,
+                                                  created_at=record.created_at).update(fingerprint=digest,
+                                                                                       created_at=now)
+        except DatabaseError as e:
+            if retries.classify(e) is None:
+                raise
+            return None, _in_progress()
+        if taken:
+            record.fingerprint, record.created_at = digest, now
+            return record, None
+
+        record = IdempotencyKey.objects.filter(pk=record.pk).first()
+        if record is not None and record.status_code is not None:
+            return None, _replay(_entry(record), digest)
+
+    return None, _in_progress()
+
+
+def idempotent(scope):
+    """
+    写接口的幂等装饰器(用于视图方法): 请求头带 Idempotency-Key 时, 第一次成功的响应保存到缓存和数据库,
+    之后相同的键(同一员工/接口)直接重放该响应, 重试只需一次缓存读取, 不再进入加锁的业务事务
+
+    没有请求头时行为不变; 失败的响应(4xx/5xx)不保存, 客户端修正后可以用同一个键重新提交
+    业务写入和响应在同一个事务中提交, 请求进程在两者之间退出不会导致超时接管后重复执行
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not key:
+                return method(self, request, *args, **kwargs)
+            if len(key) > IdempotencyKey._meta.get_field('key').max_length:
+                return Response({'detail': f'{HEADER} 过长'}, status=status.HTTP_400_BAD_REQUEST)
+
+            digest = fingerprint(request.data)
+            cache_key = _cache_key(scope, request.user.pk, key)
+            entry = cache.get(cache_key)
+            if entry is not None:
+                return _replay(entry, digest)
+
+            record, response = _claim(request.user, scope, key, digest)
+            if response is not None:
+                return response
+
+            def execute():
+                # 锁定本请求的占位行: 业务写入和保存的响应在同一个事务中提交, 不会出现业务已提交而幂等键仍是
+                # "处理中"的情况; 占位已被超时接管时不再执行业务写入
+                claimed = retries.for_update(IdempotencyKey.objects).filter(
+                    pk=record.pk, status_code__isnull=True, created_at=record.created_at
+                ).values_list('pk', flat=True).first()
+                if claimed is None:
+                    return _in_progress()
+
+                response = method(self, request, *args, **kwargs)
+                if status.is_success(response.status_code):
+                    record.status_code = response.status_code
+                    record.response = response.data
+                    record.save(update_fields=['status_code', 'response'])
+                else:
+                    record.delete()
+                return response
+
+            # 视图内的 retries.atomic 成为嵌套事务, 锁冲突时由这里整体重新执行(包括锁定占位行)
+            execute.__qualname__ = method.__qualname__
+            try:
+                response = retries.atomic(execute)()
+            except Exception:
+                IdempotencyKey.objects.filter(pk=record.pk, status_code__isnull=True,
+                                              created_at=record.created_at).delete()
+                raise
+
+            if record.status_code is not None:
+                # 经过 JSON 编码再放入缓存, 与数据库兜底重放的内容完全一致
+                record.refresh_from_db(fields=['response'])
+                cache.set(cache_key, _entry(record), timeout=TTL)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def purge():
+    """
+    删除超过保留时间的幂等键, 返回删除的行数
+    """
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=TTL)).delete()
+    return deleted
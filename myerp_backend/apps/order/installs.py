@@ -0,0 +1,72 @@
+import datetime
+
+from apps.common import retries
+from apps.inventory import stocks
+
+from .models import Order, OrderDetail, OperationLog
+
+
+class InstallError(Exception):
+    """
+    订单出库失败(订单不存在/已出库/已作废)
+    """
+
+
+@retries.atomic
+def install_orders(items, installer, operator):
+    """
+    一个或多个订单一起出库(同一趟送货), 在自己的事务中执行, 遇到死锁或锁等待超时时整体重新执行
+
+    items: [(order_id, installation_fee, transportation_fee)]
+    先按ID顺序锁定订单复核状态, 再按ID顺序锁定全部相关库存并在内存中校验在库数量, 一条语句完成扣减;
+    同一订单的重复出库在订单行锁上等待, 之后得到"已出库"而不是库存不足的提示.
+    加锁顺序(先订单后库存)与作废一致. 任何一个订单失败都抛出异常, 整个事务回滚
+    返回出库后的订单列表(与 items 顺序一致)
+    """
+    items = [(int(order_id), installation_fee, transportation_fee)
+             for order_id, installation_fee, transportation_fee in items]
+    order_ids = [order_id for order_id, _, _ in items]
+    if len(set(order_ids)) != len(order_ids):
+        raise InstallError('同一订单不能重复出库')
+
+    orders = {order.id: order for order in retries.for_update(Order.objects).filter(id__in=order_ids).order_by('id')}
+    for order_id in order_ids:
+        order = orders.get(order_id)
+        if order is None:
+            raise InstallError(f'订单(ID {order_id})不存在')
+        if order.delivery_status == 2:
+            raise InstallError(f'订单{order.order_number}已出库，不能重复操作')
+        if order.delivery_status == 3:
+            raise InstallError(f'订单{order.order_number}已作废，不能出库')
+
+    details = OrderDetail.objects.filter(order_id__in=order_ids).values('inventory_id', 'quantity')
+    stocks.install_stock(details)
+
+    now = datetime.datetime.now()
+    timestamp = now.strftime('%Y-%m-%d %H:%M:%S')
+    installed, logs = [], []
+    for order_id, installation_fee, transportation_fee in items:
+        order = orders[order_id]
+        order.delivery_status = 2  # 已送货
+        order.installer = installer
+        order.installation_fee = installation_fee
+        order.transportation_fee = transportation_fee
+        order.installation_time = now
+        # 毛利润 = 订单总额 - 成本总价 - 安装费用 - 运输费用 (save 时重新计算)
+        order.save()
+        installed.append(order)
+
+        logs.append(OperationLog(
+            order=order,
+            description=(
+                f"于 {timestamp} 进行一键出库操作。"
+                f"安装人员: {installer.name}, "
+                f"安装费用: ¥{installation_fee}, "
+                f"运输费用: ¥{transportation_fee}, "
+                f"最终毛利(扣除安装费和运输费): ¥{order.gross_profit}"
+            ),
+            operator=operator
+        ))
+    OperationLog.objects.bulk_create(logs)
+
+    return installed
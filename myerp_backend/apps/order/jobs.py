@@ -0,0 +1,11 @@
+from django.db import transaction
+
+from apps.job import runner
+from . import summaries
+
+
+@runner.register('rebuild_order_summaries')
+def rebuild_order_summaries(context):
+    """重建订单月度汇总"""
+    with transaction.atomic():
+        return {'count': summaries.rebuild()}
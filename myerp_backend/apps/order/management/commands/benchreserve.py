@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction, connection
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+
+from apps.brand.models import Brand
+from apps.category.models import Category
+from apps.inventory.models import Inventory
+from apps.inventory.stocks import reserve_stock
+
+
+class Command(BaseCommand):
+    help = '对比逐行加锁与批量加锁两种下单占用库存方式的耗时和SQL条数(数据在事务中生成, 结束后回滚)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, nargs='+', default=[1, 10, 100], help='每个订单的明细行数')
+        parser.add_argument('--rounds', type=int, default=20, help='每种行数重复执行的次数')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            brand = Brand.objects.create(name='压测品牌', intro='benchreserve')
+            category = Category.objects.create(name='压测分类')
+            max_lines = max(options['lines'])
+            Inventory.objects.bulk_create([
+                Inventory(name=f'BENCH-{i}', brand=brand, category=category, cost=100, in_stock=1000)
+                for i in range(max_lines)
+            ])
+            inventory_ids = list(Inventory.objects.filter(brand=brand).values_list('id', flat=True))
+
+            self.stdout.write(f"{'行数':>6} {'方式':>8} {'平均耗时(ms)':>14} {'SQL条数':>8}")
+            for lines in options['lines']:
+                details = [{'inventory_id': inventory_id, 'quantity': 1} for inventory_id in inventory_ids[:lines]]
+                for label, func in (('逐行', self.legacy), ('批量', self.bulk)):
+                    elapsed, queries = self.measure(func, details, brand.id, options['rounds'])
+                    self.stdout.write(f"{lines:>6} {label:>8} {elapsed * 1000:>14.2f} {queries:>8}")
+
+            transaction.set_rollback(True)
+
+    def measure(self, func, details, brand_id, rounds):
+        total = 0
+        with CaptureQueriesContext(connection) as context:
+            for _ in range(rounds):
+                start = time.perf_counter()
+                with transaction.atomic():
+                    func(details, brand_id)
+                total += time.perf_counter() - start
+        return total / rounds, len(context.captured_queries) // rounds
+
+    def legacy(self, details, brand_id):
+        """原实现: 序列化器逐行查询 + 事务内逐行加锁保存"""
+        for item in details:
+            Inventory.objects.get(id=item['inventory_id'])
+        for item in details:
+            inventory = Inventory.objects.select_for_update().get(id=item['inventory_id'])
+            inventory.been_order = F('been_order') + item['quantity']
+            inventory.save(update_fields=['been_order'])
+
+    def bulk(self, details, brand_id):
+        """新实现: 一条加锁查询 + 一条 CASE UPDATE"""
+        reserve_stock(details, brand_id=brand_id)
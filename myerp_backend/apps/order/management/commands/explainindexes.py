@@ -0,0 +1,101 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.client.models import Client, FollowUpRecord
+from apps.common import seeds
+from apps.inventory.models import Purchase, PurchaseLog, Receive, ReceiveLog, InventoryLog
+from apps.order.models import Order, OperationLog
+
+PAGE_SIZE = 20
+ORDER_ORDERING = ('-sign_time', '-id')
+CLIENT_ORDERING = ('level', 'last_follow_time', 'uid')
+
+
+def hot_queries():
+    """
+    各列表/详情接口的热点查询(与视图中的筛选和排序一致)及预期使用的索引
+    """
+    order = Order.objects.order_by('-sign_time').values('id', 'brand_id', 'staff_id').first()
+    client = Client.objects.values('uid', 'staff_id').first()
+    purchase_id = Purchase.objects.values_list('id', flat=True).first()
+    receive_id = Receive.objects.values_list('id', flat=True).first()
+    if not (order and client and purchase_id and receive_id):
+        raise CommandError('数据库中没有订单/客户/发货单/入库单, 请使用 --seed 写入合成数据后再分析')
+
+    month_ago = timezone.now() - timedelta(days=30)
+    orders = Order.objects.exclude(delivery_status=3)
+    clients = Client.objects.exclude(level__in=[0, 5])
+    return [
+        ('订单列表(默认)', 'order_sign_time_idx', orders.order_by(*ORDER_ORDERING)),
+        ('订单列表(按送货状态)', 'order_delivery_sign_idx',
+         Order.objects.filter(delivery_status=1).order_by(*ORDER_ORDERING)),
+        ('订单列表(按结清状态)', 'order_payment_sign_idx', orders.filter(payment_status=1).order_by(*ORDER_ORDERING)),
+        ('订单列表(按品牌)', 'order_brand_sign_idx', orders.filter(brand_id=order['brand_id']).order_by(*ORDER_ORDERING)),
+        ('订单列表(按签单员工)', 'order_staff_sign_idx',
+         orders.filter(staff_id=order['staff_id']).order_by(*ORDER_ORDERING)),
+        ('订单列表(签单时间范围)', 'order_sign_time_idx',
+         orders.filter(sign_time__gte=month_ago).order_by(*ORDER_ORDERING)),
+        ('客户列表(老板)', 'client_level_follow_idx', clients.order_by(*CLIENT_ORDERING)),
+        ('客户列表(员工)', 'client_staff_level_follow_idx',
+         clients.filter(staff_id=client['staff_id']).order_by(*CLIENT_ORDERING)),
+        ('客户跟进记录', 'follow_client_created_idx',
+         FollowUpRecord.objects.filter(client_id=client['uid']).order_by('-created_at')),
+        ('订单操作日志', 'oplog_order_created_idx',
+         OperationLog.objects.filter(order_id=order['id']).order_by('-created_at', '-id')),
+        ('发货日志', 'purchaselog_purchase_time_idx',
+         PurchaseLog.objects.filter(purchase_id=purchase_id).order_by('-create_time')),
+        ('入库日志', 'receivelog_receive_time_idx',
+         ReceiveLog.objects.filter(receive_id=receive_id).order_by('-create_time')),
+        ('库存日志', 'inventorylog_time_idx', InventoryLog.objects.order_by('-create_time')),
+    ]
+
+
+class Command(BaseCommand):
+    help = '对各列表接口的热点查询执行 EXPLAIN, 报告是否命中预期索引以及取第一页的耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help='先写入指定订单数的合成数据(在事务中写入, 结束后回滚)')
+        parser.add_argument('--repeat', type=int, default=20, help='每个查询重复次数, 取平均值')
+        parser.add_argument('--verbose-plan', action='store_true', help='输出完整的执行计划')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['seed']:
+                start = time.perf_counter()
+                counts = seeds.seed(orders=options['seed'], derived=False)
+                self.stdout.write(f"写入合成数据 {counts} 耗时 {time.perf_counter() - start:.1f}s")
+                if connection.vendor == 'sqlite':
+                    # SQLite 没有自动统计信息, 不 ANALYZE 时优化器无法区分索引的选择性
+                    with connection.cursor() as cursor:
+                        cursor.execute('ANALYZE')
+
+            self.stdout.write(f"{'查询':<16} {'预期索引':<30} {'命中':<4} {'耗时(ms)':>9}")
+            missed = 0
+            for label, index, queryset in hot_queries():
+                plan = queryset.explain()
+                used = index in plan
+                missed += not used
+                elapsed = self.measure(queryset, options['repeat'])
+                self.stdout.write(f"{label:<16} {index:<30} {'是' if used else '否':<4} {elapsed:>9.2f}")
+                if options['verbose_plan'] or not used:
+                    self.stdout.write(self.style.WARNING(plan) if not used else plan)
+
+            transaction.set_rollback(True)
+
+        if missed:
+            self.stdout.write(self.style.WARNING(f'{missed}个查询没有使用预期索引(数据量较小时优化器可能选择全表扫描)'))
+        else:
+            self.stdout.write(self.style.SUCCESS('全部热点查询均使用了预期索引!'))
+
+    @staticmethod
+    def measure(queryset, repeat):
+        """取第一页, 返回平均耗时(毫秒)"""
+        start = time.perf_counter()
+        for _ in range(repeat):
+            list(queryset[:PAGE_SIZE])
+        return (time.perf_counter() - start) / repeat * 1000
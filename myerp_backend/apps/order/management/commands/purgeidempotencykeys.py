@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.order import idempotency
+
+
+class Command(BaseCommand):
+    help = f'删除超过保留时间({idempotency.TTL // 3600}小时)的幂等键, 建议每天定时执行'
+
+    def handle(self, *args, **options):
+        deleted = idempotency.purge()
+        self.stdout.write(self.style.SUCCESS(f'已删除{deleted}个过期的幂等键'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.order import summaries
+
+
+class Command(BaseCommand):
+    help = '从订单表重新计算并重建订单月度汇总, 或仅校验汇总是否一致'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='只校验不重建, 存在差异时返回非0状态')
+
+    def handle(self, *args, **options):
+        if options['check']:
+            drifts = summaries.verify()
+            for (year, month, staff_id, brand_id), stored, real in drifts:
+                self.stdout.write(f'{year}年{month}月 员工{staff_id} 品牌{brand_id}: 汇总 {stored} / 实际 {real}')
+            if drifts:
+                raise CommandError(f'订单月度汇总存在{len(drifts)}处差异, 请执行 rebuildordersummaries 重建')
+            self.stdout.write(self.style.SUCCESS('订单月度汇总校验通过!'))
+            return
+
+        with transaction.atomic():
+            count = summaries.rebuild()
+            drifts = summaries.verify()
+        if drifts:
+            raise CommandError(f'重建后仍有{len(drifts)}处差异, 请检查是否有并发写入')
+        self.stdout.write(self.style.SUCCESS(f'订单月度汇总重建完成, 共{count}条!'))
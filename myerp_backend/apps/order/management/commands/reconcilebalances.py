@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.order import payments
+
+
+class Command(BaseCommand):
+    help = '按收款记录校验订单的已收尾款/待收尾款/结清状态, 加 --fix 时修正存在差异的订单'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='按收款记录重新计算并保存存在差异的订单')
+
+    def handle(self, *args, **options):
+        drifts = payments.drifts()
+        for order_id, order_number, received, paid, pending, payment_status in drifts:
+            self.stdout.write(f'订单{order_number}(ID {order_id}): 已收尾款 {received} / 收款合计 {paid}, '
+                              f'待收尾款 {pending}, 结清状态 {payment_status}')
+        if not drifts:
+            self.stdout.write(self.style.SUCCESS('订单尾款校验通过!'))
+            return
+        if not options['fix']:
+            raise CommandError(f'{len(drifts)}个订单的尾款与收款记录不一致, 请执行 reconcilebalances --fix 修正')
+
+        with transaction.atomic():
+            payments.reconcile([order_id for order_id, *_ in drifts])
+        remaining = payments.drifts()
+        if remaining:
+            raise CommandError(f'修正后仍有{len(remaining)}个订单不一致, 请检查是否有并发写入')
+        self.stdout.write(self.style.SUCCESS(f'已修正{len(drifts)}个订单的尾款!'))
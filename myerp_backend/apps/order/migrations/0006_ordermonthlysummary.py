@@ -0,0 +1,71 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+def build_summaries(apps, schema_editor):
+    Order = apps.get_model('order', 'Order')
+    OrderMonthlySummary = apps.get_model('order', 'OrderMonthlySummary')
+    rows = Order.objects.exclude(delivery_status=3).annotate(
+        year=ExtractYear('sign_time'), month=ExtractMonth('sign_time')
+    ).values('year', 'month', 'staff_id', 'brand_id').annotate(
+        order_count=Count('id'),
+        delivered_count=Count('id', filter=Q(delivery_status=2)),
+        sum_total_amount=Sum('total_amount'),
+        sum_total_cost=Sum('total_cost'),
+        sum_gross_profit=Sum('gross_profit'),
+        sum_installation_fee=Sum('installation_fee'),
+        sum_transportation_fee=Sum('transportation_fee'),
+        sum_pending_balance=Sum('pending_balance'),
+    ).order_by()
+    OrderMonthlySummary.objects.bulk_create([
+        OrderMonthlySummary(
+            year=row['year'], month=row['month'], staff_id=row['staff_id'], brand_id=row['brand_id'],
+            order_count=row['order_count'], delivered_count=row['delivered_count'],
+            total_amount=row['sum_total_amount'], total_cost=row['sum_total_cost'],
+            gross_profit=row['sum_gross_profit'], installation_fee=row['sum_installation_fee'],
+            transportation_fee=row['sum_transportation_fee'], pending_balance=row['sum_pending_balance'],
+        )
+        for row in rows
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('brand', '0001_initial'),
+        ('order', '0005_alter_installer_telephone_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderMonthlySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField(verbose_name='年份')),
+                ('month', models.IntegerField(verbose_name='月份')),
+                ('order_count', models.IntegerField(default=0, verbose_name='订单数')),
+                ('delivered_count', models.IntegerField(default=0, verbose_name='已送货订单数')),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='订单总额')),
+                ('total_cost', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='成本总价')),
+                ('gross_profit', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='毛利润')),
+                ('installation_fee', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='安装费用')),
+                ('transportation_fee', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='运输费用')),
+                ('pending_balance', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='待收尾款')),
+                ('brand', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_summaries', to='brand.brand', verbose_name='品牌')),
+                ('staff', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_summaries', to=settings.AUTH_USER_MODEL, verbose_name='签单人员')),
+            ],
+            options={
+                'verbose_name': '订单月度汇总',
+                'verbose_name_plural': '订单月度汇总',
+                'db_table': 'order_monthly_summary',
+                'unique_together': {('year', 'month', 'staff', 'brand')},
+            },
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.6 on 2026-10-18 18:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('brand', '0001_initial'),
+        ('client', '0004_list_indexes'),
+        ('order', '0006_ordermonthlysummary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='operationlog',
+            index=models.Index(fields=['order', 'created_at'], name='oplog_order_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['sign_time'], name='order_sign_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['delivery_status', 'sign_time'], name='order_delivery_sign_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['payment_status', 'sign_time'], name='order_payment_sign_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['brand', 'sign_time'], name='order_brand_sign_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['staff', 'sign_time'], name='order_staff_sign_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.6 on 2026-10-18 18:28
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0007_list_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=50, verbose_name='接口')),
+                ('key', models.CharField(max_length=100, verbose_name='幂等键')),
+                ('fingerprint', models.CharField(max_length=64, verbose_name='请求内容摘要')),
+                ('status_code', models.IntegerField(blank=True, null=True, verbose_name='响应状态码(为空表示处理中)')),
+                ('response', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True, verbose_name='响应内容')),
+                ('created_at', models.DateTimeField(db_index=True, verbose_name='创建时间')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='idempotency_keys', to=settings.AUTH_USER_MODEL, verbose_name='请求人')),
+            ],
+            options={
+                'verbose_name': '幂等键',
+                'verbose_name_plural': '幂等键',
+                'db_table': 'order_idempotency_key',
+                'unique_together': {('user', 'scope', 'key')},
+            },
+        ),
+    ]
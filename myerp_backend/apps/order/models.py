@@ -1,8 +1,12 @@
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
 from apps.client.models import Client
 from apps.staff.models import ERPUser
 from apps.inventory.models import Inventory
 from apps.brand.models import Brand
+from apps.home import caches
+from apps.search import tokens
+from . import summaries, payments
 
 # Create your models here.
 
@@ -19,6 +23,34 @@ class Installer(models.Model):
         return self.name
 
 
+class OrderQuerySet(models.QuerySet):
+    """订单查询集: 为不同接口预先规划好关联数据的加载方式"""
+
+    # 订单列表只需要的本表字段
+    LIST_FIELDS = (
+        'id', 'order_number', 'sign_time', 'total_amount', 'down_payment', 'pending_balance',
+        'total_cost', 'gross_profit', 'delivery_status', 'payment_status', 'address'
+    )
+
+    def for_list(self):
+        """订单列表: 只取列表需要的列, 品牌/客户/员工名称通过联表一次取出"""
+        return self.values(
+            *self.LIST_FIELDS,
+            brand_name=models.F('brand__name'),
+            client_name=models.F('client__name'),
+            staff_name=models.F('staff__name'),
+        )
+
+    def for_detail(self):
+        """订单详情: 一次性加载序列化器用到的全部关联对象, 查询条数与明细/日志数量无关"""
+        return self.select_related(
+            'brand', 'client__staff', 'staff', 'installer'
+        ).prefetch_related(
+            models.Prefetch('details', queryset=OrderDetail.objects.select_related('inventory__category')),
+            models.Prefetch('operation_logs', queryset=OperationLog.objects.select_related('operator')),
+        )
+
+
 class Order(models.Model):
     """订单模型"""
     DELIVERY_STATUS_CHOICES = (
@@ -54,13 +86,35 @@ class Order(models.Model):
     address = models.CharField(max_length=200, verbose_name='安装地址')
     remark = models.TextField(blank=True, null=True, verbose_name='备注')
 
+    objects = OrderQuerySet.as_manager()
+
     class Meta:
         verbose_name = '订单'
         verbose_name_plural = verbose_name
         ordering = ['-sign_time']
+        # 订单列表按签单时间倒序, 每个筛选条件与签单时间组成联合索引, 等值筛选后直接按索引顺序取一页
+        # (InnoDB 二级索引末尾隐含主键, 同时满足 (-sign_time, -id) 的分页排序)
+        indexes = [
+            models.Index(fields=['sign_time'], name='order_sign_time_idx'),
+            models.Index(fields=['delivery_status', 'sign_time'], name='order_delivery_sign_idx'),
+            models.Index(fields=['payment_status', 'sign_time'], name='order_payment_sign_idx'),
+            models.Index(fields=['brand', 'sign_time'], name='order_brand_sign_idx'),
+            models.Index(fields=['staff', 'sign_time'], name='order_staff_sign_idx'),
+        ]
     
     def __str__(self):
         return f"订单 {self.order_number}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 记录加载时对月度汇总的贡献, 保存时据此计算增量
+        instance._summary_snapshot = summaries.snapshot(instance, field_names)
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._summary_snapshot = summaries.snapshot(self)
     
     def save(self, *args, **kwargs):
         # 计算待收尾款 = 订单总额 - 首付定金 - 已收尾款
@@ -78,9 +132,26 @@ class Order(models.Model):
                 self.payment_status = 2  # 已结清
             else:
                 self.payment_status = 1  # 未结清
-            
+        
+        # 保存前的月度汇总贡献(新订单没有)
+        adding = self._state.adding
+        old = None if adding else getattr(self, '_summary_snapshot', summaries.UNKNOWN)
+        if old is summaries.UNKNOWN:
+            old = summaries.load_snapshot(self.pk)
+
         super().save(*args, **kwargs)
 
+        # 订单号创建后不再修改, 只在新建时建立检索词元
+        if adding:
+            tokens.index_instance(self)
+
+        # 增量维护月度销售汇总
+        self._summary_snapshot = summaries.contribution(self)
+        summaries.adjust(old, self._summary_snapshot)
+
+        # 订单金额/状态变化后, 首页销售看板和订单列表统计缓存失效
+        caches.invalidate_on_commit(caches.STAFF_PERFORMANCE, caches.MONTHLY_SALES, caches.ORDER_STATS)
+
 
 class OrderDetail(models.Model):
     """订单详情模型"""
@@ -112,14 +183,16 @@ class BalancePayment(models.Model):
         return f"{self.order} - 收款 {self.amount}"
     
     def save(self, *args, **kwargs):
-        # 保存尾款收取记录
-        super().save(*args, **kwargs)
-        
-        # 更新订单的已收尾款
-        order = self.order
-        total_balance_payment = BalancePayment.objects.filter(order=order).aggregate(models.Sum('amount'))
-        order.received_balance = total_balance_payment['amount__sum'] or 0
-        order.save()
+        """
+        新增收款时用一条 UPDATE 增量更新订单的已收/待收尾款和结清状态, 超过待收尾款时抛出 PaymentError
+
+        不再重新合计全部收款记录, 与收款记录的一致性由 reconcilebalances 定期校验
+        """
+        adding = self._state.adding
+        with transaction.atomic():
+            if adding:
+                payments.apply(self.order_id, self.amount)
+            super().save(*args, **kwargs)
 
 
 class OperationLog(models.Model):
@@ -133,6 +206,56 @@ class OperationLog(models.Model):
         verbose_name = '操作日志'
         verbose_name_plural = verbose_name
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['order', 'created_at'], name='oplog_order_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.order} - {self.created_at}"
+
+
+class OrderMonthlySummary(models.Model):
+    """订单月度汇总模型(按年/月/签单人员/品牌, 不含已作废订单)"""
+    year = models.IntegerField(verbose_name='年份')
+    month = models.IntegerField(verbose_name='月份')
+    staff = models.ForeignKey(ERPUser, on_delete=models.CASCADE, related_name='monthly_summaries', verbose_name='签单人员')
+    brand = models.ForeignKey(Brand, on_delete=models.CASCADE, related_name='monthly_summaries', verbose_name='品牌')
+    order_count = models.IntegerField(default=0, verbose_name='订单数')
+    delivered_count = models.IntegerField(default=0, verbose_name='已送货订单数')
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='订单总额')
+    total_cost = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='成本总价')
+    gross_profit = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='毛利润')
+    installation_fee = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='安装费用')
+    transportation_fee = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='运输费用')
+    pending_balance = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='待收尾款')
+
+    class Meta:
+        verbose_name = '订单月度汇总'
+        verbose_name_plural = verbose_name
+        db_table = 'order_monthly_summary'
+        unique_together = ('year', 'month', 'staff', 'brand')
+
+    def __str__(self):
+        return f"{self.year}-{self.month} {self.staff_id} {self.brand_id}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    幂等键: 保存写接口第一次成功的响应, 客户端带相同的 Idempotency-Key 重试时直接重放(Redis 不可用时的兜底存储)
+    """
+    user = models.ForeignKey(ERPUser, on_delete=models.CASCADE, related_name='idempotency_keys', verbose_name='请求人')
+    scope = models.CharField(max_length=50, verbose_name='接口')
+    key = models.CharField(max_length=100, verbose_name='幂等键')
+    fingerprint = models.CharField(max_length=64, verbose_name='请求内容摘要')
+    status_code = models.IntegerField(null=True, blank=True, verbose_name='响应状态码(为空表示处理中)')
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder, verbose_name='响应内容')
+    created_at = models.DateTimeField(db_index=True, verbose_name='创建时间')
+
+    class Meta:
+        verbose_name = '幂等键'
+        verbose_name_plural = verbose_name
+        db_table = 'order_idempotency_key'
+        unique_together = ('user', 'scope', 'key')
+
+    def __str__(self):
+        return f"{self.scope} {self.key}"
@@ -1,19 +1,23 @@
-from rest_framework.pagination import PageNumberPagination
+from apps.common.paginations import PageOrCursorPagination
 
-class OrderPagination(PageNumberPagination):
-    """订单列表分页器"""
+
+class OrderPagination(PageOrCursorPagination):
+    """订单列表分页器(?cursor= 时按签单时间倒序游标分页, 深度翻页不退化)"""
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 50
+    keyset_ordering = ('-sign_time', '-id')
 
-class OrderDetailPagination(PageNumberPagination):
+class OrderDetailPagination(PageOrCursorPagination):
     """订单详情分页器"""
     page_size = 30
     page_size_query_param = 'page_size'
     max_page_size = 100
+    keyset_ordering = ('id',)
 
-class OperationLogPagination(PageNumberPagination):
+class OperationLogPagination(PageOrCursorPagination):
     """操作日志分页器"""
     page_size = 30
     page_size_query_param = 'page_size'
-    max_page_size = 100
\ No newline at end of file
+    max_page_size = 100
+    keyset_ordering = ('-created_at', '-id')
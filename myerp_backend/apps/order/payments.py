@@ -0,0 +1,75 @@
+from decimal import Decimal
+
+from django.db.models import F, Q, Case, When, Value, Sum, DecimalField
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from apps.home import caches
+
+from . import models, summaries
+
+
+class PaymentError(Exception):
+    """
+    尾款收取失败(订单不存在/支付金额超过待收尾款)
+    """
+
+
+def apply(order_id, amount):
+    """
+    在一条 UPDATE 中累加已收尾款并重新计算待收尾款和结清状态, 必须在收款记录所在的事务内调用
+
+    WHERE 条件要求待收尾款不小于本次金额, UPDATE 持有行锁, 并发收款不会超收;
+    结清状态放在第一个赋值: MySQL 按从左到右的顺序赋值, 后面的赋值会读到已修改的列
+    """
+    amount = Decimal(amount)
+    updated = models.Order.objects.filter(pk=order_id, pending_balance__gte=amount).update(
+        payment_status=Case(
+            When(delivery_status=3, then=Value(3)),  # 作废订单保持作废状态
+            When(pending_balance__lte=amount, then=Value(2)),
+            default=Value(1),
+        ),
+        received_balance=F('received_balance') + amount,
+        pending_balance=F('pending_balance') - amount,
+        last_operation_time=timezone.now(),
+    )
+
+    order = models.Order.objects.filter(pk=order_id).only(*summaries.ONLY_FIELDS).first()
+    if order is None:
+        raise PaymentError('订单不存在')
+    if not updated:
+        raise PaymentError(f'支付金额(¥{amount})不能超过待收尾款(¥{order.pending_balance})')
+
+    # Order.save 被绕过, 手动维护月度汇总中的待收尾款(作废订单不在汇总中)
+    contribution = summaries.contribution(order)
+    if contribution is not None:
+        summaries.adjust(None, (contribution[0], {'pending_balance': -amount}))
+    caches.invalidate_on_commit(caches.ORDER_STATS)
+    return order
+
+
+def drifts():
+    """
+    对比订单的已收/待收尾款、结清状态与收款记录的合计, 返回不一致的订单
+    [(order_id, order_number, 已收尾款, 收款合计, 待收尾款, 结清状态)]
+    """
+    paid = Coalesce(Sum('balance_payments__amount'), Value(0), output_field=DecimalField())
+    expected_pending = F('total_amount') - F('down_payment') - F('paid')
+    queryset = models.Order.objects.order_by().annotate(paid=paid).filter(
+        ~Q(received_balance=F('paid'))
+        | ~Q(pending_balance=expected_pending)
+        | Q(delivery_status=3) & ~Q(payment_status=3)
+        | ~Q(delivery_status=3) & Q(pending_balance__lte=0) & ~Q(payment_status=2)
+        | ~Q(delivery_status=3) & Q(pending_balance__gt=0) & ~Q(payment_status=1)
+    )
+    return list(queryset.values_list('id', 'order_number', 'received_balance', 'paid', 'pending_balance',
+                                     'payment_status').order_by('id'))
+
+
+def reconcile(order_ids):
+    """
+    按收款记录重新计算这些订单的已收尾款并完整保存(同时修正月度汇总)
+    """
+    for order in models.Order.objects.filter(pk__in=order_ids).select_for_update().order_by('id'):
+        order.received_balance = order.balance_payments.aggregate(total=Sum('amount'))['total'] or 0
+        order.save()
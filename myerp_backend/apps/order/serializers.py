@@ -1,10 +1,11 @@
 from rest_framework import serializers
-from apps.inventory.models import Inventory
 from apps.brand.serializers import BrandSerializer
 from apps.client.serializers import ClientListSerializer
 from apps.staff.serializers import StaffSerializer
 from decimal import Decimal
 
+from apps.inventory import stocktakes
+from apps.inventory.models import Stocktake
 from .models import Order, OrderDetail, BalancePayment, OperationLog, Installer
 
 
@@ -49,6 +50,7 @@ class OrderCreateSerializer(serializers.Serializer):
             raise serializers.ValidationError("订单详情不能为空")
         
         # 验证每个详情项的inventory_id和quantity
+        # 商品是否存在、是否属于所选品牌在下单事务中加锁后统一校验(apps.inventory.stocks)
         for item in data['details']:
             if 'inventory_id' not in item or 'quantity' not in item:
                 raise serializers.ValidationError("订单详情项必须包含inventory_id和quantity")
@@ -58,15 +60,6 @@ class OrderCreateSerializer(serializers.Serializer):
             
             if item['quantity'] <= 0:
                 raise serializers.ValidationError("商品数量必须大于0")
-            
-            # 验证库存商品是否存在
-            try:
-                inventory = Inventory.objects.get(id=item['inventory_id'])
-                # 验证商品是否属于指定品牌
-                if inventory.brand_id != data['brand_id']:
-                    raise serializers.ValidationError(f"商品 {inventory.full_name} 不属于所选品牌")
-            except Inventory.DoesNotExist:
-                raise serializers.ValidationError(f"商品ID {item['inventory_id']} 不存在")
         
         return data
 
@@ -139,22 +132,53 @@ class OperationLogSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at']
 
 
-class OrderListSerializer(serializers.ModelSerializer):
-    """订单列表序列化器"""
-    brand_name = serializers.CharField(source='brand.name', read_only=True)
-    client_name = serializers.CharField(source='client.name', read_only=True)
-    staff_name = serializers.CharField(source='staff.name', read_only=True)
-    delivery_status_display = serializers.CharField(source='get_delivery_status_display', read_only=True)
-    payment_status_display = serializers.CharField(source='get_payment_status_display', read_only=True)
-    
+class StocktakeOperationLogSerializer(serializers.ModelSerializer):
+    """盘点记录以操作日志的格式展示在订单详情中(type 为 stocktake, id 为 "stocktake-<盘点ID>")"""
+    id = serializers.SerializerMethodField()
+    type = serializers.SerializerMethodField()
+    description = serializers.CharField(source='message', read_only=True)
+    created_at = serializers.DateTimeField(source='create_time', read_only=True)
+    operator = serializers.CharField(source='operator_id', read_only=True)
+    operator_name = serializers.CharField(source='operator.name', read_only=True)
+
     class Meta:
-        model = Order
-        fields = [
-            'id', 'order_number', 'brand_name', 'client_name', 'staff_name',
-            'sign_time', 'total_amount', 'down_payment', 'pending_balance',
-            'total_cost', 'gross_profit', 'delivery_status', 'delivery_status_display',
-            'payment_status', 'payment_status_display', 'address'
-        ]
+        model = Stocktake
+        fields = ['id', 'type', 'description', 'created_at', 'operator', 'operator_name']
+
+    def get_id(self, obj):
+        return stocktakes.entry_id(obj)
+
+    def get_type(self, obj):
+        return stocktakes.ENTRY_TYPE
+
+
+class OrderListSerializer(serializers.Serializer):
+    """订单列表序列化器(直接序列化 Order.objects.for_list() 得到的字典, 不实例化模型, 不访问关联对象)"""
+    DELIVERY_STATUS_DISPLAY = dict(Order.DELIVERY_STATUS_CHOICES)
+    PAYMENT_STATUS_DISPLAY = dict(Order.PAYMENT_STATUS_CHOICES)
+
+    id = serializers.IntegerField(read_only=True)
+    order_number = serializers.CharField(read_only=True)
+    brand_name = serializers.CharField(read_only=True)
+    client_name = serializers.CharField(read_only=True)
+    staff_name = serializers.CharField(read_only=True)
+    sign_time = serializers.DateTimeField(read_only=True)
+    total_amount = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    down_payment = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    pending_balance = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    total_cost = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    gross_profit = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    delivery_status = serializers.IntegerField(read_only=True)
+    delivery_status_display = serializers.SerializerMethodField(read_only=True)
+    payment_status = serializers.IntegerField(read_only=True)
+    payment_status_display = serializers.SerializerMethodField(read_only=True)
+    address = serializers.CharField(read_only=True)
+
+    def get_delivery_status_display(self, row):
+        return self.DELIVERY_STATUS_DISPLAY.get(row['delivery_status'])
+
+    def get_payment_status_display(self, row):
+        return self.PAYMENT_STATUS_DISPLAY.get(row['payment_status'])
 
 
 class OrderSerializer(serializers.ModelSerializer):
@@ -166,7 +190,7 @@ class OrderSerializer(serializers.ModelSerializer):
     details = OrderDetailSerializer(many=True, read_only=True)
     delivery_status_display = serializers.CharField(source='get_delivery_status_display', read_only=True)
     payment_status_display = serializers.CharField(source='get_payment_status_display', read_only=True)
-    operation_logs = OperationLogSerializer(many=True, read_only=True)
+    operation_logs = serializers.SerializerMethodField()
     
     class Meta:
         model = Order
@@ -179,12 +203,14 @@ class OrderSerializer(serializers.ModelSerializer):
             'details', 'operation_logs', 'address', 'remark'
         ]
 
-class OrderInstallSerializer(serializers.Serializer):
-    """订单安装序列化器"""
-    installer_id = serializers.IntegerField(required=True)
-    installation_fee = serializers.DecimalField(required=True, max_digits=10, decimal_places=2)
-    transportation_fee = serializers.DecimalField(required=True, max_digits=10, decimal_places=2)
-    
+    def get_operation_logs(self, obj):
+        """操作日志, 签单之后进行过的库存盘点也作为日志展示"""
+        entries = stocktakes.merge_logs(obj.operation_logs.all(), obj.sign_time, time_field='created_at')
+        return stocktakes.serialize_logs(entries, OperationLogSerializer, StocktakeOperationLogSerializer)
+
+class InstallerValidationMixin:
+    """单个/批量出库共用: 校验 installer_id 并替换为安装人员实例"""
+
     def validate_installer_id(self, value):
         """验证安装人员ID是否有效"""
         try:
@@ -192,6 +218,13 @@ class OrderInstallSerializer(serializers.Serializer):
             return installer  # 返回安装人员实例而不是ID
         except Installer.DoesNotExist:
             raise serializers.ValidationError(f"找不到ID为{value}的安装人员")
+
+
+class OrderInstallSerializer(InstallerValidationMixin, serializers.Serializer):
+    """订单安装序列化器"""
+    installer_id = serializers.IntegerField(required=True)
+    installation_fee = serializers.DecimalField(required=True, max_digits=10, decimal_places=2)
+    transportation_fee = serializers.DecimalField(required=True, max_digits=10, decimal_places=2)
     
     def validate(self, attrs):
         """验证费用是否为负数"""
@@ -204,3 +237,16 @@ class OrderInstallSerializer(serializers.Serializer):
         return attrs
 
 
+class OrderInstallItemSerializer(serializers.Serializer):
+    """批量出库中的单个订单"""
+    order_id = serializers.IntegerField(required=True)
+    installation_fee = serializers.DecimalField(required=True, max_digits=10, decimal_places=2, min_value=Decimal('0'))
+    transportation_fee = serializers.DecimalField(required=True, max_digits=10, decimal_places=2, min_value=Decimal('0'))
+
+
+class OrderBatchInstallSerializer(InstallerValidationMixin, serializers.Serializer):
+    """批量出库序列化器: 同一趟送货的多个订单, 安装人员相同, 费用按订单分别填写"""
+    installer_id = serializers.IntegerField(required=True)
+    orders = OrderInstallItemSerializer(many=True, allow_empty=False)
+
+
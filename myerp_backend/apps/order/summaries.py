@@ -0,0 +1,151 @@
+from decimal import Decimal
+
+from django.db.models import F, Q, Sum
+
+from apps.home import caches
+
+from . import models
+
+# 汇总中的金额字段(与 Order 同名)
+AMOUNT_FIELDS = ('total_amount', 'total_cost', 'gross_profit', 'installation_fee', 'transportation_fee',
+                 'pending_balance')
+# 计算贡献需要的订单字段(from_db 传入的是 attname, only() 需要字段名)
+SOURCE_FIELDS = ('sign_time', 'staff_id', 'brand_id', 'delivery_status') + AMOUNT_FIELDS
+ONLY_FIELDS = ('sign_time', 'staff', 'brand', 'delivery_status') + AMOUNT_FIELDS
+
+# 加载订单时字段不全(only/defer), 保存前需要从数据库读取原值
+UNKNOWN = object()
+
+
+def contribution(order):
+    """
+    单个订单对月度汇总的贡献: (key, values), 已作废订单不计入(返回 None)
+
+    key 为 (year, month, staff_id, brand_id)
+    """
+    if order.delivery_status == 3 or order.sign_time is None:
+        return None
+    key = (order.sign_time.year, order.sign_time.month, order.staff_id, order.brand_id)
+    values = {field: Decimal(str(getattr(order, field))) for field in AMOUNT_FIELDS}
+    values['order_count'] = 1
+    values['delivered_count'] = 1 if order.delivery_status == 2 else 0
+    return key, values
+
+
+def snapshot(order, field_names=None):
+    """
+    从数据库加载订单时记录其贡献; 字段被延迟加载时返回 UNKNOWN, 避免触发额外查询
+    """
+    loaded = set(field_names) if field_names is not None else None
+    if loaded is not None and not all(field in loaded for field in SOURCE_FIELDS):
+        return UNKNOWN
+    return contribution(order)
+
+
+def load_snapshot(order_id):
+    """
+    从数据库读取订单当前(保存前)的贡献
+    """
+    order = models.Order.objects.filter(pk=order_id).only(*ONLY_FIELDS).first()
+    return contribution(order) if order else None
+
+
+def adjust(old, new):
+    """
+    用新旧贡献的差值更新月度汇总, 必须在订单保存所在的事务内调用
+    """
+    if old == new:
+        return
+
+    changes = {}
+    for contribution_, sign in ((old, -1), (new, 1)):
+        if contribution_ is None:
+            continue
+        key, values = contribution_
+        merged = changes.setdefault(key, {})
+        for field, value in values.items():
+            merged[field] = merged.get(field, 0) + sign * value
+
+    for (year, month, staff_id, brand_id), values in sorted(changes.items()):
+        if not any(values.values()):
+            continue
+        rows = models.OrderMonthlySummary.objects.filter(year=year, month=month, staff_id=staff_id, brand_id=brand_id)
+        increments = {field: F(field) + value for field, value in values.items()}
+        if not rows.update(**increments):
+            # 当月该员工/品牌的第一张订单: 先插入零值行(并发插入同一行时忽略冲突), 再累加, 不会因唯一约束失败
+            models.OrderMonthlySummary.objects.bulk_create([
+                models.OrderMonthlySummary(year=year, month=month, staff_id=staff_id, brand_id=brand_id)
+            ], ignore_conflicts=True)
+            rows.update(**increments)
+
+
+def compute():
+    """
+    直接从订单表重新计算汇总 {(year, month, staff_id, brand_id): values}
+    """
+    result = {}
+    orders = models.Order.objects.exclude(delivery_status=3).only(*ONLY_FIELDS).order_by('id')
+    for order in orders.iterator(chunk_size=2000):
+        key, values = contribution(order)
+        merged = result.setdefault(key, {})
+        for field, value in values.items():
+            merged[field] = merged.get(field, 0) + value
+    return result
+
+
+def rebuild():
+    """
+    清空并重建全部月度汇总, 返回写入的行数
+    """
+    models.OrderMonthlySummary.objects.all().delete()
+    summaries = [
+        models.OrderMonthlySummary(year=year, month=month, staff_id=staff_id, brand_id=brand_id, **values)
+        for (year, month, staff_id, brand_id), values in compute().items()
+    ]
+    models.OrderMonthlySummary.objects.bulk_create(summaries, batch_size=500)
+    return len(summaries)
+
+
+def verify():
+    """
+    对比汇总表和实时计算结果, 返回不一致的列表 [(key, 汇总值, 实际值)]
+    """
+    fields = AMOUNT_FIELDS + ('order_count', 'delivered_count')
+    expected = compute()
+    actual = {
+        (row['year'], row['month'], row['staff_id'], row['brand_id']): {field: row[field] for field in fields}
+        for row in models.OrderMonthlySummary.objects.values('year', 'month', 'staff_id', 'brand_id', *fields)
+    }
+    drifts = []
+    for key in sorted(set(expected) | set(actual)):
+        stored = actual.get(key, {})
+        real = expected.get(key, {})
+        if any(Decimal(str(stored.get(field, 0))).quantize(Decimal('0.01'))
+               != Decimal(str(real.get(field, 0))).quantize(Decimal('0.01')) for field in fields):
+            drifts.append((key, stored, real))
+    return drifts
+
+
+def compute_header_stats(year, month):
+    """
+    订单列表顶部统计: 当月订单总额、当月毛利润、全部待收尾款, 一条条件聚合查询得出
+    """
+    this_month = Q(year=year, month=month)
+    totals = models.OrderMonthlySummary.objects.aggregate(
+        monthly_total_amount=Sum('total_amount', filter=this_month),
+        monthly_total_profit=Sum('gross_profit', filter=this_month),
+        # 已结清订单的待收尾款为0, 作废订单不在汇总中
+        total_pending_balance=Sum('pending_balance')
+    )
+    return {key: value or 0 for key, value in totals.items()}
+
+
+def header_stats(year, month):
+    """
+    按年月缓存的订单列表顶部统计, 订单保存提交后缓存失效
+    """
+    return caches.get_or_build(
+        caches.ORDER_STATS,
+        lambda: compute_header_stats(year, month),
+        suffix=f'{year}-{month:02d}'
+    )
@@ -1,3 +1,348 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from apps.brand.models import Brand
+from apps.category.models import Category
+from apps.client.models import Client
+from apps.inventory import valuations
+from apps.inventory.models import Inventory, Stocktake
+from apps.staff.models import ERPUser
+
+from . import idempotency, installs, payments, summaries
+from .models import Order, OrderDetail, OperationLog, Installer, BalancePayment, IdempotencyKey
+
+
+class OrderRetrieveQueryCountTest(TestCase):
+    """订单详情接口的查询条数不随明细和日志数量增长"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.boss = ERPUser.objects.create_superuser(account='boss', name='老板', telephone='13000000000',
+                                                    password='111111')
+        cls.brand = Brand.objects.create(name='测试品牌', intro='')
+        cls.category = Category.objects.create(name='沙发')
+        cls.client_obj = Client.objects.create(name='客户', telephone='13100000000', address='地址',
+                                               staff=cls.boss)
+        cls.installer = Installer.objects.create(name='师傅', telephone='13200000000')
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.boss)
+
+    def create_order(self, number, lines, logs):
+        order = Order.objects.create(
+            order_number=number, brand=self.brand, client=self.client_obj, staff=self.boss,
+            total_amount=1000, down_payment=100, total_cost=500, gross_profit=500, address='地址',
+            installer=self.installer
+        )
+        for i in range(lines):
+            inventory = Inventory.objects.create(name=f'{number}-{i}', brand=self.brand, category=self.category,
+                                                 cost=10)
+            OrderDetail.objects.create(order=order, inventory=inventory, quantity=1)
+        for i in range(logs):
+            OperationLog.objects.create(order=order, description=f'日志{i}', operator=self.boss)
+        return order
+
+    def count_queries(self, order):
+        with CaptureQueriesContext(connection) as context:
+            response = self.api.get(f'/api/orders/{order.id}/')
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response.data
+
+    def test_query_count_is_constant(self):
+        small, small_data = self.count_queries(self.create_order('SMALL', lines=1, logs=1))
+        large, large_data = self.count_queries(self.create_order('LARGE', lines=30, logs=50))
+
+        self.assertEqual(len(large_data['details']), 30)
+        self.assertEqual(len(large_data['operation_logs']), 50)
+        self.assertEqual(large_data['details'][0]['inventory_data']['category'], '沙发')
+        self.assertEqual(large_data['operation_logs'][0]['operator_name'], '老板')
+        self.assertEqual(small, large)
+
+    def test_stocktake_entries_have_distinct_ids(self):
+        order = self.create_order('STOCKTAKE', lines=1, logs=2)
+        first = Stocktake.objects.create(operator=self.boss, inventory_count=1)
+        second = Stocktake.objects.create(operator=self.boss, inventory_count=1)
+
+        _, data = self.count_queries(order)
+        logs = data['operation_logs']
+        self.assertEqual(len(logs), 4)
+        self.assertEqual(len({log['id'] for log in logs}), 4)
+        self.assertEqual({log['id'] for log in logs if log.get('type') == 'stocktake'},
+                         {f'stocktake-{first.pk}', f'stocktake-{second.pk}'})
+
+
+class BalancePaymentTest(TestCase):
+    """尾款收取: 结清状态/超收校验/收款记录对账"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.boss = ERPUser.objects.create_superuser(account='boss', name='老板', telephone='13000000000',
+                                                    password='111111')
+        cls.brand = Brand.objects.create(name='测试品牌', intro='')
+        cls.client_obj = Client.objects.create(name='客户', telephone='13100000000', address='地址',
+                                               staff=cls.boss)
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.boss)
+        # 待收尾款 900
+        self.order = Order.objects.create(
+            order_number='PAY001', brand=self.brand, client=self.client_obj, staff=self.boss,
+            total_amount=1000, down_payment=100, total_cost=500, gross_profit=500, address='地址'
+        )
+
+    def pay(self, amount):
+        return self.api.post('/api/balance-payments/', {'order': self.order.id, 'amount': amount}, format='json')
+
+    def assertOrder(self, received, pending, payment_status):
+        order = Order.objects.get(pk=self.order.pk)
+        self.assertEqual(order.received_balance, Decimal(received))
+        self.assertEqual(order.pending_balance, Decimal(pending))
+        self.assertEqual(order.payment_status, payment_status)
+
+    def test_exact_payoff_settles_order(self):
+        self.assertEqual(self.pay('400').status_code, 201)
+        self.assertOrder('400', '500', 1)
+
+        self.assertEqual(self.pay('500').status_code, 201)
+        self.assertOrder('900', '0', 2)
+        self.assertEqual(payments.drifts(), [])
+        self.assertEqual(summaries.verify(), [])
+
+    def test_overpayment_is_rejected(self):
+        self.assertEqual(self.pay('901').status_code, 400)
+
+        # 绕过序列化器校验(并发收款时校验读到的待收尾款已过期), 由 UPDATE 的条件拒绝
+        with self.assertRaises(payments.PaymentError):
+            BalancePayment.objects.create(order=self.order, amount=Decimal('901'), operator=self.boss)
+
+        self.assertOrder('0', '900', 1)
+        self.assertFalse(BalancePayment.objects.exists())
+        self.assertEqual(summaries.verify(), [])
+
+    def test_drifts_are_detected_and_reconciled(self):
+        self.assertEqual(self.pay('300').status_code, 201)
+        # 注入漂移: 已收尾款和结清状态与收款记录不一致(待收尾款与月度汇总一致)
+        Order.objects.filter(pk=self.order.pk).update(received_balance=0, payment_status=2)
+
+        self.assertEqual([row[0] for row in payments.drifts()], [self.order.pk])
+
+        payments.reconcile([self.order.pk])
+        self.assertEqual(payments.drifts(), [])
+        self.assertOrder('300', '600', 1)
+        self.assertEqual(summaries.verify(), [])
+
+
+class OrderInstallTest(TestCase):
+    """下单占用库存(stocks.reserve_stock/apply_deltas)与出库扣减库存"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.boss = ERPUser.objects.create_superuser(account='boss', name='老板', telephone='13000000000',
+                                                    password='111111')
+        cls.brand = Brand.objects.create(name='测试品牌', intro='')
+        cls.category = Category.objects.create(name='沙发')
+        cls.client_obj = Client.objects.create(name='客户', telephone='13100000000', address='地址',
+                                               staff=cls.boss)
+        cls.installer = Installer.objects.create(name='师傅', telephone='13200000000')
+        cls.sofa = Inventory.objects.create(name='沙发A', brand=cls.brand, category=cls.category, cost=100,
+                                            in_stock=5)
+        cls.chair = Inventory.objects.create(name='椅子B', brand=cls.brand, category=cls.category, cost=50,
+                                             in_stock=1)
+        valuations.adjust(valuations.contribution(inventory) for inventory in (cls.sofa, cls.chair))
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.boss)
+
+    def create_order(self, number, details):
+        response = self.api.post('/api/order/create/', {
+            'order_number': number, 'brand_id': self.brand.id, 'client_id': self.client_obj.uid,
+            'staff_id': self.boss.uid, 'total_amount': '1000', 'down_payment': '100', 'total_cost': '0',
+            'gross_profit': '1000', 'address': '地址',
+            'details': [{'inventory_id': inventory.id, 'quantity': quantity} for inventory, quantity in details],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return Order.objects.get(pk=response.data['order_id'])
+
+    def install(self, order):
+        return self.api.put(f'/api/order-install/{order.id}/', {
+            'installer_id': self.installer.id, 'installation_fee': '50', 'transportation_fee': '20'
+        }, format='json')
+
+    def assertStock(self, inventory, in_stock, been_order, sold):
+        inventory.refresh_from_db()
+        self.assertEqual((inventory.in_stock, inventory.been_order, inventory.sold), (in_stock, been_order, sold))
+
+    def test_install_decrements_stock(self):
+        # 同一商品分两行下单, 合并后一次占用
+        order = self.create_order('INS001', [(self.sofa, 1), (self.chair, 1), (self.sofa, 1)])
+        self.assertStock(self.sofa, 5, 2, 0)
+        self.assertStock(self.chair, 1, 1, 0)
+
+        response = self.install(order)
+        self.assertEqual(response.status_code, 200)
+        self.assertStock(self.sofa, 3, 0, 2)
+        self.assertStock(self.chair, 0, 0, 1)
+        order.refresh_from_db()
+        self.assertEqual(order.delivery_status, 2)
+        self.assertEqual(order.gross_profit, 1000 - 50 - 20)
+        self.assertEqual(valuations.verify(), [])
+        self.assertEqual(summaries.verify(), [])
+
+    def test_insufficient_stock_rolls_back(self):
+        order = self.create_order('INS002', [(self.sofa, 1), (self.chair, 2)])
+
+        response = self.install(order)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('库存不足', response.data['detail'])
+        order.refresh_from_db()
+        self.assertEqual(order.delivery_status, 1)
+        self.assertStock(self.sofa, 5, 1, 0)
+        self.assertStock(self.chair, 1, 2, 0)
+        self.assertEqual(valuations.verify(), [])
+
+    def test_double_install_reports_installed(self):
+        order = self.create_order('INS003', [(self.chair, 1)])
+        self.assertEqual(self.install(order).status_code, 200)
+        self.assertStock(self.chair, 0, 0, 1)
+
+        # 并发的重复出库通过了视图的预检查: 在订单行锁内复核状态, 先于库存校验
+        with self.assertRaisesMessage(installs.InstallError, '已出库'):
+            installs.install_orders([(order.id, 0, 0)], self.installer, self.boss)
+
+        response = self.api.post('/api/order-install/batch/', {
+            'installer_id': self.installer.id,
+            'orders': [{'order_id': order.id, 'installation_fee': '0', 'transportation_fee': '0'}],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('已出库', response.data['detail'])
+        self.assertStock(self.chair, 0, 0, 1)
+
+    def test_unknown_installer_rejected(self):
+        order = self.create_order('INS004', [(self.chair, 1)])
+        fees = {'installation_fee': '0', 'transportation_fee': '0'}
+        responses = [
+            self.api.put(f'/api/order-install/{order.id}/', {'installer_id': 0, **fees}, format='json'),
+            self.api.post('/api/order-install/batch/', {
+                'installer_id': 0, 'orders': [{'order_id': order.id, **fees}]
+            }, format='json'),
+        ]
+        for response in responses:
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('找不到ID为0的安装人员', str(response.data))
+        self.assertStock(self.chair, 1, 1, 0)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                       'LOCATION': 'order-idempotency-tests'}})
+class IdempotencyKeyTest(TestCase):
+    """带 Idempotency-Key 的收款/下单: 重放、内容不一致、并发重复、超时接管"""
+
+    scope = 'order.balance_payment'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.boss = ERPUser.objects.create_superuser(account='boss', name='老板', telephone='13000000000',
+                                                    password='111111')
+        cls.brand = Brand.objects.create(name='测试品牌', intro='')
+        cls.client_obj = Client.objects.create(name='客户', telephone='13100000000', address='地址',
+                                               staff=cls.boss)
+        cls.order = Order.objects.create(
+            order_number='IDEM001', brand=cls.brand, client=cls.client_obj, staff=cls.boss,
+            total_amount=1000, down_payment=100, total_cost=500, gross_profit=500, address='地址'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.api = APIClient()
+        self.api.force_authenticate(self.boss)
+
+    def pay(self, amount, key='key-1'):
+        return self.api.post('/api/balance-payments/', {'order': self.order.id, 'amount': amount}, format='json',
+                             HTTP_IDEMPOTENCY_KEY=key)
+
+    def pending(self, key, age):
+        return IdempotencyKey.objects.create(user=self.boss, scope=self.scope, key=key, created_at=timezone.now() - age,
+                                             fingerprint=idempotency.fingerprint({'order': self.order.id,
+                                                                                  'amount': '100'}))
+
+    def test_replay(self):
+        first = self.pay('100')
+        self.assertEqual(first.status_code, 201)
+        self.assertNotIn(idempotency.REPLAYED_HEADER, first)
+
+        second = self.pay('100')
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second[idempotency.REPLAYED_HEADER], 'true')
+        self.assertEqual(second.data['id'], first.data['id'])
+
+        # 缓存失效后由数据库中保存的响应重放
+        cache.clear()
+        third = self.pay('100')
+        self.assertEqual(third[idempotency.REPLAYED_HEADER], 'true')
+        self.assertEqual(third.data['id'], first.data['id'])
+
+        self.assertEqual(BalancePayment.objects.count(), 1)
+        self.assertEqual(Order.objects.get(pk=self.order.pk).received_balance, 100)
+
+    def test_fingerprint_mismatch(self):
+        self.assertEqual(self.pay('100').status_code, 201)
+
+        response = self.pay('200')
+        self.assertEqual(response.status_code, 422)
+        cache.clear()
+        self.assertEqual(self.pay('200').status_code, 422)
+        self.assertEqual(BalancePayment.objects.count(), 1)
+
+    def test_concurrent_duplicate(self):
+        self.pending('key-1', timedelta(0))
+
+        response = self.pay('100')
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(BalancePayment.objects.exists())
+
+    def test_stale_pending_is_taken_over(self):
+        self.pending('key-1', timedelta(seconds=idempotency.PENDING_TIMEOUT + 1))
+
+        response = self.pay('100')
+        self.assertEqual(response.status_code, 201)
+        record = IdempotencyKey.objects.get(key='key-1')
+        self.assertEqual(record.status_code, 201)
+        self.assertEqual(record.response['id'], response.data['id'])
+        self.assertEqual(BalancePayment.objects.count(), 1)
+
+    def test_failed_response_is_not_stored(self):
+        self.assertEqual(self.pay('901').status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        self.assertEqual(self.pay('900').status_code, 201)
+        self.assertEqual(Order.objects.get(pk=self.order.pk).payment_status, 2)
+
+    def test_response_is_saved_with_business_write(self):
+        save = IdempotencyKey.save
+
+        def fail_on_response(record, *args, **kwargs):
+            if kwargs.get('update_fields'):
+                raise DatabaseError('connection lost')
+            return save(record, *args, **kwargs)
+
+        # 保存响应失败时业务写入一起回滚, 占位删除后可以用同一个键重新提交
+        with mock.patch.object(IdempotencyKey, 'save', fail_on_response):
+            with self.assertRaises(DatabaseError):
+                self.pay('100')
+        self.assertFalse(BalancePayment.objects.exists())
+        self.assertEqual(Order.objects.get(pk=self.order.pk).received_balance, 0)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        self.assertEqual(self.pay('100').status_code, 201)
+        self.assertEqual(BalancePayment.objects.count(), 1)
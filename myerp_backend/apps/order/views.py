@@ -2,17 +2,25 @@ from django.shortcuts import render
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, viewsets, filters
+from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from django.db import transaction
-from django.db.models import F, Q, Sum, Count
+from django.db.models import Q, Sum, Count
 from django.db.models.functions import TruncMonth
 from decimal import Decimal
 import datetime
 from apps.staff.permissions import IsBoss,IsManager
 from . import serializers
 from . import paginations
+from . import summaries
+from . import payments
+from . import installs
+from . import idempotency
 from .models import Order, OrderDetail, OperationLog, BalancePayment, Installer
-from apps.inventory.models import Inventory
+from apps.inventory.models import Stocktake
+from apps.inventory.stocks import reserve_stock, merge_quantities, lock_inventories, apply_deltas, StockError
+from apps.search import tokens
+from apps.common import retries
 
 class CreateOrderView(APIView):
     """
@@ -20,6 +28,7 @@ class CreateOrderView(APIView):
     """
     permission_classes = [IsAuthenticated,IsBoss|IsManager]
 
+    @idempotency.idempotent('order.create')
     def post(self, request):
         # 获取序列化器实例
         serializer = serializers.OrderCreateSerializer(data=request.data)
@@ -28,105 +37,120 @@ class CreateOrderView(APIView):
 
         # 开始修改数据
         try:
-            # 开启数据库原子事务
-            with transaction.atomic():
-                validated_data = serializer.validated_data
-                details_data = validated_data['details']  # 不需要pop，直接获取即可
-                
-                # 计算待收尾款
-                pending_balance = validated_data['total_amount'] - validated_data['down_payment']
-                
-                # 创建订单
-                order = Order.objects.create(
-                    order_number=validated_data['order_number'],
-                    brand_id=validated_data['brand_id'],
-                    client_id=validated_data['client_id'],
-                    staff_id=validated_data['staff_id'],
-                    total_amount=validated_data['total_amount'],
-                    down_payment=validated_data['down_payment'],
-                    pending_balance=pending_balance,
-                    total_cost=validated_data['total_cost'],
-                    gross_profit=validated_data['gross_profit'],
-                    address=validated_data['address'],
-                    remark=validated_data['remark'],
-                    # 默认值处理
-                    received_balance=0,
-                    delivery_status=1,  # 新订单
-                    payment_status=2 if pending_balance == 0 else 1,  # 如果待收尾款为0，则设置为已结清
-                    installation_fee=0,
-                    transportation_fee=0
-                )
-                
-                # 验证成本总价并处理订单明细
-                calculated_cost = Decimal('0.00')
-                order_details = []
-                
-                # 批量处理订单详情
-                for item in details_data:
-                    # 使用select_for_update锁定库存记录，防止并发问题
-                    inventory = Inventory.objects.select_for_update().get(id=item['inventory_id'])
-                    quantity = item['quantity']
-                    
-                    # 计算成本 - 确保使用Decimal类型计算
-                    item_cost = inventory.cost * Decimal(str(quantity))
-                    calculated_cost += item_cost
-                    
-                    # 原子更新已订购数量
-                    inventory.been_order = F('been_order') + quantity
-                    inventory.save(update_fields=['been_order'])
-                    
-                    # 构建订单明细对象
-                    order_details.append(OrderDetail(
-                        order=order,
-                        inventory=inventory,
-                        quantity=quantity
-                    ))
-                
-                # 批量创建订单明细
-                OrderDetail.objects.bulk_create(order_details)
-                
-                # 操作日志
-                now = datetime.datetime.now()
-                timestamp = now.strftime('%Y-%m-%d %H:%M:%S')
-                
-                # 创建基本操作日志
-                log_description = f"于 {timestamp} 创建订单, 订单总额: {order.total_amount}, 成本总价: {order.total_cost}, 初算毛利(未扣安装费和运输费): {order.gross_profit}"
-                
-                OperationLog.objects.create(
-                    order=order,
-                    description=log_description,
-                    operator=request.user
-                )
-
-                # 校对成本总价，如有任何差异则添加警告日志
-                user_provided_cost = validated_data['total_cost']
-                if calculated_cost != user_provided_cost:
-                    cost_difference = abs(calculated_cost - user_provided_cost)
-                    warning_log = f"警告! 创建订单时, 您填写的成本总价({user_provided_cost})与系统自动计算的成本总价({calculated_cost})不一致! 差额: {cost_difference}"
-                    
-                    # 创建额外的警告日志
-                    OperationLog.objects.create(
-                        order=order,
-                        description=warning_log,
-                        operator=request.user
-                    )
-                
-                # 校对毛利润, 当提交数据的毛利润为负数时, 写入警告日志
-                if order.gross_profit < 0:
-                    profit_warning_log = f"警告! 创建订单时, 订单的毛利润为负数({order.gross_profit})! 请确认该订单是否为亏本处理?"
-                    
-                    # 创建毛利润警告日志
-                    OperationLog.objects.create(
-                        order=order,
-                        description=profit_warning_log,
-                        operator=request.user
-                    )
-                
-                # 返回订单ID
+            order = self.create_order(serializer.validated_data, request.user)
             return Response({'order_id': order.id, 'message': "订单创建成功!"}, status=status.HTTP_201_CREATED)
         except Exception as e:
+            retries.raise_if_retryable(e)
             return Response({'detail': f'订单创建失败! {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
-        
+
+    @retries.atomic
+    def create_order(self, validated_data, operator):
+        """
+        在一个事务中占用库存并创建订单/明细/日志, 遇到死锁或锁等待超时时整体重新执行
+        """
+        details_data = validated_data['details']  # 不需要pop，直接获取即可
+
+        # 按ID顺序一次性锁定所有商品, 校验品牌并累加已订购数量
+        inventories, quantities, shortages = reserve_stock(details_data, brand_id=validated_data['brand_id'])
+
+        # 计算待收尾款
+        pending_balance = validated_data['total_amount'] - validated_data['down_payment']
+
+        # 创建订单
+        order = Order.objects.create(
+            order_number=validated_data['order_number'],
+            brand_id=validated_data['brand_id'],
+            client_id=validated_data['client_id'],
+            staff_id=validated_data['staff_id'],
+            total_amount=validated_data['total_amount'],
+            down_payment=validated_data['down_payment'],
+            pending_balance=pending_balance,
+            total_cost=validated_data['total_cost'],
+            gross_profit=validated_data['gross_profit'],
+            address=validated_data['address'],
+            remark=validated_data['remark'],
+            # 默认值处理
+            received_balance=0,
+            delivery_status=1,  # 新订单
+            payment_status=2 if pending_balance == 0 else 1,  # 如果待收尾款为0，则设置为已结清
+            installation_fee=0,
+            transportation_fee=0
+        )
+
+        # 验证成本总价并处理订单明细
+        calculated_cost = Decimal('0.00')
+        order_details = []
+
+        # 批量处理订单详情(库存已在内存中, 不再逐行查询)
+        for item in details_data:
+            inventory = inventories[item['inventory_id']]
+            quantity = item['quantity']
+
+            # 计算成本 - 确保使用Decimal类型计算
+            item_cost = inventory.cost * Decimal(str(quantity))
+            calculated_cost += item_cost
+
+            # 构建订单明细对象
+            order_details.append(OrderDetail(
+                order=order,
+                inventory=inventory,
+                quantity=quantity
+            ))
+
+        # 批量创建订单明细
+        OrderDetail.objects.bulk_create(order_details)
+
+        # 操作日志
+        now = datetime.datetime.now()
+        timestamp = now.strftime('%Y-%m-%d %H:%M:%S')
+
+        # 创建基本操作日志
+        log_description = f"于 {timestamp} 创建订单, 订单总额: {order.total_amount}, 成本总价: {order.total_cost}, 初算毛利(未扣安装费和运输费): {order.gross_profit}"
+
+        OperationLog.objects.create(
+            order=order,
+            description=log_description,
+            operator=operator
+        )
+
+        # 校对成本总价，如有任何差异则添加警告日志
+        user_provided_cost = validated_data['total_cost']
+        if calculated_cost != user_provided_cost:
+            cost_difference = abs(calculated_cost - user_provided_cost)
+            warning_log = f"警告! 创建订单时, 您填写的成本总价({user_provided_cost})与系统自动计算的成本总价({calculated_cost})不一致! 差额: {cost_difference}"
+
+            # 创建额外的警告日志
+            OperationLog.objects.create(
+                order=order,
+                description=warning_log,
+                operator=operator
+            )
+
+        # 可售数量不足时允许下单(先卖后采), 但写入警告日志
+        if shortages:
+            shortage_log = "警告! 创建订单时, 以下商品可售数量不足: " + ", ".join(
+                f"{item['name']}(需要{item['required']}, 可售{item['available']})" for item in shortages
+            )
+            OperationLog.objects.create(
+                order=order,
+                description=shortage_log,
+                operator=operator
+            )
+
+        # 校对毛利润, 当提交数据的毛利润为负数时, 写入警告日志
+        if order.gross_profit < 0:
+            profit_warning_log = f"警告! 创建订单时, 订单的毛利润为负数({order.gross_profit})! 请确认该订单是否为亏本处理?"
+
+            # 创建毛利润警告日志
+            OperationLog.objects.create(
+                order=order,
+                description=profit_warning_log,
+                operator=operator
+            )
+
+        return order
+
+
 class OrderViewSet(viewsets.ReadOnlyModelViewSet):
     """
     订单视图集
@@ -165,7 +189,7 @@ class OrderViewSet(viewsets.ReadOnlyModelViewSet):
         
         # 应用过滤条件（只有当值不是默认值时）
         if order_number and order_number != '':
-            queryset = queryset.filter(order_number__icontains=order_number)
+            queryset = tokens.filter_queryset(queryset, 'order.order_number', order_number, lookup='icontains')
         if brand_id and brand_id != '0':
             queryset = queryset.filter(brand_id=brand_id)
         if client_uid and client_uid != '':
@@ -186,45 +210,26 @@ class OrderViewSet(viewsets.ReadOnlyModelViewSet):
     def retrieve(self, request, *args, **kwargs):
         """重写retrieve方法，允许获取已作废的订单详情"""
         try:
-            # 直接从数据库获取订单，不经过get_queryset过滤
-            instance = Order.objects.get(pk=kwargs.get('pk'))
+            # 直接从数据库获取订单，不经过get_queryset过滤; 关联数据一次性加载, 避免N+1查询
+            instance = Order.objects.for_detail().get(pk=kwargs.get('pk'))
             serializer = self.get_serializer(instance)
             return Response(serializer.data)
         except Order.DoesNotExist:
             return Response({'detail': '订单不存在'}, status=status.HTTP_404_NOT_FOUND)
     
     def list(self, request, *args, **kwargs):
-        """重写list方法，增加当月总销量、当月总利润和全部待收尾款的统计"""
-        # 获取过滤后的查询集
-        queryset = self.filter_queryset(self.get_queryset())
-        
-        # 获取当前年月
-        now = datetime.datetime.now()
-        current_year = now.year
-        current_month = now.month
+        """
+        重写list方法，增加当月总销量、当月总利润和全部待收尾款的统计(?stats=0 时不返回统计)
+        带 ?cursor= 参数时使用按(签单时间, ID)的游标分页, 深度翻页不再依赖 OFFSET
+        """
+        # 获取过滤后的查询集(只取列表需要的列)
+        queryset = self.filter_queryset(self.get_queryset()).for_list()
         
-        # 计算当月订单的总销量和总利润
-        current_month_orders = Order.objects.filter(
-            sign_time__year=current_year,
-            sign_time__month=current_month
-        ).exclude(delivery_status=3)  # 排除已作废订单
-        
-        monthly_total_amount = current_month_orders.aggregate(
-            total=Sum('total_amount')
-        )['total'] or 0
-        
-        monthly_total_profit = current_month_orders.aggregate(
-            total=Sum('gross_profit')
-        )['total'] or 0
-        
-        # 计算全部待收尾款
-        total_pending_balance = Order.objects.filter(
-            payment_status=1  # 未结清
-        ).exclude(
-            delivery_status=3  # 排除已作废订单
-        ).aggregate(
-            total=Sum('pending_balance')
-        )['total'] or 0
+        # 统计数据: 一条查询得出并按年月缓存; 无限滚动加载后续页时可以跳过
+        stats = {}
+        if request.query_params.get('stats') != '0':
+            now = datetime.datetime.now()
+            stats = summaries.header_stats(now.year, now.month)
         
         # 分页
         page = self.paginate_queryset(queryset)
@@ -233,18 +238,14 @@ class OrderViewSet(viewsets.ReadOnlyModelViewSet):
             response_data = self.get_paginated_response(serializer.data)
             
             # 添加统计数据到响应中
-            response_data.data['monthly_total_amount'] = monthly_total_amount
-            response_data.data['monthly_total_profit'] = monthly_total_profit
-            response_data.data['total_pending_balance'] = total_pending_balance
+            response_data.data.update(stats)
             
             return response_data
         
         serializer = self.get_serializer(queryset, many=True)
         response_data = {
             'results': serializer.data,
-            'monthly_total_amount': monthly_total_amount,
-            'monthly_total_profit': monthly_total_profit,
-            'total_pending_balance': total_pending_balance
+            **stats
         }
         
         return Response(response_data)
@@ -283,6 +284,17 @@ class OperationLogViewSet(viewsets.ReadOnlyModelViewSet):
             queryset = queryset.filter(order_id=order_id)
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        """按订单查看日志时, 附带签单之后进行过的库存盘点提示"""
+        response = super().list(request, *args, **kwargs)
+        order_id = request.query_params.get('order_id')
+        if order_id and isinstance(response.data, dict):
+            sign_time = Order.objects.filter(pk=order_id).values_list('sign_time', flat=True).first()
+            response.data['stocktakes'] = [
+                stocktake.message() for stocktake in Stocktake.objects.after(sign_time)
+            ] if sign_time else []
+        return response
+
 class BalancePaymentViewSet(viewsets.mixins.CreateModelMixin, viewsets.GenericViewSet):
     """
     尾款支付视图集
@@ -299,62 +311,43 @@ class BalancePaymentViewSet(viewsets.mixins.CreateModelMixin, viewsets.GenericVi
             queryset = queryset.filter(order_id=order_id)
         return queryset
     
+    @idempotency.idempotent('order.balance_payment')
     def create(self, request, *args, **kwargs):
         """重写创建方法，添加验证逻辑"""
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
-        # 获取订单和支付金额
-        order_id = serializer.validated_data.get('order').id
-        payment_amount = serializer.validated_data.get('amount')
-        
         # 验证支付金额不能为0
+        payment_amount = serializer.validated_data.get('amount')
         if payment_amount <= 0:
             return Response(
                 {'detail': '支付金额必须大于0'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # 获取订单信息，验证支付金额不能超过待收尾款
+        # 支付金额不能超过待收尾款: 在更新订单的同一条语句中校验, 并发收款也不会超收
         try:
-            order = Order.objects.get(id=order_id)
-            pending_balance = order.pending_balance
-            
-            if payment_amount > pending_balance:
-                return Response(
-                    {'detail': f'支付金额(¥{payment_amount})不能超过待收尾款(¥{pending_balance})'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-                
-        except Order.DoesNotExist:
-            return Response(
-                {'detail': '订单不存在'},
-                status=status.HTTP_404_NOT_FOUND
-            )
-        
-        # 执行原有的创建逻辑
-        self.perform_create(serializer)
+            self.perform_create(serializer)
+        except payments.PaymentError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
     
     def perform_create(self, serializer):
-        """创建尾款支付记录"""
+        """创建尾款支付记录(BalancePayment.save 增量更新订单的已收尾款和结清状态)"""
         with transaction.atomic():
             # 保存支付记录
             payment = serializer.save(operator=self.request.user)
             
             # 创建操作日志
-            order = payment.order
             now = datetime.datetime.now()
             timestamp = now.strftime('%Y-%m-%d %H:%M:%S')
             
             OperationLog.objects.create(
-                order=order,
+                order_id=payment.order_id,
                 description=f"于 {timestamp} 收到尾款 ¥{payment.amount}",
                 operator=self.request.user
             )
-            
-            # 更新订单状态 (Order模型的save方法会自动更新payment_status)
 
 class OrderInstallViewSet(viewsets.mixins.UpdateModelMixin, viewsets.GenericViewSet):
     """
@@ -384,86 +377,62 @@ class OrderInstallViewSet(viewsets.mixins.UpdateModelMixin, viewsets.GenericView
         
         validated_data = serializer.validated_data
         installer = validated_data.get('installer_id')  # 现在这是一个Installer实例
-        installation_fee = validated_data.get('installation_fee')
-        transportation_fee = validated_data.get('transportation_fee')
         
-        # 2. 开启数据库事务
+        # 2. 开启数据库事务: 锁定订单复核状态, 再锁定库存并校验在库数量, 一条语句完成扣减, 更新订单并记录日志
         try:
-            with transaction.atomic():
-                # 2.1 遍历订单详情
-                order_details = OrderDetail.objects.filter(order=order).select_related('inventory')
-                
-                # 先验证所有商品库存是否足够
-                insufficient_items = []
-                for detail in order_details:
-                    inventory = detail.inventory
-                    quantity = detail.quantity
-                    
-                    # 检查库存是否足够
-                    if inventory.in_stock < quantity:
-                        insufficient_items.append({
-                            'name': inventory.full_name() if hasattr(inventory, 'full_name') else inventory.name,
-                            'required': quantity,
-                            'available': inventory.in_stock
-                        })
-                
-                # 如果有库存不足的商品，返回错误
-                if insufficient_items:
-                    error_message = "以下商品库存不足：\n"
-                    for item in insufficient_items:
-                        error_message += f"- {item['name']}：需要 {item['required']} 件，库存仅 {item['available']} 件\n"
-                    return Response({'detail': error_message}, status=status.HTTP_400_BAD_REQUEST)
-                
-                # 库存充足，执行出库操作
-                for detail in order_details:
-                    inventory = detail.inventory
-                    quantity = detail.quantity
-                    
-                    # 2.1.2 同步减少been_order和in_stock数量
-                    inventory.been_order = F('been_order') - quantity
-                    inventory.in_stock = F('in_stock') - quantity
-                    inventory.sold = F('sold') + quantity
-                    inventory.save(update_fields=['been_order', 'in_stock', 'sold'])
-                
-                # 2.2 更新订单状态和相关信息
-                now = datetime.datetime.now()
-                order.delivery_status = 2  # 已送货
-                order.installer = installer  # 直接使用installer实例
-                order.installation_fee = installation_fee
-                order.transportation_fee = transportation_fee
-                order.installation_time = now
-                
-                # 重新计算毛利润 = 订单总额 - 成本总价 - 安装费用 - 运输费用
-                order.gross_profit = order.total_amount - order.total_cost - installation_fee - transportation_fee
-                order.save()
-                
-                # 2.3 记录操作日志
-                timestamp = now.strftime('%Y-%m-%d %H:%M:%S')
-                log_description = (
-                    f"于 {timestamp} 进行一键出库操作。"
-                    f"安装人员: {installer.name}, "
-                    f"安装费用: ¥{installation_fee}, "
-                    f"运输费用: ¥{transportation_fee}, "
-                    f"最终毛利(扣除安装费和运输费): ¥{order.gross_profit}"
-                )
-                
-                OperationLog.objects.create(
-                    order=order,
-                    description=log_description,
-                    operator=request.user
-                )
-                
-                # 3. 返回响应
-                return Response({
-                    'detail': '订单出库成功',
+            order, = installs.install_orders(
+                [(order.id, validated_data.get('installation_fee'), validated_data.get('transportation_fee'))],
+                installer, request.user
+            )
+        except (StockError, installs.InstallError) as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            retries.raise_if_retryable(e)
+            return Response({'detail': f'订单出库失败: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # 3. 返回响应
+        return Response({
+            'detail': '订单出库成功',
+            'order_id': order.id,
+            'delivery_status': order.delivery_status,
+            'gross_profit': float(order.gross_profit),
+            'installation_time': order.installation_time
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """
+        批量出库: 同一趟送货的多个订单在一个事务中出库, 任何一个订单失败则全部不出库
+        """
+        serializer = serializers.OrderBatchInstallSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({'detail': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        
+        validated_data = serializer.validated_data
+        items = [
+            (item['order_id'], item['installation_fee'], item['transportation_fee'])
+            for item in validated_data['orders']
+        ]
+        try:
+            orders = installs.install_orders(items, validated_data['installer_id'], request.user)
+        except (StockError, installs.InstallError) as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            retries.raise_if_retryable(e)
+            return Response({'detail': f'订单出库失败: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'detail': f'{len(orders)}个订单出库成功',
+            'orders': [
+                {
                     'order_id': order.id,
                     'delivery_status': order.delivery_status,
                     'gross_profit': float(order.gross_profit),
                     'installation_time': order.installation_time
-                }, status=status.HTTP_200_OK)
-                
-        except Exception as e:
-            return Response({'detail': f'订单出库失败: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+                }
+                for order in orders
+            ]
+        }, status=status.HTTP_200_OK)
 
 class InstallerViewSet(viewsets.mixins.CreateModelMixin,viewsets.mixins.UpdateModelMixin, viewsets.mixins.ListModelMixin, viewsets.mixins.RetrieveModelMixin, viewsets.GenericViewSet):
     """
@@ -518,79 +487,73 @@ class AbandonOrderViewSet(APIView):
         if not order_id:
             return Response({'detail': '请提供订单ID'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # 1, 根据编号获取订单
+        # 1, 找到订单详情(明细创建后不再修改, 可以在加锁前读取)
+        details = list(OrderDetail.objects.filter(order_id=order_id).values('inventory_id', 'quantity'))
+
+        # 2, 开启数据库原子事务
         try:
-            order = Order.objects.get(id=order_id)
-        except Order.DoesNotExist:
+            return self.abandon(order_id, details, request.user)
+        except Exception as e:
+            retries.raise_if_retryable(e)
+            return Response({'detail': f'订单作废失败: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    @retries.atomic
+    def abandon(self, order_id, details, operator):
+        """
+        在一个事务中释放库存占用/作废订单/清零尾款, 遇到死锁或锁等待超时时整体重新执行
+        """
+        # 3, 先锁定订单再按ID顺序锁定库存, 与出库的加锁顺序一致
+        # 在订单行锁内判断订单状态, 只有"新订单"才能作废; 并发的出库/作废会在这里等待后复核
+        order = retries.for_update(Order.objects).filter(id=order_id).first()
+        if order is None:
             return Response({'detail': '订单不存在'}, status=status.HTTP_404_NOT_FOUND)
-        
-        # 2, 判断订单状态是否为"新订单", 如果不是"新订单", 则不能作废
         if order.delivery_status != 1:  # 1表示新订单
             return Response({'detail': '只有新订单状态的订单才能作废'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # 3, 找到订单详情
-        order_details = OrderDetail.objects.filter(order=order).select_related('inventory')
-        
-        # 4, 开启数据库原子事务
-        try:
-            with transaction.atomic():
-                # 提前收集所有需要更新的库存ID，减少锁定次数
-                inventory_ids = [detail.inventory_id for detail in order_details]
-                
-                # 一次性锁定所有相关的库存记录
-                inventories = {
-                    inv.id: inv for inv in Inventory.objects.select_for_update().filter(id__in=inventory_ids)
-                }
-                
-                # 批量更新库存的been_order字段
-                for detail in order_details:
-                    inventory = inventories.get(detail.inventory_id)
-                    if inventory:
-                        inventory.been_order -= detail.quantity
-                
-                # 批量保存更新后的库存
-                if inventories:
-                    Inventory.objects.bulk_update(inventories.values(), ['been_order'])
-                
-                # 记录操作日志
-                now = datetime.datetime.now()
-                timestamp = now.strftime('%Y-%m-%d %H:%M:%S')
-                
-                OperationLog.objects.create(
-                    order=order,
-                    description=f"于 {timestamp} 作废订单: {order.order_number}",
-                    operator=request.user
-                )
-                
-                # 先将订单状态更新为"已作废"
-                order.delivery_status = 3  # 3表示已作废
-                order.payment_status = 3  # 3表示已作废
-                order.save()
-                
-                # 尾款清零处理
-                pending_balance = order.pending_balance
-                if pending_balance > 0:
-                    # 创建一条尾款收取数据，将尾款清零
-                    BalancePayment.objects.create(
-                        order=order,
-                        amount=pending_balance,
-                        operator=request.user
-                    )
-                    
-                    # 记录尾款清零日志
-                    OperationLog.objects.create(
-                        order=order,
-                        description=f"于 {timestamp} 因订单作废，系统自动清零尾款: ￥{pending_balance}",
-                        operator=request.user
-                    )
-                    
-                    # 再次确保订单状态为作废
-                    order.refresh_from_db()
-                    order.payment_status = 3  # 确保付款状态为已作废
-                    order.save()
-                
-        except Exception as e:
-            return Response({'detail': f'订单作废失败: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        
+
+        quantities = merge_quantities(details)
+        inventories = lock_inventories(quantities.keys())
+
+        # 4, 一条语句释放所有商品的占用数量
+        apply_deltas(inventories, {
+            inventory_id: {'been_order': -quantity} for inventory_id, quantity in quantities.items()
+        })
+
+        # 记录操作日志
+        now = datetime.datetime.now()
+        timestamp = now.strftime('%Y-%m-%d %H:%M:%S')
+
+        OperationLog.objects.create(
+            order=order,
+            description=f"于 {timestamp} 作废订单: {order.order_number}",
+            operator=operator
+        )
+
+        # 先将订单状态更新为"已作废"
+        order.delivery_status = 3  # 3表示已作废
+        order.payment_status = 3  # 3表示已作废
+        order.save()
+
+        # 尾款清零处理
+        pending_balance = order.pending_balance
+        if pending_balance > 0:
+            # 创建一条尾款收取数据，将尾款清零
+            BalancePayment.objects.create(
+                order=order,
+                amount=pending_balance,
+                operator=operator
+            )
+
+            # 记录尾款清零日志
+            OperationLog.objects.create(
+                order=order,
+                description=f"于 {timestamp} 因订单作废，系统自动清零尾款: ￥{pending_balance}",
+                operator=operator
+            )
+
+            # 再次确保订单状态为作废
+            order.refresh_from_db()
+            order.payment_status = 3  # 确保付款状态为已作废
+            order.save()
+
         # 5, 返回成功信息
         return Response({'detail': '订单作废成功'}, status=status.HTTP_200_OK)
@@ -0,0 +1,77 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from faker import Faker
+
+from apps.client.models import Client
+from apps.common import seeds
+from apps.search import tokens
+from apps.staff.models import ERPUser
+
+
+class Command(BaseCommand):
+    help = '用合成客户数据对比 LIKE 与词元表两种客户检索方式的耗时(数据在事务中写入, 结束后回滚)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help='合成客户数量')
+        parser.add_argument('--repeat', type=int, default=5, help='每个查询重复次数, 取平均值')
+
+    def handle(self, *args, **options):
+        faker = Faker('zh_CN')
+        faker.seed_instance(0)
+
+        with transaction.atomic():
+            # 员工手机号避开合成数据(seedbenchmarkdata)的号段, 客户手机号跳过库中已有的号码
+            staff = ERPUser.objects.create_user(account='benchsearch', name='压测员工',
+                                                telephone=seeds.unused_telephone('198', ERPUser), password='111111')
+            clients = [Client(name=faker.name(), telephone=telephone, address='压测地址', staff=staff)
+                       for telephone in self.telephones(faker, options['rows'])]
+            Client.objects.bulk_create(clients, batch_size=tokens.BATCH_SIZE)
+
+            start = time.perf_counter()
+            for kind in ('client.name', 'client.telephone'):
+                tokens.rebuild(kind)
+            self.stdout.write(f"建立词元: {time.perf_counter() - start:.2f}s")
+
+            sample = next(client for client in clients[len(clients) // 2:] if len(client.name) == 3)
+            queries = [
+                ('client.name', '姓氏(1字)', sample.name[0]),
+                ('client.name', '名(2字)', sample.name[-2:]),
+                ('client.name', '全名(3字)', sample.name),
+                ('client.name', '拼音首字母', tokens.pinyin_initials(sample.name)),
+                ('client.telephone', '电话后4位', sample.telephone[-4:]),
+                ('client.telephone', '电话中间6位', sample.telephone[3:9]),
+            ]
+
+            self.stdout.write(f"{'查询':<10} {'查询词':<10} {'LIKE(ms)':>10} {'词元(ms)':>10} {'LIKE结果':>8} "
+                              f"{'词元结果':>8}")
+            for kind, label, text in queries:
+                field = tokens.SEARCH_FIELDS[kind][1]
+                like = Client.objects.filter(**{f'{field}__contains': text})
+                like_elapsed, like_count = self.measure(like, options['repeat'])
+                indexed = tokens.filter_queryset(Client.objects.all(), kind, text)
+                indexed_elapsed, indexed_count = self.measure(indexed, options['repeat'])
+                self.stdout.write(f"{label:<10} {text:<10} {like_elapsed:>10.1f} {indexed_elapsed:>10.1f} "
+                                  f"{like_count:>8} {indexed_count:>8}")
+
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def telephones(faker, count):
+        """生成 count 个互不重复、且与现有客户不冲突的手机号"""
+        result = []
+        while len(result) < count:
+            batch = [faker.unique.phone_number() for _ in range(min(count - len(result), tokens.BATCH_SIZE))]
+            used = set(Client.objects.filter(telephone__in=batch).values_list('telephone', flat=True))
+            result.extend(telephone for telephone in batch if telephone not in used)
+        return result
+
+    @staticmethod
+    def measure(queryset, repeat):
+        """取第一页(与列表接口一致), 返回平均耗时(毫秒)和结果总数"""
+        start = time.perf_counter()
+        for _ in range(repeat):
+            list(queryset.order_by('level', 'last_follow_time', 'uid')[:10])
+        elapsed = (time.perf_counter() - start) / repeat * 1000
+        return elapsed, queryset.count()
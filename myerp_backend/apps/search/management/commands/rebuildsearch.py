@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.search import tokens
+
+
+class Command(BaseCommand):
+    help = '清空并重建子串检索词元(默认全部检索字段)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', nargs='+', help=f"检索字段: {', '.join(tokens.SEARCH_FIELDS)}")
+
+    def handle(self, *args, **options):
+        kinds = options['kind'] or list(tokens.SEARCH_FIELDS)
+        unknown = set(kinds) - set(tokens.SEARCH_FIELDS)
+        if unknown:
+            raise CommandError(f"未知的检索字段: {', '.join(sorted(unknown))}")
+
+        for kind in kinds:
+            with transaction.atomic():
+                count = tokens.rebuild(kind)
+            self.stdout.write(self.style.SUCCESS(f'{kind}: 已为{count}条记录重建检索词元'))
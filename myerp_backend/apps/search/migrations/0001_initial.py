@@ -0,0 +1,28 @@
+# Generated by Django 5.1.6 on 2026-10-18 18:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=30, verbose_name='检索字段')),
+                ('token', models.CharField(max_length=10, verbose_name='词元')),
+                ('object_id', models.CharField(max_length=22, verbose_name='对象主键')),
+            ],
+            options={
+                'verbose_name': '检索词元',
+                'verbose_name_plural': '检索词元',
+                'indexes': [models.Index(fields=['kind', 'token', 'object_id'], name='search_kind_token_idx'), models.Index(fields=['kind', 'object_id'], name='search_kind_object_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+from django.db import migrations
+
+try:
+    from pypinyin import lazy_pinyin, Style
+except ImportError:  # 未安装 pypinyin 时不回填拼音首字母词元
+    lazy_pinyin = None
+
+# 迁移中固定本次回填时的检索字段和分词规则, 不引用 apps.search.tokens,
+# 以后修改分词规则不会改变历史迁移的结果; 规则变化后用 rebuildsearch 命令重建词元
+SEARCH_FIELDS = {
+    'client.name': ('client.Client', 'name', (1, 2, 3), True),
+    'client.telephone': ('client.Client', 'telephone', (3,), False),
+    'inventory.name': ('inventory.Inventory', 'name', (2, 3), False),
+    'order.order_number': ('order.Order', 'order_number', (3,), False),
+}
+PINYIN_MAX_LENGTH = 10
+BATCH_SIZE = 2000
+
+
+def ngrams(text, sizes):
+    text = (text or '').lower()
+    return {text[i:i + n] for n in sizes for i in range(len(text) - n + 1)}
+
+
+def pinyin_tokens(text):
+    if lazy_pinyin is None or not text:
+        return set()
+    initials = ''.join(lazy_pinyin(text[:PINYIN_MAX_LENGTH], style=Style.FIRST_LETTER, errors='default')).lower()
+    initials = ''.join(char for char in initials if char.isascii() and char.isalpha())
+    return {initials[i:j] for i in range(len(initials)) for j in range(i + 1, len(initials) + 1)}
+
+
+def backfill_search_tokens(apps, schema_editor):
+    SearchToken = apps.get_model('search', 'SearchToken')
+    for kind, (model_label, field, sizes, pinyin) in SEARCH_FIELDS.items():
+        model = apps.get_model(model_label)
+        rows = []
+        for pk, value in model.objects.values_list('pk', field).iterator(chunk_size=BATCH_SIZE):
+            rows += [SearchToken(kind=kind, token=token, object_id=str(pk)) for token in ngrams(value, sizes)]
+            if pinyin:
+                rows += [SearchToken(kind=f'{kind}:py', token=token, object_id=str(pk))
+                         for token in pinyin_tokens(value)]
+            if len(rows) >= BATCH_SIZE:
+                SearchToken.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+                rows = []
+        SearchToken.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0001_initial'),
+        ('client', '0003_client_next_follow_due'),
+        ('inventory', '0008_stocktake'),
+        ('order', '0006_ordermonthlysummary'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_search_tokens, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+from django.db import models
+
+
+class SearchToken(models.Model):
+    """
+    子串检索的 n-gram 词元表: 每个被检索字段拆成若干 1/2/3-gram(及拼音首字母), 用等值索引代替 LIKE '%xx%'
+    """
+    kind = models.CharField(max_length=30, verbose_name='检索字段')  # 例如 client.name / client.name:py
+    token = models.CharField(max_length=10, verbose_name='词元')
+    object_id = models.CharField(max_length=22, verbose_name='对象主键')
+
+    class Meta:
+        verbose_name = '检索词元'
+        verbose_name_plural = verbose_name
+        indexes = [
+            models.Index(fields=['kind', 'token', 'object_id'], name='search_kind_token_idx'),
+            models.Index(fields=['kind', 'object_id'], name='search_kind_object_idx'),
+        ]
@@ -0,0 +1,163 @@
+from django.apps import apps
+from django.db.models import Q
+
+from .models import SearchToken
+
+try:
+    from pypinyin import lazy_pinyin, Style
+except ImportError:  # 未安装 pypinyin 时不提供拼音首字母检索
+    lazy_pinyin = None
+
+# 检索字段: {kind: (模型, 字段, n-gram 长度, 是否支持拼音首字母)}
+# 查询词短于最小的 n 时无法使用词元, 退回 LIKE 查询
+SEARCH_FIELDS = {
+    'client.name': ('client.Client', 'name', (1, 2, 3), True),
+    'client.telephone': ('client.Client', 'telephone', (3,), False),
+    'inventory.name': ('inventory.Inventory', 'name', (2, 3), False),
+    'order.order_number': ('order.Order', 'order_number', (3,), False),
+}
+PINYIN_MAX_LENGTH = 10  # 拼音首字母只索引前10个字
+BATCH_SIZE = 2000
+
+
+def _pinyin_kind(kind):
+    return f'{kind}:py'
+
+
+def ngrams(text, sizes):
+    """
+    文本(转小写)的全部 n-gram
+    """
+    text = (text or '').lower()
+    return {text[i:i + n] for n in sizes for i in range(len(text) - n + 1)}
+
+
+def pinyin_initials(text):
+    """
+    汉字转拼音首字母(非汉字原样保留), 例如 "张三" -> "zs"
+    """
+    if lazy_pinyin is None or not text:
+        return ''
+    return ''.join(lazy_pinyin(text[:PINYIN_MAX_LENGTH], style=Style.FIRST_LETTER, errors='default')).lower()
+
+
+def pinyin_tokens(text):
+    """
+    拼音首字母的全部子串; 名称很短, 直接索引所有子串, 查询时一次等值匹配即可, 无需再校验
+    """
+    initials = ''.join(char for char in pinyin_initials(text) if char.isascii() and char.isalpha())
+    return {initials[i:j] for i in range(len(initials)) for j in range(i + 1, len(initials) + 1)}
+
+
+def _build(kind, obj):
+    _, field, sizes, pinyin = SEARCH_FIELDS[kind]
+    value = getattr(obj, field)
+    object_id = str(obj.pk)
+    rows = [SearchToken(kind=kind, token=token, object_id=object_id) for token in ngrams(value, sizes)]
+    if pinyin:
+        rows += [SearchToken(kind=_pinyin_kind(kind), token=token, object_id=object_id)
+                 for token in pinyin_tokens(value)]
+    return rows
+
+
+def _kinds(kind):
+    return [kind, _pinyin_kind(kind)] if SEARCH_FIELDS[kind][3] else [kind]
+
+
+def index_objects(kind, objects):
+    """
+    重建一批对象在该检索字段上的词元(对象必须已有主键)
+    """
+    objects = [obj for obj in objects if obj.pk is not None]
+    if not objects:
+        return
+    SearchToken.objects.filter(kind__in=_kinds(kind), object_id__in=[str(obj.pk) for obj in objects]).delete()
+    SearchToken.objects.bulk_create([row for obj in objects for row in _build(kind, obj)], batch_size=BATCH_SIZE)
+
+
+def index_instance(instance, update_fields=None):
+    """
+    模型 save 后调用: 被检索字段可能变化时更新该对象的词元
+    """
+    label = instance._meta.label
+    for kind, (model_label, field, _, _) in SEARCH_FIELDS.items():
+        if model_label == label and (update_fields is None or field in update_fields):
+            index_objects(kind, [instance])
+
+
+def sync(kind):
+    """
+    批量导入后调用: 删除已不存在对象的词元, 为尚未建立词元的对象补建
+
+    bulk_create 在 MySQL 上不返回主键, 因此按主键集合对比找出新对象
+    """
+    model = apps.get_model(SEARCH_FIELDS[kind][0])
+    existing = {str(pk) for pk in model.objects.values_list('pk', flat=True)}
+    indexed = set(SearchToken.objects.filter(kind=kind).values_list('object_id', flat=True).distinct())
+
+    removed = list(indexed - existing)
+    for start in range(0, len(removed), BATCH_SIZE):
+        SearchToken.objects.filter(kind__in=_kinds(kind), object_id__in=removed[start:start + BATCH_SIZE]).delete()
+
+    # 字段为空的对象没有词元, 每次都会被重新检查, 数量很少
+    missing = list(existing - indexed)
+    for start in range(0, len(missing), BATCH_SIZE):
+        index_objects(kind, model.objects.filter(pk__in=missing[start:start + BATCH_SIZE]))
+    return len(missing), len(removed)
+
+
+def rebuild(kind):
+    """
+    清空并重建某个检索字段的全部词元, 返回处理的对象数
+    """
+    model = apps.get_model(SEARCH_FIELDS[kind][0])
+    field = SEARCH_FIELDS[kind][1]
+    SearchToken.objects.filter(kind__in=_kinds(kind)).delete()
+
+    count = 0
+    rows = []
+    for obj in model.objects.only('pk', field).iterator(chunk_size=BATCH_SIZE):
+        rows += _build(kind, obj)
+        count += 1
+        if len(rows) >= BATCH_SIZE:
+            SearchToken.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+            rows = []
+    SearchToken.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    return count
+
+
+def _covering_ngrams(text, n):
+    """
+    覆盖整个查询词的最少 n-gram(首尾相接, 最后一个与末尾对齐), 其余 n-gram 由包含匹配兜底
+    """
+    text = text.lower()
+    starts = list(range(0, len(text) - n + 1, n))
+    if starts[-1] != len(text) - n:
+        starts.append(len(text) - n)
+    return {text[i:i + n] for i in starts}
+
+
+def filter_queryset(queryset, kind, text, lookup='contains'):
+    """
+    用词元表代替 LIKE '%text%' 筛选 queryset
+
+    每个 n-gram 是一次 (kind, token) 索引上的等值子查询, 取交集得到候选对象,
+    再对候选对象做原始的包含匹配以保证结果精确;
+    查询词太短无法拆分时退回原始查询. 支持拼音的字段, 纯字母的查询词还会匹配拼音首字母
+    """
+    _, field, sizes, pinyin = SEARCH_FIELDS[kind]
+    text = text.strip()
+    contains = Q(**{f'{field}__{lookup}': text})
+
+    condition = contains
+    usable = [n for n in sizes if n <= len(text)]
+    if usable:
+        for token in _covering_ngrams(text, max(usable)):
+            condition &= Q(pk__in=SearchToken.objects.filter(kind=kind, token=token).values('object_id'))
+
+    lowered = text.lower()
+    if pinyin and lazy_pinyin is not None and lowered.isascii() and lowered.isalpha() \
+            and len(lowered) <= PINYIN_MAX_LENGTH:
+        condition |= Q(pk__in=SearchToken.objects.filter(kind=_pinyin_kind(kind), token=lowered).values('object_id'))
+
+    return queryset.filter(condition)
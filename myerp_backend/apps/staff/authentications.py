@@ -2,10 +2,11 @@ import time
 
 import jwt
 from django.conf import settings
-from jwt.exceptions import ExpiredSignatureError
+from jwt.exceptions import ExpiredSignatureError, InvalidTokenError
 from rest_framework import exceptions
 from rest_framework.authentication import BaseAuthentication, get_authorization_header
 
+from . import caches
 from .models import ERPUser
 
 
@@ -38,14 +39,24 @@ class JWTAuthentication(BaseAuthentication):
         try:
             jwt_token = auth[1]
             jwt_info = jwt.decode(jwt_token, settings.SECRET_KEY, algorithms='HS256')
-            userid = jwt_info.get('userid')
-            try:
-                user = ERPUser.objects.get(pk=userid)
-                setattr(request, 'user', user)
-                return user, jwt_token
-            except:
-                msg = '用户不存在!'
-                raise exceptions.AuthenticationFailed(msg)
         except ExpiredSignatureError:
             msg = "JWT Token已过期!"
             raise exceptions.AuthenticationFailed(msg)
+        except InvalidTokenError:
+            msg = "JWT Token不可用!"
+            raise exceptions.AuthenticationFailed(msg)
+
+        # 两级缓存读取用户, 避免每个请求都查询一次数据库; 数据库异常不再被当作用户不存在
+        userid = jwt_info.get('userid')
+        try:
+            user = caches.get_user(userid)
+        except ERPUser.DoesNotExist:
+            msg = '用户不存在!'
+            raise exceptions.AuthenticationFailed(msg)
+
+        if not user.is_active:
+            msg = '用户已被禁用!'
+            raise exceptions.AuthenticationFailed(msg)
+
+        setattr(request, 'user', user)
+        return user, jwt_token
@@ -0,0 +1,117 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+from .models import ERPUser
+
+# 两级用户缓存: 进程内 LRU -> Redis(按版本号) -> 数据库
+# 每次命中进程内缓存都向 Redis 核对版本号(一次很小的读取), 停用员工/修改密码对所有进程立即生效
+LOCAL_SIZE = 1024  # 进程内最多缓存的用户数
+LOCAL_TIMEOUT = 5  # Redis 不可用时进程内缓存的有效期(秒), 此时其他进程的修改最迟在该时间后生效
+REMOTE_TIMEOUT = 60 * 60  # Redis 中用户数据的有效期
+STAT_KINDS = ('local_hit', 'remote_hit', 'miss')
+
+# 缓存的字段(包含密码哈希, 修改密码时需要校验旧密码), 用于为每个请求重建 ERPUser 对象
+FIELD_NAMES = [field.attname for field in ERPUser._meta.concrete_fields]
+
+_local = OrderedDict()  # {uid: (version, values, expires)}
+_lock = threading.Lock()
+_stats = {kind: 0 for kind in STAT_KINDS}
+
+
+def _version_key(uid):
+    return f'staff:user_version:{uid}'
+
+
+def _version(uid):
+    """
+    读取用户版本号; 缓存不可用时返回 None
+    """
+    key = _version_key(uid)
+    version = cache.get(key)
+    if version is None:
+        # 用毫秒时间戳作为初始版本, 版本键被淘汰后也不会复用旧版本的数据
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _build(values):
+    """
+    每次请求都构建新的用户对象, 避免多个请求共享并修改同一实例
+    """
+    return ERPUser.from_db('default', FIELD_NAMES, [values[name] for name in FIELD_NAMES])
+
+
+def _remember(uid, version, values):
+    with _lock:
+        _local[uid] = (version, values, time.time() + LOCAL_TIMEOUT)
+        _local.move_to_end(uid)
+        while len(_local) > LOCAL_SIZE:
+            _local.popitem(last=False)
+
+
+def _count(kind):
+    with _lock:
+        _stats[kind] += 1
+
+
+def get_user(uid):
+    """
+    按 uid 获取用户, 用户不存在时抛出 ERPUser.DoesNotExist
+
+    进程内缓存只在版本号与 Redis 一致时使用, 其他进程调用 invalidate 后下一个请求即读取新数据
+    """
+    with _lock:
+        entry = _local.get(uid)
+        if entry is not None:
+            _local.move_to_end(uid)
+
+    version = _version(uid)
+    if version is not None:
+        if entry is not None and entry[0] == version:
+            _count('local_hit')
+            return _build(entry[1])
+
+        values = cache.get(f'staff:user:{uid}:{version}')
+        if values is not None:
+            _remember(uid, version, values)
+            _count('remote_hit')
+            return _build(values)
+    elif entry is not None and entry[2] > time.time():
+        # Redis 不可用, 无法核对版本号: 短时间内沿用进程内缓存, 避免每个请求都查询数据库
+        _count('local_hit')
+        return _build(entry[1])
+
+    _count('miss')
+    values = ERPUser.objects.values(*FIELD_NAMES).get(pk=uid)
+    if version is not None:
+        cache.set(f'staff:user:{uid}:{version}', values, timeout=REMOTE_TIMEOUT)
+    _remember(uid, version, values)
+    return _build(values)
+
+
+def invalidate(uid):
+    """
+    用户角色/状态/密码变化后调用: 升级版本号使所有进程的缓存失效
+    """
+    with _lock:
+        _local.pop(uid, None)
+    try:
+        cache.incr(_version_key(uid))
+    except ValueError:
+        cache.set(_version_key(uid), int(time.time() * 1000), timeout=None)
+
+
+def stats():
+    """
+    当前进程的用户缓存命中统计
+    """
+    with _lock:
+        result = dict(_stats)
+        result['local_size'] = len(_local)
+    total = sum(result[kind] for kind in STAT_KINDS)
+    result['hit_rate'] = round((result['local_hit'] + result['remote_hit']) / total, 4) if total else 0
+    return result
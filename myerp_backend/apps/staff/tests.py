@@ -1,3 +1,75 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from . import caches
+from .authentications import generate_jwt
+from .models import ERPUser
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                       'LOCATION': 'staff-tests'}})
+class UserCacheInvalidationTest(TestCase):
+    """停用员工/修改密码后, 其他进程仍持有的进程内缓存也立即失效"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.boss = ERPUser.objects.create_superuser(account='boss', name='老板', telephone='13000000000',
+                                                    password='111111')
+        cls.staff = ERPUser.objects.create_user(account='staff', name='员工', telephone='13000000001',
+                                                password='111111')
+
+    def setUp(self):
+        cache.clear()
+        caches._local.clear()
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'JWT {generate_jwt(user)}')
+        return client
+
+    def other_process(self, uid):
+        """
+        返回一个函数, 把 uid 当前的进程内缓存放回去, 模拟另一个尚未收到通知的进程
+        """
+        caches.get_user(uid)
+        entry = caches._local[uid]
+
+        def restore():
+            caches._local[uid] = entry
+
+        return restore
+
+    def test_update_staff_deactivation_is_immediate(self):
+        staff_client = self.client_for(self.staff)
+        self.assertEqual(staff_client.get('/api/staff/allstaff/').status_code, 403)
+        restore = self.other_process(self.staff.pk)
+
+        response = self.client_for(self.boss).put(f'/api/staff/update/{self.staff.uid}/', {'is_active': False},
+                                                  format='json')
+        self.assertEqual(response.status_code, 200)
+        restore()
+
+        self.assertFalse(caches.get_user(self.staff.pk).is_active)
+        response = staff_client.get('/api/staff/allstaff/')
+        self.assertEqual(response.data['detail'], '用户已被禁用!')
+
+    def test_reset_password_is_immediate(self):
+        restore = self.other_process(self.staff.pk)
+
+        response = self.client_for(self.staff).put('/api/staff/reset/', {
+            'old_password': '111111', 'new_password': '222222', 'check_new_password': '222222'
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        restore()
+
+        user = caches.get_user(self.staff.pk)
+        self.assertTrue(user.check_password('222222'))
+        self.assertFalse(user.check_password('111111'))
+
+    def test_unchanged_user_hits_local_cache(self):
+        caches.get_user(self.staff.pk)
+        before = caches.stats()['local_hit']
+        with self.assertNumQueries(0):
+            caches.get_user(self.staff.pk)
+        self.assertEqual(caches.stats()['local_hit'], before + 1)
@@ -14,4 +14,6 @@ urlpatterns = [
     path('create/', views.CreateStaffView.as_view(), name='create'),
     # 修改员工信息
     path('update/<str:uid>/', views.UpdateStaffView.as_view(), name='update_staff'),
+    # 登录用户缓存命中统计
+    path('cache-stats/', views.UserCacheStatsView.as_view(), name='cache_stats'),
 ]
\ No newline at end of file
@@ -4,11 +4,12 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from . import serializers
+from . import serializers, caches
 from .authentications import generate_jwt
 from .models import ERPUser
 
 from rest_framework.permissions import IsAuthenticated
+from .permissions import IsBoss
 
 
 class LoginView(APIView):
@@ -43,7 +44,8 @@ class ResetPasswordView(APIView):
         if serializer.is_valid():
             password = serializer.validated_data.get('new_password')
             request.user.set_password(password)
-            request.user.save()
+            request.user.save(update_fields=['password'])
+            caches.invalidate(request.user.pk)
 
             return Response(data={'message': '密码修改成功!'}, status=status.HTTP_200_OK)
         else:
@@ -122,9 +124,19 @@ class UpdateStaffView(APIView):
         serializer = serializers.StaffUpdateSerializer(staff, data=request.data, partial=True)
         
         if serializer.is_valid():
-            # 保存更新
+            # 保存更新, 角色/启用状态变化后立即使该员工的登录缓存失效
             serializer.save()
+            caches.invalidate(staff.pk)
             return Response(serializers.StaffSerializer(staff).data)
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+
+class UserCacheStatsView(APIView):
+    """
+    登录用户缓存命中统计(处理本次请求的进程)
+    """
+    permission_classes = [IsAuthenticated, IsBoss]
+
+    def get(self, request):
+        return Response(caches.stats())
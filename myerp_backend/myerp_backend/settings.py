@@ -1,7 +1,9 @@
 import os
+import sys
 from pathlib import Path
 
 import environ
+from corsheaders.defaults import default_headers
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = 'django-insecure-)ad(j6oy4_(t^t5_p429+1l=5#pi!_2s$@%14#^@*qsn+g8txm'
@@ -30,9 +32,15 @@ INSTALLED_APPS = [
     'apps.client',  # 客户管理
     'apps.order',  # 订单管理
     'apps.home',  # 首页管理
+    'apps.job',  # 后台任务
+    'apps.search',  # 子串检索
+    'apps.metrics',  # 请求指标
+    'apps.benchmark',  # 性能基准
 ]
 
 MIDDLEWARE = [
+    # 放在最外层, 统计包含其他中间件在内的完整耗时
+    'apps.metrics.middlewares.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -69,6 +77,12 @@ DATABASES = {
         "HOST": env.str('DB_HOST', 'localhost'),
         "PORT": env.str('DB_PORT', '3306'),
     }
+} if env.str('DB_ENGINE', 'mysql') == 'mysql' else {
+    # DB_ENGINE=sqlite: 使用本地 SQLite 文件, 用于离线性能基准(seedbenchmarkdata / runbenchmark)
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        "NAME": env.str('DB_NAME', os.path.join(BASE_DIR, 'benchmark.sqlite3')),
+    }
 }
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -98,10 +112,18 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'staff.ERPUser'
 
 REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': ['apps.staff.authentications.JWTAuthentication']
+    'DEFAULT_AUTHENTICATION_CLASSES': ['apps.staff.authentications.JWTAuthentication'],
+    # 渲染 JSON 时计时, 计入请求指标的序列化耗时
+    'DEFAULT_RENDERER_CLASSES': [
+        'apps.metrics.renderers.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 CORS_ALLOW_ALL_ORIGINS = True
+# 前端重试写请求时携带幂等键; 允许前端读取重放标记
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed']
 
 # 缓存
 CACHES = {
@@ -116,4 +138,33 @@ CACHES = {
         },
         "KEY_PREFIX": "myerp"
     }
-}
\ No newline at end of file
+}
+# 后台任务(导入/导出)的上传文件和结果文件目录
+JOB_FILES_DIR = env.str('JOB_FILES_DIR', os.path.join(BASE_DIR, 'job_files'))
+# 执行中的任务超过该时间(秒)没有汇报进度, 视为 worker 已退出, 标记为失败
+JOB_STALE_TIMEOUT = env.int('JOB_STALE_TIMEOUT', 60 * 30)
+
+# 数据库锁冲突(死锁/锁等待超时)时整个事务的最多执行次数和首次重试前的退避时间(秒)
+DB_RETRY_ATTEMPTS = env.int('DB_RETRY_ATTEMPTS', 3)
+DB_RETRY_BACKOFF = env.float('DB_RETRY_BACKOFF', 0.05)
+# 加锁不等待(NOWAIT): 锁被占用时立即返回 503, 不排队也不重试
+DB_LOCK_NOWAIT = env.bool('DB_LOCK_NOWAIT', False)
+
+# 运行测试时不输出每个请求的指标日志
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+
+# 日志: 输出到控制台, 每个请求的指标一行 JSON (apps.metrics.requests)
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'simple'},
+    },
+    'loggers': {
+        'apps': {'handlers': ['console'], 'level': env.str('LOG_LEVEL', 'INFO'), 'propagate': False},
+        'apps.metrics.requests': {'level': 'WARNING' if TESTING else env.str('LOG_LEVEL', 'INFO')},
+    },
+}
@@ -8,4 +8,6 @@ urlpatterns = [
     path('api/', include('apps.client.urls')),  # 客户管理
     path('api/', include('apps.order.urls')),  # 订单管理
     path('api/', include('apps.home.urls')),  # 首页管理
+    path('api/', include('apps.job.urls')),  # 后台任务
+    path('api/', include('apps.metrics.urls')),  # 请求指标
 ]